@@ -1,7 +1,8 @@
 import os
+import threading
 from copy import deepcopy, copy
-import plistlib
 import AppKit
+from PyObjCTools.AppHelper import callAfter, callLater
 
 import ezui
 from fontParts.fontshell import RBPoint
@@ -14,16 +15,26 @@ from lib.tools.misc import NSColorToRgba
 import ThemeManagerGlyphView
 import ThemeManagerScripting as themeScripter
 import WCAGContrastRatio as contrast
+import ThemeManagerScheduler as themeScheduler
 importlib.reload(themeScripter)
 importlib.reload(contrast)
+importlib.reload(themeScheduler)
 
-PREVIEW_FONT_PATH = os.path.join(themeScripter.EXTENSIONBUNDLE.resourcesPath(), "GlyphPreview.ufo")
+PREVIEW_FONT_PATH = os.path.join(themeScripter.resourcesPath(), "GlyphPreview.ufo")
 PREVIEW_FONT = OpenFont(PREVIEW_FONT_PATH, showInterface=False)
 PREVIEW_GLYPH = PREVIEW_FONT["a"]
 
 PREVIEW_HEIGHT = 600
 WINDOW_WITHOUT_EDITOR_WIDTH = 530
 WINDOW_WITH_EDITOR_WIDTH = 1050
+# imported themes closer than this (mean ΔE) to a theme in the list get a note
+SIMILAR_DELTA_E = 2
+# themeFilterButton segments → the isDark a theme needs to be shown, None for all
+THEME_FILTERS = (None, False, True)
+# marks a table item that only has the name of a pack theme, see loadThemeTableItem
+PACK_THEME_KEY = "themePackName"
+# themeSortButton segments → ThemeProfile attribute, None keeps the saved order
+THEME_SORT_KEYS = (None, "backgroundLuminance", "dominantHue", "minimumContrast")
 
 # -----------------
 # Window Controller
@@ -45,9 +56,8 @@ class ThemeManagerWindowController(ezui.WindowController):
     debug = True
 
     def build(self):
-        # A temporary fix for renamed keys and dark mode-less themes
-        themeScripter.renameThemeTypos()
-        themeScripter.addDarkMode2Themes()
+        # renamed keys and dark mode-less themes, only does work once per schema version
+        themeScripter.migrateUserThemes()
         
         # self.themes = []
         # store a backup of the current settings
@@ -66,6 +76,8 @@ class ThemeManagerWindowController(ezui.WindowController):
         = HorizontalStack
 
         * VerticalStack @themeStack
+        > ( All | Light | Dark ) @themeFilterButton
+        > ( {list.bullet} | {sun.max} | {paintpalette} | {circle.lefthalf.filled} ) @themeSortButton
         > |----------| @themeTable
         > | X | name |
         > |----------|
@@ -145,6 +157,10 @@ class ThemeManagerWindowController(ezui.WindowController):
                 allowsMultipleSelection=False,
                 allowsEmptySelection=False
             ),
+            themeFilterButton=dict(
+            ),
+            themeSortButton=dict(
+            ),
             themeTableItemButton=dict(
                 gravity="leading"
             ),
@@ -226,6 +242,8 @@ class ThemeManagerWindowController(ezui.WindowController):
         self.editorStack = self.w.getItem("editorStack")
         self.editorColorsTable = self.w.getItem("editorColorsTable")
         self.themePreview = self.w.getItem("themePreview")
+        # edits render the preview at most once a frame, with the latest values
+        self.previewScheduler = themeScheduler.RenderScheduler(self.themePreview.setTheme, callLater)
         # build the preview
         #self.buildPreview()
         
@@ -237,6 +255,10 @@ class ThemeManagerWindowController(ezui.WindowController):
         # self.selectionStroke = self.w.getItem("editorSelectionStrokeWidthField")
         # self.handleStroke = self.w.getItem("editorHandleStrokeWidthField")
         self.selectedTheme = self.backupTheme  
+        # items the theme filter hides, see populateThemeTable
+        self.hiddenThemeItems = []
+        self.w.getItem("themeFilterButton").set(0)
+        self.w.getItem("themeSortButton").set(0)
         # load the data
         self.loadThemes()
         # set default button states
@@ -248,6 +270,7 @@ class ThemeManagerWindowController(ezui.WindowController):
         self.w.open()
 
     def windowWillClose(self, sender):
+        self.previewScheduler.cancel()
         self.saveThemes()
 
     # User Defaults Load/Save
@@ -255,12 +278,20 @@ class ThemeManagerWindowController(ezui.WindowController):
 
     def loadThemes(self):
         # user defined themes
-        userDefinedThemes = themeScripter.loadUserDefinedThemes()
+        userDefinedThemes = [
+            themeScripter.flattenTheme(theme)
+            for theme in themeScripter.loadUserDefinedThemes()
+        ]
         userDefinedItems = self.wrapThemeTableItems(userDefinedThemes, themeType="User")
         self.themeLengths = len(userDefinedItems)
-        # built-in themes
-        builtInThemes = themeScripter.loadBuiltInThemes()
+        # built-in themes, pack themes by name until they are selected or applied
+        builtInThemes = themeScripter.loadBuiltInThemes(packs=False)
         builtInItems = self.wrapThemeTableItems(builtInThemes, themeType="Default")
+        builtInNames = {item["themeName"] for item in builtInItems}
+        for themeName in themeScripter.loadPackThemeNames():
+            if themeName not in builtInNames:
+                builtInNames.add(themeName)
+                builtInItems.append(self.wrapThemeTableItem({"themeName": themeName, PACK_THEME_KEY: themeName}, themeType="Default"))
         self.populateThemeTable(userDefinedItems, builtInItems)
 
     def saveThemes(self, overrideThemes=None):
@@ -273,7 +304,7 @@ class ThemeManagerWindowController(ezui.WindowController):
 
     def getCurrentUserDefaultsAsTheme(self):
         theme = {}
-        for key, name, dataType in themeScripter.THEMEKEYS + themeScripter.DARKTHEMEKEYS:
+        for key, name, dataType in themeScripter.THEMEKEYS + themeScripter.getDarkThemeKeys():
             data = getDefault(key)
             convertedData = themeScripter._dataConverter(data, dataType)
             theme[key] = data
@@ -283,10 +314,11 @@ class ThemeManagerWindowController(ezui.WindowController):
     # -----------
 
     def getThemeTableItems(self):
+        # the filtered out items too, they are still saved
         items = [
             item for item in self.themeTable.get()
             if not isinstance(item, ezui.TableGroupRow)
-        ]
+        ] + self.hiddenThemeItems
         userDefinedItems = []
         builtInItems = []
         for item in items:
@@ -319,13 +351,58 @@ class ThemeManagerWindowController(ezui.WindowController):
         ]
         return items
 
+    def loadThemeTableItem(self, item):
+        # decode a pack theme's item in place, other items are full already
+        if PACK_THEME_KEY in item:
+            theme = themeScripter.getThemeData(item.pop(PACK_THEME_KEY))
+            if theme is not None:
+                theme["themeType"] = "Default"
+                item.update(theme)
+        return item
+
     def unwrapThemeTableItem(self, item):
-        item = dict(item)
+        item = dict(self.loadThemeTableItem(item))
         del item["themeImage"]
         theme = copy(item)
         return theme
 
-    def populateThemeTable(self, userDefinedItems, builtInItems, selection=None):
+    def getThemeItemProfile(self, item):
+        # built-in themes by name, their hash and profile are cached in the
+        # registry. a pack theme that isn't loaded yet isn't decoded for
+        # this, it only has a profile once it has been loaded. user themes
+        # by content, they may have unsaved edits.
+        if PACK_THEME_KEY in item:
+            return themeScripter.getThemeProfile(item[PACK_THEME_KEY], cachedOnly=True)
+        if item["themeType"] == "Default":
+            return themeScripter.getThemeProfile(item["themeName"])
+        return themeScripter.getThemeProfile(self.unwrapThemeTableItem(item))
+
+    def filterThemeTableItems(self, items):
+        # (visible sorted by the sort button, hidden by the filter button)
+        dark = THEME_FILTERS[self.w.getItem("themeFilterButton").get()]
+        sortKey = THEME_SORT_KEYS[self.w.getItem("themeSortButton").get()]
+        if dark is None and sortKey is None:
+            return items, []
+        # a theme that can't be profiled (None) is never hidden
+        profiles = [(item, self.getThemeItemProfile(item)) for item in items]
+        visible = [(item, profile) for item, profile in profiles if dark is None or profile is None or profile.isDark == dark]
+        hidden = [item for item, profile in profiles if dark is not None and profile is not None and profile.isDark != dark]
+        if sortKey is not None:
+            # gray themes have no hue, they go last
+            visible.sort(key=lambda pair: (getattr(pair[1], sortKey, None) is None, getattr(pair[1], sortKey, None) or 0))
+        return [item for item, profile in visible], hidden
+
+    def populateThemeTable(self, userDefinedItems, builtInItems, selection=None, revealSelection=True):
+        userDefinedItems, hiddenUserDefinedItems = self.filterThemeTableItems(userDefinedItems)
+        builtInItems, hiddenBuiltInItems = self.filterThemeTableItems(builtInItems)
+        self.hiddenThemeItems = hiddenUserDefinedItems + hiddenBuiltInItems
+        if selection is not None and any(item["themeName"] == selection["themeName"] for item in self.hiddenThemeItems):
+            if revealSelection:
+                # a new or imported theme the filter would hide, show everything
+                self.w.getItem("themeFilterButton").set(0)
+                self.populateThemeTable(userDefinedItems + hiddenUserDefinedItems, builtInItems + hiddenBuiltInItems, selection)
+                return
+            selection = None
         items = (
               [ezui.TableGroupRow("Your Themes")]
             + userDefinedItems
@@ -348,7 +425,7 @@ class ThemeManagerWindowController(ezui.WindowController):
                 if isinstance(item, ezui.TableGroupRow):
                     continue
                 self.themeTable.setSelectedIndexes([i])
-                self.themePreview.setTheme(item, self.mode)
+                self.previewScheduler.renderNow(self.loadThemeTableItem(item), self.mode)
                 break
 
     def themeTableSelectionCallback(self, sender):
@@ -358,6 +435,8 @@ class ThemeManagerWindowController(ezui.WindowController):
         if not items:
             raise NotImplementedError("There must be at least one item in themeTable.")
         item = items[0]
+        if not isinstance(item, ezui.TableGroupRow):
+            item = self.loadThemeTableItem(item)
 
         # if self.s >= 1 and self.themeLengths == len(self.getThemeTableItems()[0]):
         #     self.insertTheme(self.selectedTheme)
@@ -396,7 +475,7 @@ class ThemeManagerWindowController(ezui.WindowController):
         else:
             self.editorStack.show(False)
             self.w.setPosSize((x, y, WINDOW_WITHOUT_EDITOR_WIDTH, h))
-        self.themePreview.setTheme(item,self.mode)
+        self.previewScheduler.renderNow(item, self.mode)
 
         self.s += 1
     # creation/destruction
@@ -408,6 +487,21 @@ class ThemeManagerWindowController(ezui.WindowController):
         self.themeLengths = len(userDefinedItems)
         self.saveThemes(userDefinedItems)
 
+    def themeFilterButtonCallback(self, sender):
+        self.refreshThemeTable()
+
+    def themeSortButtonCallback(self, sender):
+        self.refreshThemeTable()
+
+    def refreshThemeTable(self):
+        # filter and sort again, keeping the selection when it is still shown
+        selection = None
+        for item in self.themeTable.getSelectedItems():
+            if not isinstance(item, ezui.TableGroupRow):
+                selection = item
+        userDefinedItems, builtInItems = self.getThemeTableItems()
+        self.populateThemeTable(userDefinedItems, builtInItems, selection=selection, revealSelection=False)
+
     def themeTableItemButtonCallback(self, sender):
         request = sender.get()
         if request == 0:
@@ -468,10 +562,11 @@ class ThemeManagerWindowController(ezui.WindowController):
         # self.themes.append(item)
         self.populateThemeTable(userDefinedItems, builtInItems)
 
-    def findNewThemeName(self, name):
-        userDefinedItems, builtInItems = self.getThemeTableItems()
-        names = [theme["themeName"] for theme in userDefinedItems]
-        names += [theme["themeName"] for theme in builtInItems]
+    def findNewThemeName(self, name, items=None):
+        if items is None:
+            userDefinedItems, builtInItems = self.getThemeTableItems()
+            items = userDefinedItems + builtInItems
+        names = [theme["themeName"] for theme in items]
         
         suffix = 0
         while name in names:
@@ -503,56 +598,66 @@ class ThemeManagerWindowController(ezui.WindowController):
         self.showGetFile(
             self.importThemeDialogCallback,
             fileTypes=["roboFontTheme"],
-            allowsMultipleSelection=False
+            allowsMultipleSelection=True
         )
 
     def importThemeDialogCallback(self, paths):
         if not paths:
             return
-        path = paths[0]
-        with open(path, "rb") as themeFile:
-            themeData = plistlib.load(themeFile)
-        themeData = {(themeScripter.RENAMEMAP[key] if key in themeScripter.RENAMEMAP.keys() else key):val for key,val in themeData.items()}
-        themeData = themeScripter.addDarkMode(themeData) 
-        themeData = themeScripter.addMissing(themeData)
-        themeName = themeData.pop("themeName")
-        themeData.pop("themeType")
-        validated = dict(
-            themeType="User"
+        # parse and validate off the main thread, the results come back through callAfter
+        loader = themeScripter.loadThemeFiles(
+            paths,
+            progress=lambda done, total: callAfter(self.importThemeProgress, done, total)
         )
-        invalidValueTypes = []
-        for nameKey, name, valueType in themeScripter.THEMEKEYS + themeScripter.DARKTHEMEKEYS:                
-            if nameKey not in themeData:
-                continue
-            value = themeData.pop(nameKey)
-            try:
-                v = valueType(value)
-                value = v
-            except TypeError:
-                pass
-            if not isinstance(value, valueType):
-                invalidValueTypes.append(nameKey)
-                continue
-            validated[nameKey] = value
-        validityMessage = []
-        if themeData:
-            validityMessage.append(
-                f"Unknown keys defined: {', '.join(themeData.keys())}"
-            )
-        if invalidValueTypes:
-            validityMessage.append(
-                f"Invalid value types for keys: {', '.join(invalidValueTypes)}"
-            )
+        thread = threading.Thread(target=self.importThemeWorker, args=(loader,), daemon=True)
+        thread.start()
+
+    def importThemeWorker(self, loader):
+        results = list(loader)
+        callAfter(self.importThemeFinished, results)
+
+    def importThemeProgress(self, done, total):
+        self.w.getNSWindow().setTitle_(f"Theme Manager — importing {done}/{total}")
+
+    def importThemeFinished(self, results):
+        self.w.getNSWindow().setTitle_("Theme Manager")
         userDefinedItems, builtInItems = self.getThemeTableItems()
-        existingNames = [item["themeName"] for item in userDefinedItems + builtInItems]
-        if themeName in existingNames:
-            validityMessage.append(f"The name '{themeName}' is already used.")
-            themeName = self.findNewThemeName(themeName)
-        validated["themeName"] = themeName
-        item = self.wrapThemeTableItem(validated)
-        userDefinedItems.append(item)
-        # self.themes.append(item)
-        self.populateThemeTable(userDefinedItems, builtInItems, selection=item)
+        existingNames = {item["themeName"] for item in userDefinedItems + builtInItems}
+        # pack themes that were never loaded aren't decoded for this
+        existingHashes = {
+            themeScripter.themeContentHash(self.unwrapThemeTableItem(item)): item["themeName"]
+            for item in userDefinedItems + builtInItems
+            if PACK_THEME_KEY not in item
+        }
+        validityMessage = []
+        item = None
+        for path, validated, errors in results:
+            fileName = os.path.basename(path)
+            if validated is None:
+                validityMessage.extend(str(error) for error in errors)
+                continue
+            validityMessage.extend(f"{fileName}: {line}" for line in themeScripter.themeValidator.formatErrors(errors))
+            validated = themeScripter.flattenTheme(validated)
+            digest = themeScripter.themeContentHash(validated)
+            # imported either way, like a theme saved from a script
+            if digest in existingHashes:
+                validityMessage.append(f"{fileName}: Looks the same as '{existingHashes[digest]}'.")
+            else:
+                for similarName, distance in themeScripter.findSimilarThemes(validated, 1, SIMILAR_DELTA_E):
+                    validityMessage.append(f"{fileName}: Looks very close to '{similarName}' (ΔE {distance:.1f}).")
+            themeName = validated["themeName"]
+            if themeName in existingNames:
+                validityMessage.append(f"{fileName}: The name '{themeName}' is already used.")
+                themeName = self.findNewThemeName(themeName, userDefinedItems + builtInItems)
+            validated["themeName"] = themeName
+            existingNames.add(themeName)
+            existingHashes.setdefault(digest, themeName)
+            item = self.wrapThemeTableItem(validated)
+            userDefinedItems.append(item)
+        if item is not None:
+            self.populateThemeTable(userDefinedItems, builtInItems, selection=item)
+        if len(validityMessage) > 20:
+            validityMessage = validityMessage[:20] + [f"…and {len(validityMessage) - 20} more."]
         if validityMessage:
             AppKit.NSBeep()
             validityMessage = [
@@ -582,16 +687,7 @@ class ThemeManagerWindowController(ezui.WindowController):
         del self._exportingTheme
         if not path:
             return
-        themeStorage = dict(
-            themeName=theme["themeName"],
-            themeType="User"
-        )
-        for key, name, valueType in themeScripter.THEMEKEYS + themeScripter.DARKTHEMEKEYS:
-            data = theme.get(key)
-            v = themeScripter._dataConverter(data, valueType)
-            themeStorage[key] = v
-        with open(path, "wb") as themeFile:
-            plistlib.dump(themeStorage, themeFile)
+        themeScripter.exportTheme(theme, path, themeScripter.getExportFormat())
 
     # apply/undo
     
@@ -611,7 +707,7 @@ class ThemeManagerWindowController(ezui.WindowController):
             background = contrast.getPercievedColor(contrast.invertColor(self.selectedTheme["glyphViewBackgroundColor"]), contrast.invertColor(self.selectedTheme["glyphViewMarginColor"]))
             for keyName, _, dataType in themeScripter.THEMEKEYS:
                 self.selectedTheme[keyName] = dataType(self.selectedTheme[keyName])
-            for keyName, _, dataType in themeScripter.DARKTHEMEKEYS:
+            for keyName, _, dataType in themeScripter.getDarkThemeKeys():
                 if dataType == tuple:
                     if keyName in ["glyphViewBackgroundColor.dark", "glyphViewMarginColor.dark"]:
                         color = contrast.invertColor(self.selectedTheme[keyName.replace(".dark", "")])
@@ -625,7 +721,7 @@ class ThemeManagerWindowController(ezui.WindowController):
                         else:
                             color = c
                     self.selectedTheme[keyName] = dataType([round(i,4) for i in color])
-            self.themePreview.setTheme(self.selectedTheme,self.mode)
+            self.previewScheduler.renderNow(self.selectedTheme, self.mode)
 
     def themeApplyButtonCallback(self, sender):
         items = self.themeTable.getSelectedItems()
@@ -641,7 +737,7 @@ class ThemeManagerWindowController(ezui.WindowController):
             self.mode = "light"
         else:
             self.mode = "dark"
-        self.themePreview.setTheme(self.selectedTheme,self.mode)
+        self.previewScheduler.renderNow(self.selectedTheme, self.mode)
 
     def themeUndoApplyButtonCallback(self, sender):
         themeScripter.applyTheme(self.backupTheme)
@@ -651,39 +747,74 @@ class ThemeManagerWindowController(ezui.WindowController):
             color = item["color"]
             darkColor = item["darkColor"]
             nameKey = item["nameKey"]
-            self.selectedTheme[nameKey] = color
-            self.selectedTheme[nameKey + ".dark"] = darkColor
-        self.themePreview.setTheme(self.selectedTheme,self.mode)
+            self.setSelectedThemeValue(nameKey, color)
+            self.setSelectedThemeValue(nameKey + ".dark", darkColor)
+        self.previewScheduler.request(self.selectedTheme, self.mode)
 
     def editorOnCurveSizeFieldCallback(self,sender):
         nameKey = "glyphViewOnCurvePointsSize"
-        self.selectedTheme[nameKey] = sender.get()
-        self.themePreview.setTheme(self.selectedTheme,self.mode)
+        self.setSelectedThemeValue(nameKey, sender.get())
+        self.previewScheduler.request(self.selectedTheme, self.mode)
                 
     def editorOffCurveSizeFieldCallback(self,sender):
         nameKey = "glyphViewOffCurvePointsSize"
-        self.selectedTheme[nameKey] = sender.get()
-        self.themePreview.setTheme(self.selectedTheme,self.mode)
+        self.setSelectedThemeValue(nameKey, sender.get())
+        self.previewScheduler.request(self.selectedTheme, self.mode)
         
     def editorGlyphStrokeWidthFieldCallback(self,sender):
         nameKey = "glyphViewStrokeWidth"
-        self.selectedTheme[nameKey] = sender.get()
-        self.themePreview.setTheme(self.selectedTheme,self.mode)
+        self.setSelectedThemeValue(nameKey, sender.get())
+        self.previewScheduler.request(self.selectedTheme, self.mode)
         
     def editorSelectionStrokeWidthFieldCallback(self,sender):
         nameKey = "glyphViewSelectionStrokeWidth"
-        self.selectedTheme[nameKey] = sender.get()
-        self.themePreview.setTheme(self.selectedTheme,self.mode)
+        self.setSelectedThemeValue(nameKey, sender.get())
+        self.previewScheduler.request(self.selectedTheme, self.mode)
         
     def editorHandleStrokeWidthFieldCallback(self,sender):
         nameKey = "glyphViewHandlesStrokeWidth"
-        self.selectedTheme[nameKey] = sender.get()
-        self.themePreview.setTheme(self.selectedTheme,self.mode)
+        self.setSelectedThemeValue(nameKey, sender.get())
+        self.previewScheduler.request(self.selectedTheme, self.mode)
 
     def editorNameFieldCallback(self, sender):
         nameKey = "themeName"
+        oldName = self.selectedTheme[nameKey]
         self.selectedTheme[nameKey] = sender.get()
-        
+        # keep the themes that inherit from this one pointing at it
+        userDefinedItems, _ = self.getThemeTableItems()
+        for item in userDefinedItems:
+            baseKey = themeScripter.themeDelta.baseKey(item)
+            if baseKey is not None and item[baseKey] == oldName:
+                item[baseKey] = self.selectedTheme[nameKey]
+
+    def setSelectedThemeValue(self, nameKey, value):
+        oldValue = self.selectedTheme.get(nameKey)
+        if themeScripter._valuesEqual(oldValue, value):
+            return
+        self.selectedTheme[nameKey] = value
+        self.propagateThemeValue(self.selectedTheme["themeName"], nameKey, oldValue, value)
+
+    def propagateThemeValue(self, themeName, nameKey, oldValue, value):
+        # themes inheriting the old value (not overriding it) follow the edit, all the way down
+        userDefinedItems, _ = self.getThemeTableItems()
+        # base name → the items based on it, built once for the whole walk
+        children = {}
+        for item in userDefinedItems:
+            baseName = themeScripter.themeDelta.baseName(item)
+            if baseName is not None:
+                children.setdefault(baseName, []).append(item)
+        visited = {themeName}
+        pending = [themeName]
+        while pending:
+            for item in children.get(pending.pop(), []):
+                if item["themeName"] in visited:
+                    continue
+                visited.add(item["themeName"])
+                if not themeScripter._valuesEqual(item.get(nameKey), oldValue):
+                    continue
+                item[nameKey] = value
+                pending.append(item["themeName"])
+
     # Editor
     # ------
 
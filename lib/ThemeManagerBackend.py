@@ -0,0 +1,160 @@
+"""
+The few RoboFont pieces the scripting API needs, behind one interface.
+
+    getDefault / setDefault                  RoboFont preferences
+    getExtensionDefault / setExtensionDefault / removeExtensionDefault
+    postNotification                         tell RoboFont the preferences changed
+    resourcesPath                            the extension resources folder
+
+RoboFontBackend forwards to mojo. StandaloneBackend is pure Python for
+running without RoboFont (build servers, the command line): preferences
+start out as the RoboFont default theme and extension defaults live in
+memory, or in a plist file when a path is given.
+
+getBackend picks RoboFont when mojo can be imported, setBackend swaps it.
+"""
+
+import os
+import plistlib
+from ThemeManagerSchema import RENAMEMAP
+
+RESOURCESPATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "resources")
+DEFAULTTHEMEFILE = "RFDefault.roboFontTheme"
+
+
+class RoboFontBackend(object):
+
+    def __init__(self):
+        from mojo.UI import getDefault, setDefault
+        from mojo.extensions import getExtensionDefault, setExtensionDefault, removeExtensionDefault, ExtensionBundle
+        from lib.tools.notifications import PostNotification
+        self._getDefault = getDefault
+        self._setDefault = setDefault
+        self._getExtensionDefault = getExtensionDefault
+        self._setExtensionDefault = setExtensionDefault
+        self._removeExtensionDefault = removeExtensionDefault
+        self._postNotification = PostNotification
+        self._bundle = ExtensionBundle("ThemeManager")
+
+    def getDefault(self, key):
+        return self._getDefault(key)
+
+    def setDefault(self, key, value):
+        self._setDefault(key, value)
+
+    def getExtensionDefault(self, key, fallback=None):
+        return self._getExtensionDefault(key, fallback)
+
+    def setExtensionDefault(self, key, value):
+        self._setExtensionDefault(key, value)
+
+    def removeExtensionDefault(self, key):
+        self._removeExtensionDefault(key)
+
+    def postNotification(self, name):
+        self._postNotification(name)
+
+    def resourcesPath(self):
+        return self._bundle.resourcesPath()
+
+
+class StandaloneBackend(object):
+
+    def __init__(self, preferences=None, defaultsPath=None, resourcesPath=RESOURCESPATH):
+        self._resourcesPath = resourcesPath
+        if preferences is None:
+            preferences = self._loadDefaultTheme()
+        self.preferences = dict(preferences)
+        self.defaultsPath = defaultsPath
+        self.extensionDefaults = {}
+        if defaultsPath is not None and os.path.exists(defaultsPath):
+            with open(defaultsPath, "rb") as defaultsFile:
+                self.extensionDefaults = plistlib.load(defaultsFile)
+        # names posted, there is nobody to tell
+        self.notifications = []
+
+    def getDefault(self, key):
+        return self.preferences.get(key)
+
+    def setDefault(self, key, value):
+        self.preferences[key] = value
+
+    def getExtensionDefault(self, key, fallback=None):
+        return self.extensionDefaults.get(key, fallback)
+
+    def setExtensionDefault(self, key, value):
+        self.extensionDefaults[key] = value
+        self._writeDefaults()
+
+    def removeExtensionDefault(self, key):
+        if self.extensionDefaults.pop(key, None) is not None:
+            self._writeDefaults()
+
+    def postNotification(self, name):
+        self.notifications.append(name)
+
+    def resourcesPath(self):
+        return self._resourcesPath
+
+    # internal
+
+    def _loadDefaultTheme(self):
+        path = os.path.join(self._resourcesPath, "presetThemes", DEFAULTTHEMEFILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path, "rb") as themeFile:
+            theme = plistlib.load(themeFile)
+        theme.pop("themeName", None)
+        theme.pop("themeType", None)
+        # current key names, also for the .dark variants
+        preferences = {}
+        for key, value in theme.items():
+            lightKey, dark, _ = key.partition(".dark")
+            preferences[RENAMEMAP.get(lightKey, lightKey) + (".dark" if dark else "")] = value
+        return preferences
+
+    def _writeDefaults(self):
+        if self.defaultsPath is None:
+            return
+        with open(self.defaultsPath, "wb") as defaultsFile:
+            plistlib.dump(self.extensionDefaults, defaultsFile)
+
+
+# kept when the module is reloaded, a setBackend made before that still holds
+_backend = globals().get("_backend")
+
+def getBackend():
+    global _backend
+    if _backend is None:
+        try:
+            _backend = RoboFontBackend()
+        except ImportError:
+            _backend = StandaloneBackend()
+    return _backend
+
+def setBackend(backend):
+    global _backend
+    _backend = backend
+
+# the mojo names, forwarded to the current backend
+
+def getDefault(key):
+    return getBackend().getDefault(key)
+
+def setDefault(key, value):
+    getBackend().setDefault(key, value)
+
+def getExtensionDefault(key, fallback=None):
+    return getBackend().getExtensionDefault(key, fallback)
+
+def setExtensionDefault(key, value):
+    getBackend().setExtensionDefault(key, value)
+
+def removeExtensionDefault(key):
+    getBackend().removeExtensionDefault(key)
+
+def postNotification(name):
+    getBackend().postNotification(name)
+
+def resourcesPath():
+    return getBackend().resourcesPath()
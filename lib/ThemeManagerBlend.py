@@ -0,0 +1,182 @@
+"""
+N-way theme blending over ThemeVector buffers.
+
+A blend of N themes with a weight per theme is one weighted sum over the
+flat color and size buffers. K blends (an animation, a ramp) are one
+(K × N) @ (N × values) matrix product. NumPy is used when it is available,
+otherwise the same math runs over array('d') buffers.
+
+A value missing from some of the themes is blended from the themes that
+do have it, with their weights renormalized, so a key only one theme
+defines comes through unchanged. Meta keys such as basedOn are left out,
+a blend has no base, the caller names it.
+"""
+
+from array import array
+from ThemeManagerVector import ThemeVector, CHANNELS, COLORCOUNT, INTSIZEOFFSETS
+from ThemeManagerSchema import THEMEMETAKEYS
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def blendVectors(vectors, weights):
+    """
+    Blend any number of ThemeVectors, one weight per vector.
+    """
+    return blendVectorSteps(vectors, [weights])[0]
+
+def blendVectorSteps(vectors, weightRows):
+    """
+    Blend the same vectors with several weight rows at once,
+    returns one ThemeVector per row.
+    """
+    if not vectors:
+        raise ValueError("Nothing to blend.")
+    for weights in weightRows:
+        if len(weights) != len(vectors):
+            raise ValueError(f"Expected {len(vectors)} weights, got {len(weights)}.")
+    if numpy is not None:
+        colorRows, sizeRows, present = _blendNumpy(vectors, weightRows)
+    else:
+        colorRows, sizeRows, present = _blendArrays(vectors, weightRows)
+    extras = _blendExtras(vectors, weightRows)
+    results = []
+    for colors, sizes, rowExtras in zip(colorRows, sizeRows, extras):
+        vector = ThemeVector(themeType="User")
+        vector.colors = colors
+        vector.sizes = sizes
+        vector.present = bytearray(present)
+        vector.extras = rowExtras
+        for offset in INTSIZEOFFSETS:
+            sizes[offset] = round(sizes[offset])
+        results.append(vector)
+    return results
+
+def rampVectors(vector1, vector2, steps):
+    """
+    `steps` evenly spaced blends from vector1 to vector2, both ends included.
+    """
+    if steps < 2:
+        return [vector1.copy()]
+    weightRows = []
+    for step in range(steps):
+        factor = step / (steps - 1)
+        weightRows.append((1 - factor, factor))
+    return blendVectorSteps([vector1, vector2], weightRows)
+
+# -----------------
+# Helpers
+# -----------------
+
+def _presence(vectors):
+    # per vector, 1.0/0.0 for every color channel and every size
+    colorMasks = []
+    sizeMasks = []
+    for vector in vectors:
+        present = vector.present
+        colorMask = array("d", [0.0]) * (COLORCOUNT * 2 * CHANNELS)
+        for slot in range(COLORCOUNT * 2):
+            if present[slot]:
+                colorMask[slot * CHANNELS:(slot + 1) * CHANNELS] = array("d", [1.0] * CHANNELS)
+        sizeMask = array("d", [float(b) for b in present[COLORCOUNT * 2:]])
+        colorMasks.append(colorMask)
+        sizeMasks.append(sizeMask)
+    union = bytearray(len(vectors[0].present))
+    for vector in vectors:
+        for slot, flag in enumerate(vector.present):
+            if flag:
+                union[slot] = 1
+    return colorMasks, sizeMasks, union
+
+def _blendNumpy(vectors, weightRows):
+    colorMasks, sizeMasks, union = _presence(vectors)
+    weights = numpy.asarray(weightRows, dtype="d")
+    results = []
+    for buffers, masks in (
+            ([v.colors for v in vectors], colorMasks),
+            ([v.sizes for v in vectors], sizeMasks)
+        ):
+        values = numpy.array([numpy.frombuffer(b, dtype="d") for b in buffers])
+        mask = numpy.array([numpy.frombuffer(m, dtype="d") for m in masks])
+        total = weights @ (values * mask)
+        norm = weights @ mask
+        # where the present weights cancel out take the first present value
+        first = values[mask.argmax(axis=0), numpy.arange(values.shape[1])]
+        safe = numpy.where(norm == 0, 1, norm)
+        blended = numpy.where(norm == 0, first, total / safe)
+        results.append([array("d", row.tobytes()) for row in blended])
+    return results[0], results[1], union
+
+def _blendArrays(vectors, weightRows):
+    colorMasks, sizeMasks, union = _presence(vectors)
+    results = []
+    for buffers, masks in (
+            ([v.colors for v in vectors], colorMasks),
+            ([v.sizes for v in vectors], sizeMasks)
+        ):
+        length = len(buffers[0])
+        rows = []
+        for weights in weightRows:
+            total = array("d", [0.0]) * length
+            norm = array("d", [0.0]) * length
+            for weight, values, mask in zip(weights, buffers, masks):
+                for i in range(length):
+                    if mask[i]:
+                        total[i] += weight * values[i]
+                        norm[i] += weight
+            for i in range(length):
+                if norm[i]:
+                    total[i] /= norm[i]
+                else:
+                    for values, mask in zip(buffers, masks):
+                        if mask[i]:
+                            total[i] = values[i]
+                            break
+            rows.append(total)
+        results.append(rows)
+    return results[0], results[1], union
+
+def _blendExtras(vectors, weightRows):
+    # keys outside the schema, blended when every theme has numbers of the same shape
+    keys = []
+    for vector in vectors:
+        for key in vector.extras:
+            if key not in keys and key not in THEMEMETAKEYS:
+                keys.append(key)
+    rows = [{} for _ in weightRows]
+    for key in keys:
+        found = [(i, vector.extras[key]) for i, vector in enumerate(vectors) if key in vector.extras]
+        values = [value for _, value in found]
+        if not sameNumericShape(values):
+            for row in rows:
+                row[key] = values[0]
+            continue
+        for row, weights in zip(rows, weightRows):
+            rowWeights = [weights[i] for i, _ in found]
+            norm = sum(rowWeights)
+            if not norm:
+                row[key] = values[0]
+                continue
+            if isinstance(values[0], (int, float)):
+                row[key] = sum(w * v for w, v in zip(rowWeights, values)) / norm
+            else:
+                row[key] = [
+                    sum(w * v[c] for w, v in zip(rowWeights, values)) / norm
+                    for c in range(len(values[0]))
+                ]
+    return rows
+
+def sameNumericShape(values):
+    # all numbers, or all lists of numbers of the same length
+    def isNumber(value):
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if all(isNumber(value) for value in values):
+        return True
+    if not all(isinstance(value, (list, tuple)) for value in values):
+        return False
+    if len({len(value) for value in values}) != 1:
+        return False
+    return all(isNumber(v) for value in values for v in value)
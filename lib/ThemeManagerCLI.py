@@ -0,0 +1,217 @@
+"""
+Theme Manager without RoboFont.
+
+    python -m ThemeManagerCLI validate themes/
+    python -m ThemeManagerCLI convert themes/ --to binary -o out/
+    python -m ThemeManagerCLI convert themes/ --to pack -o library.roboFontThemePack
+    python -m ThemeManagerCLI blend a.roboFontTheme b.roboFontTheme --weights .25 .75 -o blend.roboFontTheme
+    python -m ThemeManagerCLI diff a.roboFontTheme b.roboFontTheme
+    python -m ThemeManagerCLI contrast themes/ --minimum 3
+    python -m ThemeManagerCLI duplicates themes/
+    python -m ThemeManagerCLI similar mine.roboFontTheme themes/ -k 5 --max-delta-e 10
+
+Paths can be theme files, packs or folders holding either. Runs on the
+standalone backend, the RoboFont preferences are never touched. Exits
+with 1 when something didn't validate, differs or fails the audit.
+"""
+
+import os
+import sys
+import argparse
+import ThemeManagerScripting as themeScripter
+import ThemeManagerBackend as themeBackend
+from ThemeManagerPack import PACKEXTENSION, writeThemePack
+from ThemeManagerLoader import THEMEEXTENSION, findThemeFiles
+from ThemeManagerValidator import formatErrors
+from ThemeManagerVector import ThemeVector
+from ThemeManagerBlend import blendVectors
+from ThemeManagerDedupe import findDuplicates, duplicateReport
+from ThemeManagerSimilarity import SimilarityIndex
+
+
+def validateCommand(arguments):
+    themePaths, packPaths = _expandPaths(arguments.paths)
+    loader = themeScripter.loadThemeFiles(
+        themePaths,
+        workers=arguments.workers,
+        processes=arguments.processes
+    )
+    failed = 0
+    total = loader.total
+    for path, theme, errors in sorted(loader, key=lambda result: result[0]):
+        for line in formatErrors(errors):
+            print(f"{path}: {line}")
+        failed += bool(errors)
+    for path in packPaths:
+        for theme in themeScripter.readThemeFile(path):
+            _, errors = themeScripter.validateTheme(theme, fill=False)
+            for line in formatErrors(errors):
+                print(f"{path}/{theme['themeName']}: {line}")
+            failed += bool(errors)
+            total += 1
+    print(f"{total - failed}/{total} themes valid ({loader.throughput:.0f} files/s)", file=sys.stderr)
+    return 1 if failed else 0
+
+def convertCommand(arguments):
+    themes = _iterThemes(sum(_expandPaths(arguments.paths), []))
+    if arguments.to == "pack":
+        count = writeThemePack(arguments.output, themes)
+        print(f"Packed {count} themes into {arguments.output}", file=sys.stderr)
+        return 0
+    count = 0
+    if os.path.splitext(arguments.output)[1] == THEMEEXTENSION:
+        # a single file out, the first theme
+        themeScripter.exportTheme(next(themes), arguments.output, arguments.to, arguments.delta)
+        count = 1
+    else:
+        os.makedirs(arguments.output, exist_ok=True)
+        for theme in themes:
+            fileName = f"{_safeFileName(theme['themeName'])}{THEMEEXTENSION}"
+            themeScripter.exportTheme(theme, os.path.join(arguments.output, fileName), arguments.to, arguments.delta)
+            count += 1
+    print(f"Converted {count} themes into {arguments.output}", file=sys.stderr)
+    return 0
+
+def blendCommand(arguments):
+    themes = list(_iterThemes(sum(_expandPaths(arguments.paths), [])))
+    if not themes:
+        arguments.parser.error("no themes found to blend")
+    weights = arguments.weights
+    if weights is None:
+        weights = [1 / len(themes)] * len(themes)
+    if len(weights) != len(themes):
+        print(f"Got {len(weights)} weights for {len(themes)} themes.", file=sys.stderr)
+        return 2
+    newTheme = blendVectors([ThemeVector.fromDict(theme) for theme in themes], weights).toDict()
+    newTheme["themeName"] = arguments.name or os.path.splitext(os.path.basename(arguments.output))[0]
+    themeScripter.exportTheme(newTheme, arguments.output, arguments.format)
+    return 0
+
+def diffCommand(arguments):
+    theme1 = themeScripter.readThemeFile(arguments.theme1)[0]
+    theme2 = themeScripter.readThemeFile(arguments.theme2)[0]
+    differences = themeScripter.diffThemes(theme1, theme2)
+    for key, (value1, value2) in sorted(differences.items()):
+        print(f"{key}: {_formatValue(value1)} → {_formatValue(value2)}")
+    return 1 if differences else 0
+
+def contrastCommand(arguments):
+    failed = 0
+    for theme in _iterThemes(sum(_expandPaths(arguments.paths), [])):
+        for key, ratio in themeScripter.contrastAudit(theme, dark=arguments.dark):
+            if ratio >= arguments.minimum:
+                break
+            print(f"{theme['themeName']}: {key} {ratio:.2f}:1")
+            failed += 1
+    return 1 if failed else 0
+
+def duplicatesCommand(arguments):
+    groups = findDuplicates(_iterThemes(sum(_expandPaths(arguments.paths), [])))
+    for line in duplicateReport(groups):
+        print(line)
+    return 1 if groups else 0
+
+def similarCommand(arguments):
+    theme = themeScripter.readThemeFile(arguments.theme)[0]
+    index = SimilarityIndex()
+    for other in _iterThemes(sum(_expandPaths(arguments.paths), [])):
+        index.add(other["themeName"], other)
+    for themeName, distance in index.query(theme, arguments.k, arguments.max_delta_e, exclude={theme["themeName"]}):
+        print(f"{distance:6.2f}  {themeName}")
+    return 0
+
+
+def main(args=None):
+    # the command line never talks to RoboFont
+    themeBackend.setBackend(themeBackend.StandaloneBackend())
+
+    parser = argparse.ArgumentParser(prog="ThemeManagerCLI", description="Theme Manager without RoboFont.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    validate = commands.add_parser("validate", help="validate theme files")
+    validate.add_argument("paths", nargs="+")
+    validate.add_argument("--workers", type=int, default=None)
+    validate.add_argument("--processes", action="store_true", help="parse in a process pool")
+    validate.set_defaults(function=validateCommand)
+
+    convert = commands.add_parser("convert", help="convert between xml, binary plist and packs")
+    convert.add_argument("paths", nargs="+")
+    convert.add_argument("--to", choices=sorted(themeScripter.THEMEFILEFORMATS) + ["pack"], required=True)
+    convert.add_argument("-o", "--output", required=True, help="a folder, a theme file or a pack")
+    convert.add_argument("--delta", action="store_true", help="write themes with a base as the keys that differ from it")
+    convert.set_defaults(function=convertCommand)
+
+    blend = commands.add_parser("blend", help="blend themes into a new one")
+    blend.add_argument("paths", nargs="+")
+    blend.add_argument("--weights", type=float, nargs="+", default=None)
+    blend.add_argument("--name", default=None)
+    blend.add_argument("--format", choices=sorted(themeScripter.THEMEFILEFORMATS), default="xml")
+    blend.add_argument("-o", "--output", required=True)
+    blend.set_defaults(function=blendCommand, parser=blend)
+
+    diff = commands.add_parser("diff", help="list the keys two themes disagree on")
+    diff.add_argument("theme1")
+    diff.add_argument("theme2")
+    diff.set_defaults(function=diffCommand)
+
+    audit = commands.add_parser("contrast", help="list colors below a contrast ratio against the background")
+    audit.add_argument("paths", nargs="+")
+    audit.add_argument("--minimum", type=float, default=3.0, help="3 is WCAG AA for graphics")
+    audit.add_argument("--dark", action="store_true", help="audit the dark mode colors")
+    audit.set_defaults(function=contrastCommand)
+
+    duplicates = commands.add_parser("duplicates", help="list themes that look the same")
+    duplicates.add_argument("paths", nargs="+")
+    duplicates.set_defaults(function=duplicatesCommand)
+
+    similar = commands.add_parser("similar", help="list the themes that look closest to a theme")
+    similar.add_argument("theme")
+    similar.add_argument("paths", nargs="+")
+    similar.add_argument("-k", type=int, default=5)
+    similar.add_argument("--max-delta-e", type=float, default=None, help="mean OKLab ΔE, below 2 is hard to tell apart")
+    similar.set_defaults(function=similarCommand)
+
+    arguments = parser.parse_args(args)
+    return arguments.function(arguments)
+
+# -----------------
+# Helpers
+# -----------------
+
+def _expandPaths(paths):
+    # ([theme files], [packs]), folders are searched
+    themePaths = []
+    packPaths = []
+    for path in paths:
+        if os.path.isdir(path):
+            themePaths.extend(findThemeFiles(path))
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                packPaths.extend(
+                    os.path.join(root, fileName)
+                    for fileName in sorted(files)
+                    if os.path.splitext(fileName)[1] == PACKEXTENSION
+                )
+        elif os.path.splitext(path)[1] == PACKEXTENSION:
+            packPaths.append(path)
+        else:
+            themePaths.append(path)
+    return themePaths, packPaths
+
+def _iterThemes(paths):
+    for path in paths:
+        yield from themeScripter.readThemeFile(path)
+
+def _safeFileName(themeName):
+    return themeName.replace("/", "-").replace(":", "-")
+
+def _formatValue(value):
+    if isinstance(value, (list, tuple)):
+        return "(" + ", ".join(f"{v:g}" for v in value) + ")"
+    if value is None:
+        return "missing"
+    return f"{value:g}"
+
+
+if __name__ == "__main__":
+    sys.exit(main())
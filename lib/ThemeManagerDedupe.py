@@ -0,0 +1,85 @@
+"""
+Finding identical themes and sharing identical values between them.
+
+canonicalHash digests a theme's values rounded to QUANTUM, with the
+name, type and base reference left out. Two themes with the same hash
+look the same in RoboFont, whatever their names, key order, list vs
+tuple or float noise from a round trip through NSColor.
+
+ValueInterner hands out one tuple object per distinct color, so a
+library of themes built from the same few colors keeps those colors
+once instead of once per key per theme.
+"""
+
+import hashlib
+from ThemeManagerSchema import THEMEMETAKEYS
+
+# 1/1024 is finer than the 8 bits per channel the color wells show
+QUANTUM = 1 / 1024
+
+
+def canonicalHash(theme, quantum=QUANTUM):
+    digest = hashlib.sha1()
+    for key in sorted(theme):
+        if key in THEMEMETAKEYS:
+            continue
+        digest.update(f"{key}={_quantize(theme[key], quantum)!r};".encode("utf-8"))
+    return digest.hexdigest()
+
+def findDuplicates(themes, quantum=QUANTUM):
+    """
+    Groups of theme names with the same canonical hash, only groups of
+    two or more, each in the order the themes came in.
+    """
+    groups = {}
+    for theme in themes:
+        groups.setdefault(canonicalHash(theme, quantum), []).append(theme["themeName"])
+    return [names for names in groups.values() if len(names) > 1]
+
+def duplicateReport(groups):
+    lines = []
+    for names in groups:
+        keep, others = names[0], names[1:]
+        lines.append(f"{keep}: identical to {', '.join(others)}")
+    return lines
+
+
+class ValueInterner(object):
+
+    def __init__(self):
+        self._values = {}
+        self.seen = 0
+
+    def __len__(self):
+        return len(self._values)
+
+    def intern(self, value):
+        # colors come back as a shared tuple, anything else as it is
+        if not isinstance(value, (list, tuple)):
+            return value
+        self.seen += 1
+        value = tuple(value)
+        return self._values.setdefault(value, value)
+
+    def internTheme(self, theme):
+        for key, value in theme.items():
+            if isinstance(value, (list, tuple)):
+                theme[key] = self.intern(value)
+        return theme
+
+    def clear(self):
+        self._values.clear()
+        self.seen = 0
+
+# -----------------
+# Helpers
+# -----------------
+
+def _quantize(value, quantum):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return round(value / quantum)
+    if isinstance(value, (list, tuple)):
+        return tuple(_quantize(v, quantum) for v in value)
+    return value
@@ -0,0 +1,195 @@
+"""
+Themes stored as the difference to a base theme.
+
+A delta theme names its base under "basedOn" and only holds the keys
+whose value differs from it, plus themeName/themeType:
+
+    dict(themeName="Mine", themeType="User", basedOn="RF Default",
+         glyphViewBackgroundColor=(1, 1, .9, 1))
+
+flattenTheme turns it back into a full theme, makeDelta does the
+opposite.
+
+Bases can be deltas themselves, which makes families: a house theme,
+team variants based on it, personal tweaks based on a team variant.
+These chains can be any length. ThemeInheritance flattens them, remembers the
+result and, when a theme changes, forgets only that theme and the ones
+that inherit from it.
+"""
+
+from ThemeManagerSchema import THEMEMETAKEYS
+
+BASEKEY = "basedOn"
+
+
+class InheritanceCycleError(ValueError):
+    pass
+
+
+def baseKey(theme):
+    # the key the theme names its base with, None for a flat theme
+    if theme.get(BASEKEY):
+        return BASEKEY
+    return None
+
+def baseName(theme):
+    key = baseKey(theme)
+    if key is None:
+        return None
+    return theme[key]
+
+def isDelta(theme):
+    return baseKey(theme) is not None
+
+def makeDelta(theme, base, tolerance=0, previousBase=None):
+    """
+    theme as a delta against base: its meta keys, basedOn and every key
+    that is missing from base or differs by more than tolerance.
+
+    When the base was just edited pass the version theme was flattened
+    against as previousBase, values still equal to that one are inherited
+    too instead of becoming overrides of the old value.
+    """
+    delta = dict(
+        themeName=theme["themeName"],
+        themeType=theme.get("themeType", "User"),
+    )
+    delta[BASEKEY] = base["themeName"]
+    for key, value in theme.items():
+        if key in THEMEMETAKEYS:
+            continue
+        if key in base and valuesEqual(value, base[key], tolerance):
+            continue
+        if previousBase is not None and key in previousBase and valuesEqual(value, previousBase[key], tolerance):
+            continue
+        delta[key] = value
+    return delta
+
+def flattenTheme(delta, base):
+    """
+    The full theme: base overlaid with the delta. The base reference is
+    kept so the theme can be stored as a delta again.
+    """
+    theme = {
+        key: value for key, value in base.items()
+        if key not in THEMEMETAKEYS
+    }
+    theme.update(delta)
+    return theme
+
+def stripDelta(theme):
+    # a flat copy without the base reference, for files older versions read
+    return {key: value for key, value in theme.items() if key != BASEKEY}
+
+def valuesEqual(value1, value2, tolerance=0):
+    if isinstance(value1, (int, float)) and isinstance(value2, (int, float)):
+        return abs(value1 - value2) <= tolerance
+    if isinstance(value1, (list, tuple)) and isinstance(value2, (list, tuple)):
+        if len(value1) != len(value2):
+            return False
+        return all(valuesEqual(v1, v2, tolerance) for v1, v2 in zip(value1, value2))
+    return value1 == value2
+
+
+class ThemeInheritance(object):
+
+    """
+    Memoized flattening over a set of themes that may inherit from each
+    other. getTheme is called with a theme name and returns the theme as
+    stored (flat or delta) or None.
+
+        inheritance = ThemeInheritance(index.get)
+        inheritance.flatten("Tal's Theme, team B")
+        inheritance.invalidate("House")   # → every name that has to re-flatten
+    """
+
+    def __init__(self, getTheme):
+        self._getTheme = getTheme
+        # theme name → flattened theme
+        self._flattened = {}
+        # base name → names flattened against it, the dependency graph
+        self._children = {}
+
+    def flatten(self, themeName):
+        """
+        The flattened theme, None when it doesn't exist. Raises
+        InheritanceCycleError when the chain leads back to itself.
+        """
+        flattened = self._flattened.get(themeName)
+        if flattened is not None:
+            return flattened
+        return self._resolve(themeName, [])
+
+    def flattenWith(self, theme):
+        # a theme that isn't one of ours (read from a file, say) against our bases
+        parentName = baseName(theme)
+        if parentName is None:
+            return theme
+        if parentName == theme.get("themeName"):
+            raise InheritanceCycleError(f"{parentName} → {parentName}")
+        base = self.flatten(parentName)
+        if base is None:
+            return theme
+        return flattenTheme(theme, base)
+
+    def ancestors(self, themeName):
+        # base names from the direct base up, following the stored themes
+        found = []
+        theme = self._getTheme(themeName)
+        while theme is not None:
+            parentName = baseName(theme)
+            if parentName is None:
+                break
+            if parentName == themeName or parentName in found:
+                raise InheritanceCycleError(" → ".join([themeName] + found + [parentName]))
+            found.append(parentName)
+            theme = self._getTheme(parentName)
+        return found
+
+    def invalidate(self, themeName):
+        """
+        Forget themeName and everything flattened against it, directly or
+        further down. Returns the set of forgotten names.
+        """
+        dropped = set()
+        stack = [themeName]
+        while stack:
+            name = stack.pop()
+            if name in dropped:
+                continue
+            dropped.add(name)
+            self._flattened.pop(name, None)
+            stack.extend(self._children.pop(name, ()))
+        return dropped
+
+    def clear(self):
+        self._flattened.clear()
+        self._children.clear()
+
+    # internal
+
+    def _resolve(self, themeName, chain):
+        flattened = self._flattened.get(themeName)
+        if flattened is not None:
+            return flattened
+        if themeName in chain:
+            cycle = chain[chain.index(themeName):] + [themeName]
+            raise InheritanceCycleError(" → ".join(cycle))
+        theme = self._getTheme(themeName)
+        if theme is None:
+            return None
+        parentName = baseName(theme)
+        if parentName is None:
+            flattened = theme
+        else:
+            chain.append(themeName)
+            base = self._resolve(parentName, chain)
+            chain.pop()
+            # also when the base is missing, adding it later re-flattens us
+            self._children.setdefault(parentName, set()).add(themeName)
+            if base is None:
+                flattened = theme
+            else:
+                flattened = flattenTheme(theme, base)
+        self._flattened[themeName] = flattened
+        return flattened
@@ -0,0 +1,180 @@
+"""
+Themes as masters in a designspace.
+
+Axes are named and defined as (minimum, default, maximum), like a variable
+font. Masters are themes placed at locations on those axes. The masters are
+compiled once into a fontTools varLib VariationModel and a set of deltas
+over the flat ThemeVector buffers, so any instance is the sum of
+O(masters) scaled deltas.
+
+One master has to sit at the default location, it provides every value
+the other masters leave out. Keys outside the schema (extras) are
+interpolated along with the rest when they are numbers of the same
+shape in every master, like blendVectors does, others come from the
+default master.
+
+Needs fontTools, which RoboFont ships. The scripting API only imports
+this module when a designspace is made, so the rest runs without it.
+"""
+
+from array import array
+from fontTools.varLib.models import VariationModel, normalizeLocation
+from ThemeManagerVector import ThemeVector, COLORLENGTH, SIZELENGTH, INTSIZEOFFSETS, CHANNELS, COLORCOUNT
+from ThemeManagerBlend import sameNumericShape
+from ThemeManagerSchema import THEMEMETAKEYS
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+    from fontTools.misc.vector import Vector
+
+
+class ThemeDesignspace(object):
+
+    def __init__(self, axes):
+        # name → (minimum, default, maximum)
+        self.axes = {name: tuple(values) for name, values in axes.items()}
+        for name, (minimum, default, maximum) in self.axes.items():
+            if not minimum <= default <= maximum:
+                raise ValueError(f"Axis '{name}' needs minimum <= default <= maximum.")
+        # list of (location, ThemeVector)
+        self.masters = []
+        self._compiled = None
+
+    def addMaster(self, vector, location):
+        location = self._checkLocation(location)
+        for i, (masterLocation, _) in enumerate(self.masters):
+            if masterLocation == location:
+                self.masters[i] = (location, vector)
+                break
+        else:
+            self.masters.append((location, vector))
+        self._compiled = None
+
+    def removeMaster(self, location):
+        location = self._checkLocation(location)
+        self.masters = [(l, v) for l, v in self.masters if l != location]
+        self._compiled = None
+
+    def instance(self, location):
+        """
+        The ThemeVector at location, a dict of axis name → user value.
+        Unspecified axes sit at their default.
+        """
+        model, deltas, present, extras, numericExtras = self._compile()
+        normalized = normalizeLocation(self._checkLocation(location), self.axes)
+        scalars = model.getScalars(normalized)
+        if numpy is not None:
+            values = numpy.asarray(scalars, dtype="d") @ deltas
+            values = array("d", values.tobytes())
+        else:
+            values = array("d", VariationModel.interpolateFromDeltasAndScalars(deltas, scalars))
+        vector = ThemeVector(themeType="User")
+        vector.colors = values[:COLORLENGTH]
+        vector.sizes = values[COLORLENGTH:COLORLENGTH + SIZELENGTH]
+        for offset in INTSIZEOFFSETS:
+            vector.sizes[offset] = round(vector.sizes[offset])
+        vector.present = bytearray(present)
+        vector.extras = dict(extras)
+        index = COLORLENGTH + SIZELENGTH
+        for key, length in numericExtras:
+            if length is None:
+                vector.extras[key] = values[index]
+                index += 1
+            else:
+                vector.extras[key] = list(values[index:index + length])
+                index += length
+        return vector
+
+    # internal
+
+    def _checkLocation(self, location):
+        for name in location:
+            if name not in self.axes:
+                raise ValueError(f"Unknown axis '{name}'.")
+        location = {name: location.get(name, default) for name, (_, default, _) in self.axes.items()}
+        return location
+
+    def _compile(self):
+        if self._compiled is not None:
+            return self._compiled
+        defaultLocation = {name: default for name, (_, default, _) in self.axes.items()}
+        defaultMaster = None
+        for location, vector in self.masters:
+            if location == defaultLocation:
+                defaultMaster = vector
+                break
+        if defaultMaster is None:
+            raise ValueError("A designspace needs a master at the default location.")
+        fallback = _flatten(defaultMaster)
+        extras, numericExtras = _splitExtras(self.masters, defaultMaster)
+        locations = []
+        masterValues = []
+        for location, vector in self.masters:
+            locations.append(normalizeLocation(location, self.axes))
+            values = _flatten(vector, fallback)
+            # numeric extras ride along at the end, missing ones from the default master
+            for key, length in numericExtras:
+                value = vector.extras.get(key, defaultMaster.extras.get(key))
+                if length is None:
+                    values.append(value)
+                else:
+                    values.extend(value)
+            masterValues.append(values)
+        model = VariationModel(locations, axisOrder=list(self.axes))
+        if numpy is not None:
+            # getDeltas subtracts in place, hand it copies
+            deltas = model.getDeltas([numpy.array(values, dtype="d") for values in masterValues])
+            deltas = numpy.array(deltas)
+        else:
+            deltas = model.getDeltas([Vector(values) for values in masterValues])
+        self._compiled = (model, deltas, defaultMaster.present, extras, numericExtras)
+        return self._compiled
+
+
+# -----------------
+# Helpers
+# -----------------
+
+def _splitExtras(masters, defaultMaster):
+    """
+    ({key: value} of the extras taken as they are, [(key, length)] of
+    the ones to interpolate, length None for a single number).
+    """
+    keys = []
+    for _, vector in masters:
+        for key in vector.extras:
+            if key not in keys and key not in THEMEMETAKEYS:
+                keys.append(key)
+    extras = {}
+    numericExtras = []
+    for key in keys:
+        if key not in defaultMaster.extras:
+            # nothing to fill the other masters in with
+            extras[key] = next(vector.extras[key] for _, vector in masters if key in vector.extras)
+            continue
+        values = [vector.extras.get(key, defaultMaster.extras[key]) for _, vector in masters]
+        if not sameNumericShape(values):
+            extras[key] = defaultMaster.extras[key]
+        elif isinstance(values[0], (list, tuple)):
+            numericExtras.append((key, len(values[0])))
+        else:
+            numericExtras.append((key, None))
+    return extras, numericExtras
+
+def _flatten(vector, fallback=None):
+    # colors + sizes as one list, missing values taken from the fallback
+    values = list(vector.colors) + list(vector.sizes)
+    if fallback is not None:
+        present = vector.present
+        for slot, flag in enumerate(present):
+            if flag:
+                continue
+            if slot < COLORCOUNT * 2:
+                start = slot * CHANNELS
+                values[start:start + CHANNELS] = fallback[start:start + CHANNELS]
+            else:
+                index = COLORLENGTH + slot - COLORCOUNT * 2
+                values[index] = fallback[index]
+    return values
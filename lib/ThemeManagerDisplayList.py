@@ -0,0 +1,365 @@
+"""
+The theme preview as a list of drawing primitives.
+
+buildDisplayList turns a glyph geometry (ThemeManagerGlyphGeometry), the
+font's vertical metrics and a resolved palette into an immutable
+DisplayList. Backends only draw what is in it: the Merz one in
+ThemeManagerGlyphView, and toSVG here, which needs nothing but Python:
+
+    palette = resolvePalette(theme, "light")
+    displayList = buildDisplayList(geometry, metrics, palette, (300, 300))
+    open("preview.svg", "w").write(toSVG(displayList))
+
+Every primitive has a group (the layer it belongs to) and a name that
+stays the same across palettes. Two display lists for the same glyph
+line up item by item, so a backend can update only what differs.
+
+Building happens in two steps. buildShapes does the geometry work (the
+outline, every point symbol) and depends on the glyph, the sizes in the
+palette and the view size only, DisplayListCache memoizes it by those.
+applyPalette fills in the colors, which is one replace per item. A
+color edit reuses the shapes, and styleChanges lists just the colors a
+backend has to set.
+"""
+
+from collections import OrderedDict, namedtuple
+from fontTools.pens.recordingPen import RecordingPen
+from fontTools.pens.transformPen import TransformPen
+from ThemeManagerSchema import FALLBACKCOLOR, FALLBACKSIZE
+import ThemeManagerGlyphGeometry as glyphGeometry
+
+# theme values the preview draws with, see resolvePalette
+PREVIEWSIZEKEYS = [
+    "glyphViewOffCurvePointsSize",
+    "glyphViewOnCurvePointsSize",
+    "glyphViewStrokeWidth",
+    "glyphViewHandlesStrokeWidth",
+]
+PREVIEWCOLORKEYS = [
+    "glyphViewAlternateFillColor",
+    "glyphViewStrokeColor",
+    "glyphViewBluesColor",
+    "glyphViewComponentFillColor",
+    "glyphViewComponentStrokeColor",
+    "glyphViewBackgroundColor",
+    "glyphViewMarginColor",
+    "glyphViewFontMetricsStrokeColor",
+    "glyphViewCubicHandlesStrokeColor",
+    "glyphViewOffCurvePointsFill",
+    "glyphViewOffCurveCubicPointsStroke",
+    "glyphViewTangentPointsFill",
+    "glyphViewTangentPointsStroke",
+    "glyphViewCornerPointsFill",
+    "glyphViewCornerPointsStroke",
+    "glyphViewSmoothPointStroke",
+    "glyphViewCurvePointsStroke",
+    "glyphViewCurvePointsFill",
+    "glyphViewMeasurementsForegroundColor",
+    "glyphViewMeasurementsBackgroundColor",
+    "glyphViewMeasurementsTextColor",
+    "glyphViewAnchorColor",
+    "glyphViewAnchorTextColor",
+]
+# point kind → (shape, size factor, fill key, stroke key, size key)
+POINTSTYLES = {
+    glyphGeometry.OFFCURVE: ("oval", 1, "glyphViewOffCurvePointsFill", "glyphViewOffCurveCubicPointsStroke", "glyphViewOffCurvePointsSize"),
+    glyphGeometry.CORNER: ("rectangle", 1, "glyphViewCornerPointsFill", "glyphViewCornerPointsStroke", "glyphViewOnCurvePointsSize"),
+    glyphGeometry.TANGENT: ("triangle", 1, "glyphViewTangentPointsFill", "glyphViewTangentPointsStroke", "glyphViewOnCurvePointsSize"),
+    glyphGeometry.SMOOTH: ("oval", 1.2, "glyphViewCurvePointsFill", "glyphViewSmoothPointStroke", "glyphViewOnCurvePointsSize"),
+    glyphGeometry.CURVE: ("oval", 1.2, "glyphViewCurvePointsFill", "glyphViewCurvePointsStroke", "glyphViewOnCurvePointsSize"),
+}
+# back to front, the order the layers are stacked in
+GROUPS = ("background", "glyph", "blues", "handles", "lines", "points", "components", "text")
+CAPTIONSIZE = 10
+
+FontMetrics = namedtuple("FontMetrics", "descender xHeight capHeight ascender blueValues")
+
+# the primitives, colors are RGBA tuples or None, paths are pen calls
+Rect = namedtuple("Rect", "group name position size fillColor")
+Path = namedtuple("Path", "group name calls fillColor strokeColor strokeWidth")
+Line = namedtuple("Line", "group name lines strokeColor strokeWidth")
+Symbol = namedtuple("Symbol", "group name shape position size fillColor")
+Text = namedtuple("Text", "group name position text fillColor pointSize horizontalAlignment verticalAlignment")
+
+# items with their colors left None, bindings are (item index, color field, palette key)
+Shapes = namedtuple("Shapes", "size transform items bindings")
+DisplayList = namedtuple("DisplayList", "size transform items shapes")
+
+
+def fontMetrics(font):
+    info = font.info
+    return FontMetrics(info.descender, info.xHeight, info.capHeight, info.ascender, tuple(info.postscriptBlueValues or ()))
+
+def resolvePalette(theme, mode):
+    # the theme values the preview draws with, colors for the given mode
+    suffix = ".dark" if mode == "dark" else ""
+    palette = {
+        key: theme.get(key, FALLBACKSIZE)
+        for key in PREVIEWSIZEKEYS
+    }
+    for key in PREVIEWCOLORKEYS:
+        palette[key] = tuple(theme.get(f"{key}{suffix}", FALLBACKCOLOR))
+    return palette
+
+def sizesKey(palette):
+    # the part of a palette the shapes depend on
+    return tuple(palette[key] for key in PREVIEWSIZEKEYS)
+
+def buildDisplayList(geometry, metrics, palette, size, componentGeometries=None):
+    """
+    componentGeometries maps a component's base glyph name to the base
+    glyph's geometry, components without an entry are left out.
+    """
+    return applyPalette(buildShapes(geometry, metrics, palette, size, componentGeometries), palette)
+
+def applyPalette(shapes, palette):
+    items = list(shapes.items)
+    colors = {}
+    for index, field, key in shapes.bindings:
+        colors.setdefault(index, {})[field] = palette[key]
+    for index, fields in colors.items():
+        items[index] = items[index]._replace(**fields)
+    return DisplayList(shapes.size, shapes.transform, tuple(items), shapes)
+
+def buildShapes(geometry, metrics, palette, size, componentGeometries=None):
+    """
+    Only the PREVIEWSIZEKEYS of palette are read, colors are bound to
+    their palette key and filled in by applyPalette.
+    """
+    viewWidth, viewHeight = size
+    verticalMetrics = [metrics.descender, metrics.xHeight, metrics.capHeight, metrics.ascender]
+    bottom = min(verticalMetrics)
+    top = max(verticalMetrics)
+    contentHeight = (top * .4) - bottom
+    fitHeight = viewHeight * 0.8
+    scale = fitHeight / contentHeight
+    x = (viewWidth - (geometry.width * scale)) / 2
+
+    items = []
+    bindings = []
+
+    def add(item, **colorKeys):
+        # colorKeys maps a color field of item to the palette key it shows
+        for field, key in colorKeys.items():
+            bindings.append((len(items), field, key))
+        items.append(item)
+
+    add(Rect("background", "background", (x, -1000), (geometry.width, 2000), None), fillColor="glyphViewBackgroundColor")
+    add(Rect("background", "margin", (-1000, -1000), (geometry.width + 1000, 2000), None), fillColor="glyphViewMarginColor")
+    if metrics.blueValues:
+        blueValues = list(zip(*[iter(metrics.blueValues)] * 2))[0]
+        add(Symbol("blues", "blues", "rectangle", (0, blueValues[0]), (1000, blueValues[1] - blueValues[0]), None), fillColor="glyphViewBluesColor")
+    add(Line(
+        "lines", "metrics",
+        tuple(((-1000, y), (1000, y)) for y in (metrics.xHeight, metrics.capHeight, 0)),
+        None, .5
+    ), strokeColor="glyphViewFontMetricsStrokeColor")
+
+    strokeWidth = palette["glyphViewStrokeWidth"] / 2
+    if componentGeometries is not None and geometry.components:
+        pen = RecordingPen()
+        for baseGlyph, transformation in geometry.components:
+            baseGeometry = componentGeometries.get(baseGlyph)
+            if baseGeometry is not None:
+                _replay(baseGeometry.contours, TransformPen(pen, transformation))
+        add(
+            Path("components", "components", tuple(pen.value), None, None, strokeWidth),
+            fillColor="glyphViewComponentFillColor", strokeColor="glyphViewComponentStrokeColor"
+        )
+    add(
+        Path("glyph", "outline", tuple(geometry.contours), None, None, strokeWidth),
+        fillColor="glyphViewAlternateFillColor", strokeColor="glyphViewStrokeColor"
+    )
+
+    # the measurement line, its two legs and where it crosses the outline
+    start, end = measurementLine = geometry.measurementLine
+    corner = (start[0], end[1])
+    measurements = geometry.intersections
+    onCurveSize = palette["glyphViewOnCurvePointsSize"]
+    add(Line("handles", "measurement", (measurementLine,), None, .5), strokeColor="glyphViewMeasurementsForegroundColor")
+    add(Line("handles", "measurementLegs", ((end, corner), (start, corner)), None, .5), strokeColor="glyphViewMeasurementsBackgroundColor")
+    add(_points("measurementPoints", "oval", measurements, onCurveSize * 2, None), fillColor="glyphViewMeasurementsForegroundColor")
+    if len(measurements) >= 2:
+        markers = [
+            (start[0], measurements[0][1]),
+            (start[0], measurements[1][1]),
+            (measurements[1][0], end[1]),
+            (measurements[0][0], end[1])
+        ]
+        add(_points("measurementMarkers", "oval", markers, onCurveSize * .8 * 2, None), fillColor="glyphViewMeasurementsBackgroundColor")
+    distance = round(((start[0] - end[0]) ** 2 + (start[1] - end[1]) ** 2) ** .5, 2)
+    middle = ((start[0] + end[0]) / 2 - 80, (start[1] + end[1]) / 2 - 20)
+    add(Text("text", "distance", middle, f"{distance}", None, CAPTIONSIZE, "center", "top"), fillColor="glyphViewMeasurementsTextColor")
+
+    add(Line("handles", "handles", tuple(geometry.handles), None, palette["glyphViewHandlesStrokeWidth"]), strokeColor="glyphViewCubicHandlesStrokeColor")
+
+    # one path per point style, however many points there are
+    pointGroups = {}
+    for kind, position in geometry.points:
+        pointGroups.setdefault(kind, []).append(position)
+    for kind in glyphGeometry.POINTKINDS:
+        if kind not in pointGroups:
+            continue
+        shape, sizeFactor, fillKey, strokeKey, sizeKey = POINTSTYLES[kind]
+        add(_points(f"points.{kind}", shape, pointGroups[kind], sizeFactor * palette[sizeKey] * 2, .5), fillColor=fillKey, strokeColor=strokeKey)
+
+    if geometry.anchors:
+        add(_points("anchors", "oval", [position for name, position in geometry.anchors], 6, 0), fillColor="glyphViewAnchorColor")
+    for index, (name, position) in enumerate(geometry.anchors):
+        add(Text("text", f"anchor.{index}", (position[0] - 85, position[1]), name, None, CAPTIONSIZE, "center", "center"), fillColor="glyphViewAnchorTextColor")
+
+    return Shapes(tuple(size), (scale, 0, 0, scale, 50, 30), tuple(items), tuple(bindings))
+
+def sameStructure(displayList1, displayList2):
+    # the same primitives in the same order, only their values may differ
+    if displayList1 is None or displayList2 is None or len(displayList1.items) != len(displayList2.items):
+        return False
+    return all(
+        type(item1) is type(item2) and item1.group == item2.group and item1.name == item2.name
+        for item1, item2 in zip(displayList1.items, displayList2.items)
+    )
+
+def styleChanges(displayList1, displayList2):
+    """
+    (item index, color field, color) for every color that differs
+    between two display lists made from the same shapes, None when the
+    shapes differ and a backend has to compare more than colors.
+    """
+    if displayList1 is None or displayList1.shapes is not displayList2.shapes:
+        return None
+    changes = []
+    for index, field, key in displayList2.shapes.bindings:
+        color = getattr(displayList2.items[index], field)
+        if getattr(displayList1.items[index], field) != color:
+            changes.append((index, field, color))
+    return changes
+
+
+class DisplayListCache(object):
+
+    """
+    Shapes by glyph hash, metrics, sizes and view size, the most recently
+    used maximum of them. Changing a color, or flipping between themes
+    with the same sizes, never rebuilds the shapes.
+    """
+
+    def __init__(self, maximum=64):
+        self.maximum = maximum
+        self._shapes = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._shapes)
+
+    def get(self, geometry, metrics, palette, size, componentGeometries=None):
+        return applyPalette(self.getShapes(geometry, metrics, palette, size, componentGeometries), palette)
+
+    def getShapes(self, geometry, metrics, palette, size, componentGeometries=None):
+        key = (geometry.contentHash, metrics, sizesKey(palette), tuple(size), _componentsKey(geometry, componentGeometries))
+        shapes = self._shapes.get(key)
+        if shapes is not None:
+            self._shapes.move_to_end(key)
+            self.hits += 1
+            return shapes
+        self.misses += 1
+        shapes = self._shapes[key] = buildShapes(geometry, metrics, palette, size, componentGeometries)
+        if len(self._shapes) > self.maximum:
+            self._shapes.popitem(last=False)
+        return shapes
+
+    def clear(self):
+        self._shapes.clear()
+
+# -----------
+# SVG backend
+# -----------
+
+def toSVG(displayList):
+    """
+    The display list as an SVG document. Font units go up, SVG goes
+    down, so the content is flipped inside the view.
+    """
+    width, height = displayList.size
+    scale, _, _, _, dx, dy = displayList.transform
+    lines = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{_number(width)}" height="{_number(height)}" viewBox="0 0 {_number(width)} {_number(height)}">',
+        f'<g transform="matrix({_number(scale)} 0 0 {_number(-scale)} {_number(dx)} {_number(height - dy)})">'
+    ]
+    for group in GROUPS:
+        for item in displayList.items:
+            if item.group == group:
+                lines.append(_svgItem(item, scale))
+    lines.append("</g>")
+    lines.append("</svg>")
+    return "\n".join(line for line in lines if line)
+
+# -----------------
+# Helpers
+# -----------------
+
+def _points(name, shape, positions, size, strokeWidth):
+    pen = RecordingPen()
+    glyphGeometry.drawPointShapes(pen, shape, positions, size)
+    return Path("points", name, tuple(pen.value), None, None, strokeWidth)
+
+def _replay(calls, pen):
+    for method, points in calls:
+        getattr(pen, method)(*points)
+
+def _componentsKey(geometry, componentGeometries):
+    # editing a base glyph changes the display list of the glyphs using it
+    if componentGeometries is None:
+        return None
+    return tuple(
+        getattr(componentGeometries.get(baseGlyph), "contentHash", None)
+        for baseGlyph, _ in geometry.components
+    )
+
+def _number(value):
+    return f"{value:.3f}".rstrip("0").rstrip(".")
+
+def _svgColor(color, attribute):
+    if color is None:
+        return f'{attribute}="none"'
+    r, g, b, a = color
+    return f'{attribute}="rgb({round(r * 255)},{round(g * 255)},{round(b * 255)})" {attribute}-opacity="{_number(a)}"'
+
+def _svgPathData(calls):
+    data = []
+    commands = dict(moveTo="M", lineTo="L", curveTo="C", qCurveTo="Q", closePath="Z", endPath="")
+    for method, points in calls:
+        command = commands[method]
+        coordinates = " ".join(f"{_number(x)} {_number(y)}" for x, y in points)
+        data.append(f"{command}{coordinates}" if command else "")
+    return " ".join(part for part in data if part)
+
+def _svgItem(item, scale):
+    if isinstance(item, Rect):
+        (x, y), (w, h) = item.position, item.size
+        return f'<rect x="{_number(x)}" y="{_number(y)}" width="{_number(w)}" height="{_number(h)}" {_svgColor(item.fillColor, "fill")}/>'
+    if isinstance(item, Symbol):
+        (x, y), (w, h) = item.position, item.size
+        return f'<rect x="{_number(x - w / 2)}" y="{_number(y - h / 2)}" width="{_number(w)}" height="{_number(h)}" {_svgColor(item.fillColor, "fill")}/>'
+    if isinstance(item, Path):
+        if not item.calls:
+            return ""
+        stroke = _svgColor(item.strokeColor if item.strokeWidth else None, "stroke")
+        return f'<path d="{_svgPathData(item.calls)}" {_svgColor(item.fillColor, "fill")} {stroke} stroke-width="{_number(item.strokeWidth or 0)}"/>'
+    if isinstance(item, Line):
+        if not item.lines:
+            return ""
+        data = " ".join(f"M{_number(x1)} {_number(y1)} L{_number(x2)} {_number(y2)}" for (x1, y1), (x2, y2) in item.lines)
+        return f'<path d="{data}" fill="none" {_svgColor(item.strokeColor, "stroke")} stroke-width="{_number(item.strokeWidth)}"/>'
+    if isinstance(item, Text):
+        x, y = item.position
+        anchor = dict(left="start", center="middle", right="end").get(item.horizontalAlignment, "middle")
+        # captions keep their point size and read upright, undo the flip and the scale
+        return (
+            f'<text transform="translate({_number(x)} {_number(y)}) scale({_number(1 / scale)} {_number(-1 / scale)})" '
+            f'font-size="{_number(item.pointSize)}" text-anchor="{anchor}" {_svgColor(item.fillColor, "fill")}>{_escape(item.text)}</text>'
+        )
+    raise TypeError(f"Unknown display list item: {item!r}")
+
+def _escape(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
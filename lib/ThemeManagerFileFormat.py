@@ -0,0 +1,95 @@
+"""
+The flavors of .roboFontTheme files.
+
+    xml      plistlib XML, what every Theme Manager version writes and reads
+    binary   plistlib binary plist
+    zlib     "TMZ1" followed by a zlib compressed binary plist
+
+Reading looks at the first bytes, so the file extension stays the same
+for all three and nobody has to say which one a file is.
+
+    python ThemeManagerFileFormat.py path/to/presetThemes
+"""
+
+import os
+import sys
+import time
+import zlib
+import plistlib
+
+FORMATS = ("xml", "binary", "zlib")
+BINARYMAGIC = b"bplist00"
+ZLIBMAGIC = b"TMZ1"
+
+
+def detectFormat(data):
+    """
+    "xml", "binary" or "zlib" from the first bytes, None when it is none of them.
+    """
+    if data.startswith(ZLIBMAGIC):
+        return "zlib"
+    if data.startswith(BINARYMAGIC):
+        return "binary"
+    # skip a byte order mark and white space before <?xml or <plist
+    start = data[:64].lstrip(b"\xef\xbb\xbf \t\r\n")
+    if start.startswith(b"<?xml") or start.startswith(b"<plist") or start.startswith(b"<!DOCTYPE"):
+        return "xml"
+    return None
+
+def loads(data):
+    fileFormat = detectFormat(data)
+    if fileFormat is None:
+        raise ValueError("Not a theme file.")
+    if fileFormat == "zlib":
+        data = zlib.decompress(data[len(ZLIBMAGIC):])
+    return plistlib.loads(data)
+
+def dumps(themeData, fileFormat="xml"):
+    if fileFormat == "xml":
+        return plistlib.dumps(themeData, fmt=plistlib.FMT_XML)
+    if fileFormat == "binary":
+        return plistlib.dumps(themeData, fmt=plistlib.FMT_BINARY)
+    if fileFormat == "zlib":
+        return ZLIBMAGIC + zlib.compress(plistlib.dumps(themeData, fmt=plistlib.FMT_BINARY), 9)
+    raise ValueError(f"Unknown theme file format: {fileFormat}")
+
+def load(path):
+    with open(path, "rb") as themeFile:
+        return loads(themeFile.read())
+
+def dump(themeData, path, fileFormat="xml"):
+    data = dumps(themeData, fileFormat)
+    with open(path, "wb") as themeFile:
+        themeFile.write(data)
+
+def benchmark(presetFolder, iterations=50):
+    """
+    Size and parse time of every preset in each format.
+    Returns format → dict(size=total bytes, parse=mean seconds per full load).
+    """
+    themes = []
+    for fileName in sorted(os.listdir(presetFolder)):
+        if os.path.splitext(fileName)[1] == ".roboFontTheme":
+            themes.append(load(os.path.join(presetFolder, fileName)))
+    results = {}
+    for fileFormat in FORMATS:
+        encoded = [dumps(theme, fileFormat) for theme in themes]
+        start = time.perf_counter()
+        for _ in range(iterations):
+            for data in encoded:
+                loads(data)
+        results[fileFormat] = dict(
+            size=sum(len(data) for data in encoded),
+            parse=(time.perf_counter() - start) / iterations
+        )
+    return results
+
+
+if __name__ == "__main__":
+    results = benchmark(sys.argv[1])
+    xml = results["xml"]
+    for fileFormat, result in results.items():
+        print(
+            f"{fileFormat:>6}: {result['size'] / 1024:7.1f} KB ({result['size'] / xml['size']:.0%}), "
+            f"{result['parse'] * 1000:6.2f} ms ({xml['parse'] / result['parse']:.1f}x)"
+        )
@@ -0,0 +1,173 @@
+"""
+Everything the preview needs to know about a glyph, worked out once.
+
+    geometry = glyphGeometry(glyph)
+    geometry.points          [(kind, (x, y)), ...], kind is one of POINTKINDS
+    geometry.handles         [((x, y), (x, y)), ...] off-curve to on-curve
+    geometry.intersections   where MEASUREMENTLINE crosses the outline, sorted
+    geometry.anchors         [(name, (x, y)), ...]
+    geometry.components      [(base glyph name, transformation), ...]
+    geometry.contours        the outline as pen calls, components left out
+    geometry.contentHash     a digest of all of the above, for memoizing
+
+drawPointShapes draws many point symbols into one pen, so a backend can
+show every point of one style as a single path.
+
+Nothing here depends on RoboFont, glyph is a fontParts or defcon glyph.
+Inside RoboFont the preview asks for it as a defcon representation,
+which defcon throws away whenever the glyph changes.
+"""
+
+import hashlib
+from fontTools.pens.basePen import BasePen
+from fontTools.misc.bezierTools import curveLineIntersections, lineLineIntersections
+
+GEOMETRYREPRESENTATION = "com.andyclymer.themeManager.glyphGeometry"
+# the line the preview measures the glyph along
+MEASUREMENTLINE = ((59, -19), (254, 132))
+
+CORNER = "corner"
+TANGENT = "tangent"
+SMOOTH = "smooth"
+CURVE = "curve"
+OFFCURVE = "offcurve"
+POINTKINDS = (CORNER, TANGENT, SMOOTH, CURVE, OFFCURVE)
+# the point symbols drawPointShapes knows
+SHAPES = ("oval", "rectangle", "triangle")
+# control point distance for a quarter circle, as a fraction of the radius
+_KAPPA = 0.5522847498
+
+
+class GlyphGeometry(object):
+
+    __slots__ = ("width", "points", "handles", "intersections", "measurementLine", "anchors", "components", "contours", "contentHash")
+
+    def __init__(self, width=0):
+        self.width = width
+        self.points = []
+        self.handles = []
+        self.intersections = []
+        self.measurementLine = MEASUREMENTLINE
+        self.anchors = []
+        self.components = []
+        self.contours = []
+        self.contentHash = None
+
+    def __repr__(self):
+        return f"<GlyphGeometry {len(self.points)} points, {len(self.handles)} handles, {len(self.components)} components>"
+
+
+def glyphGeometry(glyph, measurementLine=MEASUREMENTLINE):
+    geometry = GlyphGeometry(glyph.width)
+    geometry.measurementLine = measurementLine
+    pen = _SegmentPen()
+    for contour in glyph:
+        points = [(_pointType(point), point.smooth, (point.x, point.y)) for point in contour]
+        _classifyPoints(points, geometry)
+        contour.draw(pen)
+    geometry.contours = pen.calls
+    geometry.intersections = sorted(_intersections(pen.segments, measurementLine))
+    geometry.anchors = [(anchor.name, (anchor.x, anchor.y)) for anchor in glyph.anchors]
+    geometry.components = [(component.baseGlyph, tuple(component.transformation)) for component in glyph.components]
+    geometry.contentHash = hashlib.sha1(repr((
+        geometry.width, geometry.contours, geometry.points, geometry.anchors, geometry.components, measurementLine
+    )).encode("utf-8")).hexdigest()
+    return geometry
+
+def drawPointShapes(pen, shape, positions, size):
+    # one closed contour per position, size is the width and height
+    radius = size / 2
+    handle = radius * _KAPPA
+    for x, y in positions:
+        if shape == "oval":
+            pen.moveTo((x + radius, y))
+            pen.curveTo((x + radius, y + handle), (x + handle, y + radius), (x, y + radius))
+            pen.curveTo((x - handle, y + radius), (x - radius, y + handle), (x - radius, y))
+            pen.curveTo((x - radius, y - handle), (x - handle, y - radius), (x, y - radius))
+            pen.curveTo((x + handle, y - radius), (x + radius, y - handle), (x + radius, y))
+        elif shape == "rectangle":
+            pen.moveTo((x - radius, y - radius))
+            pen.lineTo((x + radius, y - radius))
+            pen.lineTo((x + radius, y + radius))
+            pen.lineTo((x - radius, y + radius))
+        elif shape == "triangle":
+            pen.moveTo((x - radius, y - radius))
+            pen.lineTo((x + radius, y - radius))
+            pen.lineTo((x, y + radius))
+        else:
+            raise ValueError(f"Unknown point shape: {shape}")
+        pen.closePath()
+
+def representationFactory(glyph):
+    # defcon calls this with the glyph, the result is kept until it changes
+    return glyphGeometry(glyph)
+
+# -----------------
+# Helpers
+# -----------------
+
+def _pointType(point):
+    # fontParts says "offcurve", defcon says None
+    segmentType = getattr(point, "segmentType", False)
+    if segmentType is False:
+        return point.type
+    return segmentType or OFFCURVE
+
+def _classifyPoints(points, geometry):
+    count = len(points)
+    for index, (pointType, smooth, position) in enumerate(points):
+        if pointType == OFFCURVE:
+            geometry.points.append((OFFCURVE, position))
+            continue
+        # handles to the neighbouring off-curves, contours are closed
+        for neighbour in (points[index - 1], points[(index + 1) % count]):
+            if neighbour[0] == OFFCURVE:
+                geometry.handles.append((neighbour[2], position))
+        if pointType in ("curve", "qcurve") and points[(index + 1) % count][0] != "line":
+            geometry.points.append((SMOOTH if smooth else CURVE, position))
+        else:
+            geometry.points.append((TANGENT if smooth else CORNER, position))
+
+def _intersections(segments, line):
+    found = []
+    for segment in segments:
+        if len(segment) == 2:
+            hits = lineLineIntersections(segment[0], segment[1], *line)
+            found.extend(hit.pt for hit in hits if 0 <= hit.t1 <= 1 and 0 <= hit.t2 <= 1)
+        else:
+            hits = curveLineIntersections(segment, line)
+            found.extend(hit.pt for hit in hits if 0 <= hit.t2 <= 1)
+    return found
+
+
+class _SegmentPen(BasePen):
+
+    # the pen calls for drawing and the segments for intersecting,
+    # quadratic curves come out as cubic ones
+
+    def __init__(self):
+        super().__init__(None)
+        self.calls = []
+        self.segments = []
+        self._start = None
+
+    def _moveTo(self, point):
+        self._start = point
+        self.calls.append(("moveTo", (point,)))
+
+    def _lineTo(self, point):
+        self.segments.append((self._getCurrentPoint(), point))
+        self.calls.append(("lineTo", (point,)))
+
+    def _curveToOne(self, point1, point2, point3):
+        self.segments.append((self._getCurrentPoint(), point1, point2, point3))
+        self.calls.append(("curveTo", (point1, point2, point3)))
+
+    def _closePath(self):
+        current = self._getCurrentPoint()
+        if current is not None and self._start is not None and current != self._start:
+            self.segments.append((current, self._start))
+        self.calls.append(("closePath", ()))
+
+    def _endPath(self):
+        self.calls.append(("endPath", ()))
@@ -6,12 +6,18 @@ it works but its not perfect:)
 import vanilla
 import merz
 import ezui
-import math
-from fontParts.fontshell import RBPoint, RGlyph
+import defcon
+from fontParts.fontshell import RGlyph
 from fontParts.world import OpenFont
-import ThemeManagerScripting as themeScripter
+import ThemeManagerGlyphGeometry as glyphGeometry
+import ThemeManagerDisplayList as displayList
+import importlib
+importlib.reload(glyphGeometry)
+importlib.reload(displayList)
 from mojo.subscriber import Subscriber, WindowController, registerCurrentGlyphSubscriber
-from  mojo.tools import IntersectGlyphWithLine
+
+# the geometry is worked out once per glyph and dropped by defcon when it changes
+defcon.registerRepresentationFactory(defcon.Glyph, glyphGeometry.GEOMETRYREPRESENTATION, glyphGeometry.representationFactory)
 
 class ThemeManagerGlyphView(ezui.MerzView):
 
@@ -20,6 +26,11 @@ class ThemeManagerGlyphView(ezui.MerzView):
         self.glyph = glyph
         self.size = size
         self.theme = theme
+        # the resolved theme values last drawn with
+        self.palette = {}
+        # the display list on screen and a layer per item of it, see render
+        self.displayList = None
+        self._layers = []
         self.container = self.getMerzContainer()
         self.container.clearSublayers()
         self.backgroundLayer = self.container.appendRectangleSublayer(
@@ -60,244 +71,184 @@ class ThemeManagerGlyphView(ezui.MerzView):
            fillColor=None,
            horizontalAlignment="center"
         )
-
-
-
-    def setTheme(self, theme, mode):
-        if mode == "dark":
-            suffix = ".dark"
-        else:
-            suffix = ""
-
-        self.glyphViewOffCurvePointsSize          = theme.get("glyphViewOffCurvePointsSize", themeScripter.FALLBACKSIZE)
-        self.glyphViewOnCurvePointsSize           = theme.get("glyphViewOnCurvePointsSize", themeScripter.FALLBACKSIZE)
-        self.glyphViewStrokeWidth                 = theme.get("glyphViewStrokeWidth", themeScripter.FALLBACKSIZE)
-        self.glyphViewHandlesStrokeWidth          = theme.get("glyphViewHandlesStrokeWidth", themeScripter.FALLBACKSIZE)
-
-        self.glyphViewAlternateFillColor          = tuple(theme.get(f"glyphViewAlternateFillColor{suffix}", themeScripter.FALLBACKCOLOR))
-        self.glyphViewStrokeColor                 = tuple(theme.get(f"glyphViewStrokeColor{suffix}", themeScripter.FALLBACKCOLOR))
-        self.glyphViewBluesColor                  = tuple(theme.get(f"glyphViewBluesColor{suffix}", themeScripter.FALLBACKCOLOR))
-        self.glyphViewComponentFillColor          = tuple(theme.get(f"glyphViewComponentFillColor{suffix}", themeScripter.FALLBACKCOLOR))
-        self.glyphViewComponentStrokeColor        = tuple(theme.get(f"glyphViewComponentStrokeColor{suffix}", themeScripter.FALLBACKCOLOR))
-        self.glyphViewBackgroundColor             = tuple(theme.get(f"glyphViewBackgroundColor{suffix}", themeScripter.FALLBACKCOLOR))
-        self.glyphViewMarginColor                 = tuple(theme.get(f"glyphViewMarginColor{suffix}", themeScripter.FALLBACKCOLOR))
-        self.glyphViewFontMetricsStrokeColor      = tuple(theme.get(f"glyphViewFontMetricsStrokeColor{suffix}", themeScripter.FALLBACKCOLOR))
-        self.glyphViewCubicHandlesStrokeColor     = tuple(theme.get(f"glyphViewCubicHandlesStrokeColor{suffix}", themeScripter.FALLBACKCOLOR))
-        self.glyphViewOffCurvePointsFill          = tuple(theme.get(f"glyphViewOffCurvePointsFill{suffix}", themeScripter.FALLBACKCOLOR))
-        self.glyphViewOffCurveCubicPointsStroke   = tuple(theme.get(f"glyphViewOffCurveCubicPointsStroke{suffix}", themeScripter.FALLBACKCOLOR))
-        self.glyphViewTangentPointsFill           = tuple(theme.get(f"glyphViewTangentPointsFill{suffix}", themeScripter.FALLBACKCOLOR))
-        self.glyphViewTangentPointsStroke         = tuple(theme.get(f"glyphViewTangentPointsStroke{suffix}", themeScripter.FALLBACKCOLOR))
-        self.glyphViewCornerPointsFill            = tuple(theme.get(f"glyphViewCornerPointsFill{suffix}", themeScripter.FALLBACKCOLOR))
-        self.glyphViewCornerPointsStroke          = tuple(theme.get(f"glyphViewCornerPointsStroke{suffix}", themeScripter.FALLBACKCOLOR))
-        self.glyphViewSmoothPointStroke           = tuple(theme.get(f"glyphViewSmoothPointStroke{suffix}", themeScripter.FALLBACKCOLOR))
-        self.glyphViewCurvePointsStroke           = tuple(theme.get(f"glyphViewCurvePointsStroke{suffix}", themeScripter.FALLBACKCOLOR))
-        self.glyphViewCurvePointsFill             = tuple(theme.get(f"glyphViewCurvePointsFill{suffix}", themeScripter.FALLBACKCOLOR))
-        self.glyphViewMeasurementsForegroundColor = tuple(theme.get(f"glyphViewMeasurementsForegroundColor{suffix}", themeScripter.FALLBACKCOLOR))
-        self.glyphViewMeasurementsBackgroundColor = tuple(theme.get(f"glyphViewMeasurementsBackgroundColor{suffix}", themeScripter.FALLBACKCOLOR))
-        self.glyphViewMeasurementsTextColor       = tuple(theme.get(f"glyphViewMeasurementsTextColor{suffix}", themeScripter.FALLBACKCOLOR))
-        self.glyphViewAnchorColor                 = tuple(theme.get(f"glyphViewAnchorColor{suffix}", themeScripter.FALLBACKCOLOR))
-        self.glyphViewAnchorTextColor             = tuple(theme.get(f"glyphViewAnchorTextColor{suffix}", themeScripter.FALLBACKCOLOR))
-
-        self.backgroundLayer.clearSublayers()
-        self.glyphLayer.clearSublayers()
-        self.bluesLayer.clearSublayers()
-        self.handleLayer.clearSublayers()
-        self.linesLayer.clearSublayers()
-        self.ovalCurveLayer.clearSublayers()
-        self.compLayer.clearSublayers()
-
-        if theme:
-            if self.glyph is not None:
-                f = self.glyph.font
-                viewWidth = self.size[0]
-                viewHeight = self.size[1]
-                verticalMetrics = [
-                    f.info.descender,
-                    f.info.xHeight,
-                    f.info.capHeight,
-                    f.info.ascender
-                ]
-                bottom = min(verticalMetrics)
-                top = max(verticalMetrics)
-                contentHeight = (top * .4) - bottom
-                fitHeight = viewHeight * 0.8
-                scale = fitHeight / contentHeight
-                x = (viewWidth - (self.glyph.width * scale)) / 2
-                y = (viewHeight - fitHeight) / 2
-
-                self.container.addSublayerTransformation((scale, 0, 0, scale, 50,30), name="scale&translate")
-
-                self.backgroundLayer.appendRectangleSublayer(
-                    position=(x,-1000),
-                    size=(self.glyph.width,2000),
-                    fillColor=self.glyphViewBackgroundColor,
-                    )
-                self.backgroundLayer.appendRectangleSublayer(
-                    position=(-1000,-1000),
-                    size=(self.glyph.width+1000,2000),
-                    fillColor=self.glyphViewMarginColor,
-                    )
-
-                self.glyphLayer.appendPathSublayer(
-                    size=(self.glyph.width, contentHeight),
-                    fillColor=self.glyphViewAlternateFillColor,
-                    strokeColor=self.glyphViewStrokeColor,
-                    strokeWidth=.5
-                )
-
-                self.compLayer.appendPathSublayer(
-                    fillColor=self.glyphViewComponentFillColor,
-                    strokeColor=self.glyphViewComponentStrokeColor,
-                    strokeWidth=.5
-                )
-
-                if f.info.postscriptBlueValues:
-                    blueValues = list(zip(*[iter(f.info.postscriptBlueValues)] * 2))[0]
-                    self.drawBlues(blueValues, self.glyphViewBluesColor)
-
-                self.drawMetrics(f.info.xHeight, self.glyphViewFontMetricsStrokeColor, .5)
-                self.drawMetrics(f.info.capHeight, self.glyphViewFontMetricsStrokeColor, .5)
-                self.drawMetrics(0, self.glyphViewFontMetricsStrokeColor, .5)
-
-                for component in self.glyph.components:
-                    #self.compLayer.appendPathSublayer()
-                    compPath = f[component.baseGlyph].getRepresentation("merz.CGPath")
-                    self.compLayer.setPath(compPath)
-                    self.compLayer.setStrokeColor(self.glyphViewComponentStrokeColor)
-                    self.compLayer.setFillColor(self.glyphViewComponentFillColor)
-                    self.compLayer.setStrokeWidth(self.glyphViewStrokeWidth/2)
-
-
-                contourGlyph = self.glyph.copy()
-                contourGlyph.clearComponents()
-                for contour in self.glyph:
-                    contourGlyph.appendContour(contour)
-                glyphPath = contourGlyph.getRepresentation("merz.CGPath")
-                self.glyphLayer.setPath(glyphPath)
-                self.glyphLayer.setStrokeColor(self.glyphViewStrokeColor)
-                self.glyphLayer.setFillColor(self.glyphViewAlternateFillColor)
-                self.glyphLayer.setStrokeWidth(self.glyphViewStrokeWidth/2)
-
-                measurementLine = ((59,-19),(254,132))
-                measurements = sorted(IntersectGlyphWithLine(self.glyph,measurementLine))
-                self.drawHandle(measurementLine, self.glyphViewMeasurementsForegroundColor, .5)
-
-                self.drawHandle((measurementLine[1], (measurementLine[0][0], measurementLine[1][1])), self.glyphViewMeasurementsBackgroundColor, .5)
-                self.drawHandle((measurementLine[0], (measurementLine[0][0], measurementLine[1][1])), self.glyphViewMeasurementsBackgroundColor, .5)
-
-                for instersect in measurements:
-                    self.drawPoint("oval", instersect, self.glyphViewOnCurvePointsSize, self.glyphViewMeasurementsForegroundColor, None, None)
-
-                self.drawPoint("oval", (measurementLine[0][0], measurements[0][1]), self.glyphViewOnCurvePointsSize * .8, self.glyphViewMeasurementsBackgroundColor, None, None)
-                self.drawPoint("oval", (measurementLine[0][0], measurements[1][1]), self.glyphViewOnCurvePointsSize * .8, self.glyphViewMeasurementsBackgroundColor, None, None)
-
-                self.drawPoint("oval", (measurements[1][0], measurementLine[1][1]), self.glyphViewOnCurvePointsSize * .8, self.glyphViewMeasurementsBackgroundColor, None, None)
-                self.drawPoint("oval", (measurements[0][0], measurementLine[1][1]), self.glyphViewOnCurvePointsSize * .8, self.glyphViewMeasurementsBackgroundColor, None, None)
-
-                loc = themeScripter._interpolate(measurementLine[0][0], measurementLine[1][0], .5) - 80,  themeScripter._interpolate(measurementLine[0][1], measurementLine[1][1], .5) - 20
-
-                distance = round(math.sqrt((measurementLine[0][0]-measurementLine[1][0])**2 + (measurementLine[0][1]-measurementLine[1][1])**2), 2)
-                self.drawCaption(loc, f"{distance}", self.glyphViewMeasurementsTextColor, "top", "center")
-
-                with self.glyphLayer.sublayerGroup():
-                    for contour in self.glyph.contours:
-                        allContPoints = [p for p in contour.points]
-                        for point in contour.points:
-
-                            if point.type != "offcurve":
-
-                                bPoint = RBPoint()
-                                bPoint._setPoint(point)
-                                bPoint.contour = contour
-
-                                bIn = (float(bPoint.bcpIn[0] + bPoint.anchor[0]), float(bPoint.bcpIn[1] + bPoint.anchor[1]))
-                                bOut = (float(bPoint.bcpOut[0] + bPoint.anchor[0]), float(bPoint.bcpOut[1] + bPoint.anchor[1]))
-                                self.drawHandle((bIn,bPoint.anchor),self.glyphViewCubicHandlesStrokeColor,self.glyphViewHandlesStrokeWidth)
-                                self.drawHandle((bPoint.anchor,bOut),self.glyphViewCubicHandlesStrokeColor,self.glyphViewHandlesStrokeWidth)
-
-                            if point.type == "offcurve":
-                                self.drawPoint("oval", (point.x, point.y), self.glyphViewOffCurvePointsSize, self.glyphViewOffCurvePointsFill, self.glyphViewOffCurveCubicPointsStroke, .5)
-
-                            elif point.type == "curve":
-                                if allContPoints[point.index + 1].type == "line":
-                                    if point.smooth:
-                                        self.drawPoint("triangle", (point.x, point.y), self.glyphViewOnCurvePointsSize, self.glyphViewTangentPointsFill, self.glyphViewTangentPointsStroke, .5)
-                                    else:
-                                        self.drawPoint("rectangle", (point.x, point.y), self.glyphViewOnCurvePointsSize, self.glyphViewCornerPointsFill, self.glyphViewCornerPointsStroke, .5)
-                                else:
-                                    if point.smooth:
-                                        strokeColor = self.glyphViewSmoothPointStroke
-                                    else:
-                                        strokeColor = self.glyphViewCurvePointsStroke
-                                    self.drawPoint("oval", (point.x, point.y), self.glyphViewOnCurvePointsSize*1.2, self.glyphViewCurvePointsFill, strokeColor, .5)
-
-                            elif point.type == "line":
-                                if point.smooth:
-                                    self.drawPoint("triangle", (point.x, point.y), self.glyphViewOnCurvePointsSize, self.glyphViewTangentPointsFill, self.glyphViewTangentPointsStroke, .5)
-                                else:
-                                    self.drawPoint("rectangle", (point.x, point.y), self.glyphViewOnCurvePointsSize, self.glyphViewCornerPointsFill, self.glyphViewCornerPointsStroke, .5)
-
-                    for anchor in self.glyph.anchors:
-                        self.drawPoint("oval", (anchor.x, anchor.y), 3, self.glyphViewAnchorColor, None, 0)
-                        self.drawCaption(((anchor.x-85, anchor.y)), anchor.name, self.glyphViewAnchorTextColor)
-
-
-
-    def drawMetrics(self, location, lineStrokeColor, strokeWidth):
-        self.linesLayer.appendLineSublayer(
-           startPoint = (-1000,location),
-           endPoint = (1000,location),
-           strokeWidth = strokeWidth,
-           strokeColor = lineStrokeColor
+        # display list group → the layer its items go in
+        self._groupLayers = dict(
+            background=self.backgroundLayer,
+            glyph=self.glyphLayer,
+            blues=self.bluesLayer,
+            handles=self.handleLayer,
+            lines=self.linesLayer,
+            points=self.ovalCurveLayer,
+            components=self.compLayer,
+            text=self.textLayer
         )
 
-    def drawHandle(self, location, handleStrokeColor, strokeWidth):
-        start,end = location
-        self.handleLayer.appendLineSublayer(
-           startPoint = start,
-           endPoint = end,
-           strokeWidth = strokeWidth,
-           strokeColor = handleStrokeColor
+    def setTheme(self, theme, mode):
+        """
+        Drawing happens in two steps. ThemeManagerDisplayList turns the
+        glyph and the theme into a display list, memoized per glyph and
+        palette, and render puts that on screen.
+        """
+        self.palette = displayList.resolvePalette(theme, mode)
+        if not theme or self.glyph is None:
+            return
+        self.render(self.getDisplayList())
+
+    def setGlyph(self, glyph):
+        self.glyph = glyph
+        if glyph is not None and self.palette:
+            self.render(self.getDisplayList())
+
+    def getGeometry(self):
+        # a dict lookup until the glyph changes
+        return self.glyph.getRepresentation(glyphGeometry.GEOMETRYREPRESENTATION)
+
+    def getDisplayList(self):
+        font = self.glyph.font
+        geometry = self.getGeometry()
+        componentGeometries = {
+            baseGlyph: font[baseGlyph].getRepresentation(glyphGeometry.GEOMETRYREPRESENTATION)
+            for baseGlyph, transformation in geometry.components
+            if baseGlyph in font
+        }
+        return _displayListCache.get(geometry, displayList.fontMetrics(font), self.palette, self.size, componentGeometries)
+
+    # Merz backend
+    # ------------
+    # The layers are built once per display list structure. A display
+    # list made from the same shapes (a new palette) only sets the colors
+    # that changed, any other one with the same structure updates the
+    # properties that differ.
+
+    def render(self, newDisplayList):
+        if newDisplayList is self.displayList:
+            return
+        changes = displayList.styleChanges(self.displayList, newDisplayList)
+        if changes is not None:
+            for index, field, color in changes:
+                _setColor(self._layers[index], newDisplayList.items[index], field, color)
+            self.displayList = newDisplayList
+            return
+        if not displayList.sameStructure(self.displayList, newDisplayList):
+            self.buildLayers(newDisplayList)
+            return
+        if newDisplayList.transform != self.displayList.transform:
+            self.container.removeSublayerTransformation("scale&translate")
+            self.container.addSublayerTransformation(newDisplayList.transform, name="scale&translate")
+        for index, (item, newItem) in enumerate(zip(self.displayList.items, newDisplayList.items)):
+            if item != newItem:
+                _updateLayer(self._layers[index], item, newItem)
+        self.displayList = newDisplayList
+
+    def buildLayers(self, newDisplayList):
+        for layer in self._groupLayers.values():
+            layer.clearSublayers()
+        if self.displayList is not None:
+            self.container.removeSublayerTransformation("scale&translate")
+        self.container.addSublayerTransformation(newDisplayList.transform, name="scale&translate")
+        self._layers = [
+            _makeLayer(self._groupLayers[item.group], item)
+            for item in newDisplayList.items
+        ]
+        self.displayList = newDisplayList
+
+
+_displayListCache = displayList.DisplayListCache()
+
+def _makeLayer(parent, item):
+    if isinstance(item, displayList.Rect):
+        return parent.appendRectangleSublayer(
+            position=item.position,
+            size=item.size,
+            fillColor=item.fillColor
         )
-
-    def drawPoint(self, shape, location, pointSize, pointFillColor, pointStrokeColor, strokeWidth):
-        pointSize *= 2
-        self.ovalCurveLayer.appendSymbolSublayer(
-            position=location,
-            imageSettings=dict(
-                name=shape,
-                size=(pointSize,pointSize),
-                fillColor = pointFillColor,
-                strokeColor = pointStrokeColor,
-                strokeWidth = strokeWidth,
-            )
+    if isinstance(item, displayList.Symbol):
+        return parent.appendSymbolSublayer(
+            position=item.position,
+            imageSettings=_imageSettings(item)
         )
-
-    def drawBlues(self, size, blueFillColor):
-        width = 1000
-        height = (size[1] - size[0])
-        self.bluesLayer.appendSymbolSublayer(
-            position=(0,size[0]),
-            imageSettings=dict(
-                name="rectangle",
-                size=(width,height),
-                fillColor = blueFillColor,
-            )
+    if isinstance(item, displayList.Text):
+        return parent.appendTextLineSublayer(
+           position=item.position,
+           pointSize=item.pointSize,
+           text=item.text,
+           fillColor=item.fillColor,
+           horizontalAlignment=item.horizontalAlignment,
+           verticalAlignment=item.verticalAlignment,
         )
-
-    def drawCaption(self, location, text, color, vAlign=None, hAlign=None):
-        if not vAlign:
-            vAlign = "center"
-        if not hAlign:
-            hAlign = "center"
-
-        self.textLayer.appendTextLineSublayer(
-           position=location,
-           pointSize=10,
-           text=f"{text}",
-           fillColor=color,
-           horizontalAlignment=hAlign,
-           verticalAlignment=vAlign,
+    if isinstance(item, displayList.Line):
+        layer = parent.appendPathSublayer(
+            fillColor=None,
+            strokeColor=item.strokeColor,
+            strokeWidth=item.strokeWidth
         )
+        layer.setPath(_linesPath(item.lines))
+        return layer
+    layer = parent.appendPathSublayer(
+        fillColor=item.fillColor,
+        strokeColor=item.strokeColor,
+        strokeWidth=item.strokeWidth
+    )
+    layer.setPath(_callsPath(item.calls))
+    return layer
+
+def _updateLayer(layer, item, newItem):
+    # only the setters for what differs
+    if isinstance(newItem, displayList.Symbol):
+        layer.setPosition(newItem.position)
+        layer.setImageSettings(_imageSettings(newItem))
+        return
+    for field in newItem._fields:
+        value = getattr(newItem, field)
+        if getattr(item, field) == value:
+            continue
+        if field == "fillColor":
+            layer.setFillColor(value)
+        elif field == "strokeColor":
+            layer.setStrokeColor(value)
+        elif field == "strokeWidth":
+            layer.setStrokeWidth(value)
+        elif field == "position":
+            layer.setPosition(value)
+        elif field == "size":
+            layer.setSize(value)
+        elif field == "text":
+            layer.setText(value)
+        elif field == "pointSize":
+            layer.setPointSize(value)
+        elif field == "calls":
+            layer.setPath(_callsPath(value))
+        elif field == "lines":
+            layer.setPath(_linesPath(value))
+
+def _setColor(layer, item, field, color):
+    if isinstance(item, displayList.Symbol):
+        # a symbol's color is part of its image
+        layer.setImageSettings(_imageSettings(item))
+    elif field == "fillColor":
+        layer.setFillColor(color)
+    elif field == "strokeColor":
+        layer.setStrokeColor(color)
+
+def _imageSettings(item):
+    return dict(
+        name=item.shape,
+        size=item.size,
+        fillColor=item.fillColor
+    )
+
+def _callsPath(calls):
+    pen = merz.MerzPen()
+    for method, points in calls:
+        getattr(pen, method)(*points)
+    return pen.path
+
+def _linesPath(lines):
+    pen = merz.MerzPen()
+    for start, end in lines:
+        pen.moveTo(start)
+        pen.lineTo(end)
+        pen.endPath()
+    return pen.path
 
 ezui.tools.classes.registerClass("ThemeManagerGlyphView", ThemeManagerGlyphView)
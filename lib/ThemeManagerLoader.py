@@ -0,0 +1,103 @@
+"""
+Bulk loading of .roboFontTheme files.
+
+Files are parsed and validated in a thread pool (or a process pool when
+running headless) and handed back as a stream of (path, theme, errors) in
+the order they finish, so a caller can show progress and add themes while
+the rest is still loading. The loader keeps count and reports throughput.
+
+Nothing in here imports RoboFont, the dark mode keys are passed in.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+import ThemeManagerFileFormat as themeFileFormat
+from ThemeManagerValidator import compileSchema, validateTheme, ValidationError, UNREADABLE
+
+THEMEEXTENSION = ".roboFontTheme"
+
+
+def findThemeFiles(path):
+    """
+    Every .roboFontTheme under path, or path itself if it is a theme file.
+    """
+    if os.path.isfile(path):
+        return [path]
+    found = []
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for fileName in sorted(files):
+            if os.path.splitext(fileName)[1] == THEMEEXTENSION:
+                found.append(os.path.join(root, fileName))
+    return found
+
+def loadThemeFile(path, darkKeys=()):
+    """
+    Parse and validate one theme file, returns (theme, errors) with
+    ValidationError objects. theme is None when the file couldn't be read.
+    """
+    fileName = os.path.basename(path)
+    try:
+        # xml, binary or compressed, whatever the file turns out to be
+        themeData = themeFileFormat.load(path)
+    except Exception as error:
+        return None, [ValidationError(UNREADABLE, None, f"Could not read {fileName}: {error}")]
+    if not isinstance(themeData, dict):
+        return None, [ValidationError(UNREADABLE, None, f"{fileName} doesn't contain a theme.")]
+    if "themeName" not in themeData:
+        themeData["themeName"] = os.path.splitext(fileName)[0]
+    return validateTheme(themeData, compileSchema(darkKeys))
+
+class ThemeFileLoader(object):
+
+    """
+    Iterate to get (path, theme, errors) as files finish loading.
+
+        loader = ThemeFileLoader(findThemeFiles(folder), workers=8)
+        for path, theme, errors in loader:
+            ...
+        print(loader.throughput)
+
+    progress is called with (done, total) after every file.
+    """
+
+    def __init__(self, paths, workers=None, processes=False, darkKeys=(), progress=None):
+        self.paths = list(paths)
+        self.workers = workers
+        self.processes = processes
+        self.darkKeys = list(darkKeys)
+        self.progress = progress
+        self.total = len(self.paths)
+        self.done = 0
+        self.failed = 0
+        self.elapsed = 0
+
+    @property
+    def throughput(self):
+        # files per second
+        if not self.elapsed:
+            return 0
+        return self.done / self.elapsed
+
+    def __iter__(self):
+        start = time.perf_counter()
+        if self.processes:
+            executorClass = ProcessPoolExecutor
+        else:
+            executorClass = ThreadPoolExecutor
+        with executorClass(max_workers=self.workers) as executor:
+            futures = {
+                executor.submit(loadThemeFile, path, self.darkKeys): path
+                for path in self.paths
+            }
+            for future in as_completed(futures):
+                theme, errors = future.result()
+                self.done += 1
+                if theme is None:
+                    self.failed += 1
+                self.elapsed = time.perf_counter() - start
+                if self.progress is not None:
+                    self.progress(self.done, self.total)
+                yield futures[future], theme, errors
+        self.elapsed = time.perf_counter() - start
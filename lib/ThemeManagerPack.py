@@ -0,0 +1,201 @@
+"""
+Theme packs: many themes in one file, read through mmap.
+
+Layout, all integers little endian:
+
+    header     magic "TMPK", version, record count, slot key and name blob sizes
+    slotKeys   JSON list of the SLOTKEYS the records were encoded with
+    index      one fixed size entry per theme, sorted by name:
+               name offset, name length, record offset, record length
+    names      the UTF-8 theme names
+    records    ThemeVector.toBytes() per theme
+
+Looking up a theme is a binary search over the index entries straight in
+the mapped file, only the record that matches gets decoded. Iterating
+decodes one record at a time, nothing materializes the whole pack.
+
+    python ThemeManagerPack.py path/to/folder path/to/out.roboFontThemePack
+"""
+
+import os
+import sys
+import json
+import mmap
+import struct
+import ThemeManagerFileFormat as themeFileFormat
+from ThemeManagerVector import ThemeVector, SLOTKEYS
+
+PACKEXTENSION = ".roboFontThemePack"
+PACKMAGIC = b"TMPK"
+PACKVERSION = 1
+_HEADER = struct.Struct("<4sHIII")
+_ENTRY = struct.Struct("<IHQI")
+
+
+def writeThemePack(path, themes):
+    """
+    Write an iterable of theme dicts to a pack, returns the theme count.
+    Later themes with an already used name are skipped.
+    """
+    records = {}
+    for theme in themes:
+        themeName = theme["themeName"]
+        if themeName in records:
+            continue
+        records[themeName] = ThemeVector.fromDict(theme).toBytes()
+    names = sorted(records, key=lambda name: name.encode("utf-8"))
+    slotKeys = json.dumps(SLOTKEYS).encode("utf-8")
+    nameBlob = bytearray()
+    nameSpans = []
+    for themeName in names:
+        encoded = themeName.encode("utf-8")
+        nameSpans.append((len(nameBlob), len(encoded)))
+        nameBlob += encoded
+    recordOffset = _HEADER.size + len(slotKeys) + _ENTRY.size * len(names) + len(nameBlob)
+    index = bytearray()
+    for themeName, (nameOffset, nameLength) in zip(names, nameSpans):
+        record = records[themeName]
+        index += _ENTRY.pack(nameOffset, nameLength, recordOffset, len(record))
+        recordOffset += len(record)
+    with open(path, "wb") as packFile:
+        packFile.write(_HEADER.pack(PACKMAGIC, PACKVERSION, len(names), len(slotKeys), len(nameBlob)))
+        packFile.write(slotKeys)
+        packFile.write(index)
+        packFile.write(nameBlob)
+        for themeName in names:
+            packFile.write(records[themeName])
+    return len(names)
+
+def packThemeFolder(folder, path):
+    """
+    Pack every .roboFontTheme file found under folder.
+    """
+    return writeThemePack(path, _iterThemeFiles(folder))
+
+
+class ThemePack(object):
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.getsize(path) == 0:
+            # mmap can't map an empty file, it is an empty pack
+            self._map = None
+            self._count = 0
+            return
+        with open(path, "rb") as packFile:
+            self._map = mmap.mmap(packFile.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._readHeader()
+        except (struct.error, ValueError) as error:
+            # a truncated or foreign file, don't leave it mapped
+            self._map.close()
+            raise ValueError(f"{path} is not a theme pack: {error}") from error
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, themeName):
+        return self._find(themeName) is not None
+
+    def __iter__(self):
+        # (name, theme) in name order, one record decoded at a time
+        for i in range(self._count):
+            _, _, recordOffset, recordLength = self._entry(i)
+            yield self._name(i), self._decode(recordOffset, recordLength).toDict()
+
+    def names(self):
+        for i in range(self._count):
+            yield self._name(i)
+
+    def get(self, themeName):
+        vector = self.getVector(themeName)
+        if vector is None:
+            return None
+        return vector.toDict()
+
+    def getVector(self, themeName):
+        found = self._find(themeName)
+        if found is None:
+            return None
+        return self._decode(*found)
+
+    # internal
+
+    def _readHeader(self):
+        if len(self._map) < _HEADER.size:
+            raise ValueError("too short for a header")
+        magic, version, count, slotKeysLength, namesLength = _HEADER.unpack_from(self._map, 0)
+        if magic != PACKMAGIC or version != PACKVERSION:
+            raise ValueError("unknown magic or version")
+        position = _HEADER.size
+        namesOffset = position + slotKeysLength + _ENTRY.size * count
+        if namesOffset + namesLength > len(self._map):
+            raise ValueError("truncated index")
+        # UnicodeDecodeError is a ValueError
+        slotKeys = json.loads(self._map[position:position + slotKeysLength])
+        self._count = count
+        # None keeps the fast decode path when the schema is unchanged
+        self._slotKeys = None if slotKeys == SLOTKEYS else slotKeys
+        position += slotKeysLength
+        self._indexOffset = position
+        self._namesOffset = namesOffset
+
+    def _entry(self, i):
+        return _ENTRY.unpack_from(self._map, self._indexOffset + i * _ENTRY.size)
+
+    def _name(self, i, raw=False):
+        nameOffset, nameLength, _, _ = self._entry(i)
+        start = self._namesOffset + nameOffset
+        encoded = self._map[start:start + nameLength]
+        if raw:
+            return encoded
+        return encoded.decode("utf-8")
+
+    def _find(self, themeName):
+        target = themeName.encode("utf-8")
+        low = 0
+        high = self._count
+        while low < high:
+            middle = (low + high) // 2
+            name = self._name(middle, raw=True)
+            if name < target:
+                low = middle + 1
+            elif name > target:
+                high = middle
+            else:
+                _, _, recordOffset, recordLength = self._entry(middle)
+                return recordOffset, recordLength
+        return None
+
+    def _decode(self, recordOffset, recordLength):
+        return ThemeVector.fromBytes(self._map[recordOffset:recordOffset + recordLength], self._slotKeys)
+
+# -----------------
+# Helpers
+# -----------------
+
+def _iterThemeFiles(folder):
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        for fileName in sorted(files):
+            if os.path.splitext(fileName)[1] != ".roboFontTheme":
+                continue
+            theme = themeFileFormat.load(os.path.join(root, fileName))
+            if "themeName" not in theme:
+                theme["themeName"] = os.path.splitext(fileName)[0]
+            yield theme
+
+
+if __name__ == "__main__":
+    count = packThemeFolder(sys.argv[1], sys.argv[2])
+    print(f"Packed {count} themes into {sys.argv[2]}")
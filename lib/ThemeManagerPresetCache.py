@@ -0,0 +1,164 @@
+"""
+A compiled cache for the built-in preset themes.
+
+All `.roboFontTheme` files in the preset folder are compiled into a single
+binary plist. Loading validates the cache with one stat pass over the
+presets, a file is only hashed when its mtime/size moved and only
+re-parsed from XML when its content hash no longer matches.
+
+The installed extension may be read only, so loading writes the cache to
+the user's cache folder (presetCachePath) and carries on without one when
+that fails. A cache compiled at build time next to the preset folder
+(bundledCachePath) is read to start from, and never written at runtime.
+Nothing in here needs RoboFont:
+
+    python ThemeManagerPresetCache.py path/to/presetThemes
+"""
+
+import os
+import sys
+import time
+import hashlib
+import plistlib
+import ThemeManagerFileFormat as themeFileFormat
+
+CACHEFILENAME = "presetThemes.cache"
+CACHEVERSION = 1
+THEMEEXTENSION = ".roboFontTheme"
+CACHEFOLDERNAME = "com.andyclymer.themeManager"
+
+
+def userCacheFolder():
+    if sys.platform == "darwin":
+        return os.path.join(os.path.expanduser("~/Library/Caches"), CACHEFOLDERNAME)
+    return os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), CACHEFOLDERNAME)
+
+def presetCachePath(presetFolder):
+    # one cache per preset folder, several installs don't share one
+    presetFolder = os.path.abspath(presetFolder)
+    folderHash = hashlib.sha1(presetFolder.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(userCacheFolder(), f"{folderHash}.{CACHEFILENAME}")
+
+def bundledCachePath(presetFolder):
+    presetFolder = os.path.normpath(presetFolder)
+    return os.path.join(os.path.dirname(presetFolder), CACHEFILENAME)
+
+def loadPresetThemes(presetFolder, cachePath=None):
+    """
+    Return a list of (path, signature, theme) for every preset,
+    sorted by file name. The cache is refreshed when needed.
+    """
+    cache = None
+    if cachePath is None:
+        cachePath = presetCachePath(presetFolder)
+        cache = _readCache(cachePath) or _readCache(bundledCachePath(presetFolder))
+    if cache is None:
+        cache = _readCache(cachePath)
+    cachedFiles = cache.get("files", {})
+    files = {}
+    loaded = []
+    changed = False
+    for fileName, path, signature in scanPresets(presetFolder):
+        entry = cachedFiles.get(fileName)
+        if entry is None or entry["signature"] != signature:
+            with open(path, "rb") as themeFile:
+                data = themeFile.read()
+            digest = hashlib.sha1(data).hexdigest()
+            if entry is None or entry["hash"] != digest:
+                entry = dict(theme=themeFileFormat.loads(data))
+            entry["hash"] = digest
+            entry["signature"] = signature
+            changed = True
+        files[fileName] = entry
+        theme = dict(entry["theme"])
+        theme["themeType"] = "Default"
+        loaded.append((path, tuple(signature), theme))
+    if changed or set(files) != set(cachedFiles):
+        _writeCache(cachePath, files)
+    return loaded
+
+def compilePresetCache(presetFolder, cachePath=None):
+    """
+    Build the cache from scratch, returns the path it was written to.
+    By default the one shipped with the extension, at build time.
+    """
+    if cachePath is None:
+        cachePath = bundledCachePath(presetFolder)
+    if os.path.exists(cachePath):
+        os.remove(cachePath)
+    loadPresetThemes(presetFolder, cachePath)
+    return cachePath
+
+def scanPresets(presetFolder):
+    """
+    The one stat pass: (fileName, path, [mtime, size]) per preset.
+    """
+    found = []
+    for fileName in sorted(os.listdir(presetFolder)):
+        if os.path.splitext(fileName)[1] != THEMEEXTENSION:
+            continue
+        path = os.path.join(presetFolder, fileName)
+        stat = os.stat(path)
+        found.append((fileName, path, [stat.st_mtime_ns, stat.st_size]))
+    return found
+
+def benchmark(presetFolder, iterations=50):
+    """
+    Time loading all presets by parsing the XML versus through the cache.
+    Returns a dict of mean seconds per full load.
+    """
+    cachePath = presetCachePath(presetFolder)
+    paths = [path for _, path, _ in scanPresets(presetFolder)]
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for path in paths:
+            themeFileFormat.load(path)
+    xml = (time.perf_counter() - start) / iterations
+
+    compilePresetCache(presetFolder, cachePath)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        loadPresetThemes(presetFolder, cachePath)
+    cached = (time.perf_counter() - start) / iterations
+
+    return dict(xml=xml, cache=cached, presets=len(paths))
+
+# -----------------
+# Helpers
+# -----------------
+
+def _readCache(cachePath):
+    try:
+        with open(cachePath, "rb") as cacheFile:
+            cache = plistlib.load(cacheFile)
+    except (OSError, plistlib.InvalidFileException, ValueError):
+        return {}
+    if cache.get("version") != CACHEVERSION:
+        return {}
+    return cache
+
+def _writeCache(cachePath, files):
+    contentHash = hashlib.sha1()
+    for fileName in sorted(files):
+        contentHash.update(fileName.encode("utf-8"))
+        contentHash.update(files[fileName]["hash"].encode("ascii"))
+    cache = dict(
+        version=CACHEVERSION,
+        hash=contentHash.hexdigest(),
+        files=files
+    )
+    try:
+        os.makedirs(os.path.dirname(cachePath), exist_ok=True)
+        with open(cachePath, "wb") as cacheFile:
+            plistlib.dump(cache, cacheFile, fmt=plistlib.FMT_BINARY)
+    except OSError:
+        # no cache folder to write to, it just parses the XML next time
+        pass
+
+
+if __name__ == "__main__":
+    folder = sys.argv[1]
+    print(compilePresetCache(folder))
+    result = benchmark(folder)
+    print(f"{result['presets']} presets: xml {result['xml']*1000:.2f}ms, cache {result['cache']*1000:.2f}ms")
@@ -0,0 +1,217 @@
+"""
+A small summary of how a theme looks, for sorting and filtering.
+
+    backgroundLuminance   WCAG relative luminance of the glyph view, 0-1
+    isDark                the background is closer to black than to white
+    dominantHue           OKLab hue angle of all colors together in
+                          degrees, None for a gray theme
+    minimumContrast       the lowest WCAG contrast ratio against the
+                          background of the colors in LEGIBILITYKEYS
+
+Profiles are keyed by the theme's content hash (ThemeManagerDedupe), so
+a profile stays valid for as long as the theme looks the same and two
+themes that look the same share one. ProfileCache keeps them, and with
+defaults functions passed in stores them one key per theme name next to
+the hash they were made for, so saving a theme only writes its own key.
+
+A partial theme (saved without every key, or a delta whose base is
+gone) is profiled with the missing colors taken from defaults, a full
+theme such as the built-in default, and FALLBACKCOLOR after that.
+"""
+
+import math
+import WCAGContrastRatio as contrast
+from ThemeManagerSchema import THEMEKEYS, FALLBACKCOLOR
+from ThemeManagerSimilarity import srgbToOKLab
+
+# colors contrast is measured against, not for
+CONTRASTBACKGROUNDKEYS = {
+    "glyphViewBackgroundColor", "glyphViewMarginColor",
+    "glyphViewBackgroundColor.dark", "glyphViewMarginColor.dark"
+}
+# what has to stay readable: the outline, points, handles and labels.
+# Fills, zones and the like are meant to be faint, a minimum over every
+# key comes out close to 1:1 for any theme.
+LEGIBILITYKEYS = {
+    "glyphViewStrokeColor", "glyphViewCubicHandlesStrokeColor",
+    "glyphViewCornerPointsFill", "glyphViewCurvePointsFill", "glyphViewTangentPointsFill",
+    "glyphViewMetricsTitlesColor", "glyphViewAnchorTextColor"
+}
+# where white and black text have the same contrast ratio
+DARKLUMINANCE = 0.179
+# mean OKLab chroma below this has no hue worth sorting by
+NEUTRALCHROMA = 0.02
+PROFILEKEYS = ("backgroundLuminance", "isDark", "dominantHue", "minimumContrast")
+
+
+def contrastBackground(theme, dark=False, defaults=None):
+    # the margin color seen over the glyph view background
+    suffix = ".dark" if dark else ""
+    return contrast.getPercievedColor(
+        _getColor(theme, f"glyphViewBackgroundColor{suffix}", defaults),
+        _getColor(theme, f"glyphViewMarginColor{suffix}", defaults)
+    )
+
+def contrastRatios(theme, dark=False, defaults=None):
+    # (key, contrast ratio) for every color against the background, lowest first
+    suffix = ".dark" if dark else ""
+    background = contrastBackground(theme, dark, defaults)
+    ratios = []
+    for key, name, valueType in THEMEKEYS:
+        key = f"{key}{suffix}"
+        if valueType != tuple or key not in theme or key in CONTRASTBACKGROUNDKEYS:
+            continue
+        color = contrast.getPercievedColor(background, theme[key])
+        ratios.append((key, contrast.rgb(color, background)))
+    ratios.sort(key=lambda item: item[1])
+    return ratios
+
+def profileMatches(profile, dark=None, minimumContrast=None, hue=None, hueTolerance=30):
+    # None leaves a criterion out
+    if dark is not None and profile.isDark != dark:
+        return False
+    if minimumContrast is not None and (profile.minimumContrast or 0) < minimumContrast:
+        return False
+    if hue is not None:
+        if profile.dominantHue is None:
+            return False
+        # around the color wheel, 350° is 20° away from 10°
+        distance = abs(profile.dominantHue - hue) % 360
+        if min(distance, 360 - distance) > hueTolerance:
+            return False
+    return True
+
+
+class ThemeProfile(object):
+
+    __slots__ = ("contentHash",) + PROFILEKEYS
+
+    def __init__(self, contentHash, backgroundLuminance, isDark, dominantHue, minimumContrast):
+        self.contentHash = contentHash
+        self.backgroundLuminance = backgroundLuminance
+        self.isDark = isDark
+        self.dominantHue = dominantHue
+        self.minimumContrast = minimumContrast
+
+    @classmethod
+    def fromTheme(cls, theme, contentHash, defaults=None):
+        """
+        Theme is a (flattened) theme, contentHash its canonical hash.
+        Colors it doesn't have come from defaults.
+        """
+        background = contrastBackground(theme, defaults=defaults)
+        luminance = contrast._relative_luminance(*background[:3])
+        ratios = [ratio for key, ratio in contrastRatios(theme, defaults=defaults) if key in LEGIBILITYKEYS]
+        return cls(
+            contentHash,
+            luminance,
+            luminance < DARKLUMINANCE,
+            _dominantHue(theme, background),
+            ratios[0] if ratios else None
+        )
+
+    def toDict(self):
+        # None doesn't go into a plist, missing keys read back as None
+        return {key: getattr(self, key) for key in PROFILEKEYS if getattr(self, key) is not None}
+
+    @classmethod
+    def fromDict(cls, contentHash, data):
+        return cls(contentHash, *(data.get(key) for key in PROFILEKEYS))
+
+    def __repr__(self):
+        hue = "gray" if self.dominantHue is None else f"{self.dominantHue:.0f}°"
+        return (
+            f"<ThemeProfile {'dark' if self.isDark else 'light'} "
+            f"L={self.backgroundLuminance:.3f} hue={hue} contrast={self.minimumContrast or 0:.2f}>"
+        )
+
+
+class ProfileCache(object):
+
+    """
+    content hash → ThemeProfile, in memory.
+
+    With a prefix and the defaults functions, store and forget keep one
+    defaults key per theme name, read back by get when the hash matches.
+    """
+
+    def __init__(self, prefix=None, getter=None, setter=None, remover=None):
+        self.prefix = prefix
+        self._get = getter
+        self._set = setter
+        self._remove = remover
+        self._profiles = {}
+        # theme name → content hash of the profile stored under its key
+        self._stored = {}
+
+    def __len__(self):
+        return len(self._profiles)
+
+    def __contains__(self, contentHash):
+        return contentHash in self._profiles
+
+    def profileKey(self, themeName):
+        return f"{self.prefix}.{themeName}"
+
+    def get(self, contentHash, themeName=None):
+        profile = self._profiles.get(contentHash)
+        if profile is None and themeName is not None and self._get is not None:
+            data = self._get(self.profileKey(themeName))
+            if data and data.get("contentHash") == contentHash:
+                profile = self._profiles[contentHash] = ThemeProfile.fromDict(contentHash, data)
+                self._stored[themeName] = contentHash
+        return profile
+
+    def add(self, theme, contentHash, defaults=None):
+        # the profile of theme, only computed when the hash is new
+        profile = self._profiles.get(contentHash)
+        if profile is None:
+            profile = self._profiles[contentHash] = ThemeProfile.fromTheme(theme, contentHash, defaults)
+        return profile
+
+    def store(self, themeName, contentHash):
+        # write the profile of contentHash under themeName, if it isn't already
+        profile = self._profiles.get(contentHash)
+        if profile is None or self._set is None or self._stored.get(themeName) == contentHash:
+            return False
+        data = profile.toDict()
+        data["contentHash"] = contentHash
+        self._set(self.profileKey(themeName), data)
+        self._stored[themeName] = contentHash
+        return True
+
+    def forget(self, themeName):
+        # the theme is gone, drop its key
+        if self._remove is not None:
+            self._remove(self.profileKey(themeName))
+        self._stored.pop(themeName, None)
+
+# -----------------
+# Helpers
+# -----------------
+
+def _getColor(theme, key, defaults):
+    color = theme.get(key)
+    if color is None and defaults is not None:
+        color = defaults.get(key)
+    if color is None:
+        color = FALLBACKCOLOR
+    return color
+
+def _dominantHue(theme, background):
+    # the hue of all colors added up as OKLab (a, b) vectors,
+    # strongly colored keys weigh more than nearly gray ones
+    totalA = totalB = 0.0
+    count = 0
+    for key, name, valueType in THEMEKEYS:
+        if valueType != tuple or key not in theme:
+            continue
+        r, g, b, alpha = theme[key]
+        color = [c * alpha + bc * (1 - alpha) for c, bc in zip((r, g, b), background)]
+        _, labA, labB = srgbToOKLab(*color)
+        totalA += labA
+        totalB += labB
+        count += 1
+    if not count or math.hypot(totalA, totalB) / count < NEUTRALCHROMA:
+        return None
+    return math.degrees(math.atan2(totalB, totalA)) % 360
@@ -0,0 +1,89 @@
+"""
+Coalescing preview refreshes.
+
+Editing a theme can fire dozens of callbacks a second (dragging a color
+well, scrolling a number field). RenderScheduler takes a request for
+each of them and renders at most once per frame with the arguments of
+the latest request, the ones in between are dropped.
+
+    scheduler = RenderScheduler(preview.setTheme, callLater)
+    scheduler.request(theme, "light")   # rendered on the next frame
+    scheduler.renderNow(theme, "dark")  # rendered now, drops what's pending
+    scheduler.requested, scheduler.performed
+
+callLater(delay, function) runs function after delay seconds, inside
+RoboFont that is PyObjCTools.AppHelper.callLater. Nothing here depends
+on RoboFont, clock and callLater can be anything that behaves the same.
+"""
+
+import time
+
+# seconds between renders, one display frame at 60 Hz
+FRAMEINTERVAL = 1 / 60
+
+
+class RenderScheduler(object):
+
+    def __init__(self, render, callLater, interval=FRAMEINTERVAL, clock=time.monotonic):
+        self._render = render
+        self._callLater = callLater
+        self.interval = interval
+        self._clock = clock
+        # the arguments of the latest request, None when nothing is pending
+        self._pending = None
+        # bumped to disown a scheduled call, see cancel
+        self._generation = 0
+        self._lastRender = None
+        self.requested = 0
+        self.performed = 0
+
+    def __repr__(self):
+        return f"<RenderScheduler {self.performed}/{self.requested} rendered>"
+
+    @property
+    def pending(self):
+        return self._pending is not None
+
+    def request(self, *args):
+        # a render with args, on the next frame
+        self.requested += 1
+        scheduled = self._pending is not None
+        self._pending = args
+        if scheduled:
+            return
+        delay = 0
+        if self._lastRender is not None:
+            delay = max(0, self._lastRender + self.interval - self._clock())
+        generation = self._generation
+        self._callLater(delay, lambda: self._fire(generation))
+
+    def renderNow(self, *args):
+        # for changes that shouldn't wait, like picking another theme
+        self.requested += 1
+        self.cancel()
+        self._perform(args)
+
+    def flush(self):
+        # render what is pending now
+        if self._pending is not None:
+            args = self._pending
+            self.cancel()
+            self._perform(args)
+
+    def cancel(self):
+        self._pending = None
+        self._generation += 1
+
+    # internal
+
+    def _fire(self, generation):
+        if generation != self._generation or self._pending is None:
+            return
+        args = self._pending
+        self._pending = None
+        self._perform(args)
+
+    def _perform(self, args):
+        self._lastRender = self._clock()
+        self.performed += 1
+        self._render(*args)
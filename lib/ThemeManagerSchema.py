@@ -0,0 +1,124 @@
+"""
+The theme schema: every preference key a theme can hold.
+
+Kept free of any RoboFont imports so the schema can be used headless.
+"""
+
+RENAMEMAP = {"glyphViewOncurvePointsSize":"glyphViewOnCurvePointsSize",
+             "glyphViewOffCurvePointsFill":"glyphViewOffCurveCubicPointsFill",
+             "glyphViewOffCurveQuadPointsStroke":"glyphViewOffCurveQuadraticPointsStroke",
+            }
+
+# Preference keys and names for the theme settings
+THEMEKEYS = [
+    ("glyphViewOnCurvePointsSize", "Oncurve Size", float),
+    ("glyphViewOffCurvePointsSize", "Offcurve Size", float),
+    ("glyphViewStrokeWidth", "Glyph Stroke Width", int),
+    ("glyphViewSelectionStrokeWidth", "Selection Stroke Width", int),
+    ("glyphViewHandlesStrokeWidth", "Handle stroke width", int),
+    ("glyphViewBackgroundColor", "Background Color", tuple),
+    ("glyphViewFillColor", "Fill Color", tuple),
+    ("glyphViewPreviewFillColor", "Preview Fill Color", tuple),
+    ("glyphViewPreviewBackgroundColor", "Preview Background Color", tuple),
+    ("glyphViewAlternateFillColor", "Alternate Fill Color", tuple),
+    ("glyphViewStrokeColor", "Stroke Color", tuple),
+    ("glyphViewCornerPointsFill", "Corner Point Fill Color", tuple),
+    ("glyphViewCornerPointsStroke", "Corner Point Stroke Color", tuple),
+    ("glyphViewCurvePointsFill", "Curve Point Fill Color", tuple),
+    ("glyphViewCurvePointsStroke", "Curve Point Stroke Color", tuple),
+    ("glyphViewTangentPointsFill", "Tangent Fill Color", tuple),
+    ("glyphViewTangentPointsStroke", "Tangent Stroke Color", tuple),
+    # ("glyphViewOffCurvePointsFill", "Offcurve Fill Color", tuple),
+    # ("glyphViewOffCurveQuadPointsStroke", "Offcurve Stroke Color (Quadratic Beziers, TrueType)", tuple),
+
+    # updated keys
+    ("glyphViewOffCurveCubicPointsFill",       "Offcurve Fill Color (Cubic Beziers, PostScript)",     tuple),
+    ("glyphViewOffCurveCubicPointsStroke",     "Offcurve Stroke Color (Cubic Beziers, PostScript)",   tuple),
+    ("glyphViewOffCurveQuadraticPointsFill",   "Offcurve Fill Color (Quadratic Beziers, TrueType)",   tuple),
+    ("glyphViewOffCurveQuadraticPointsStroke", "Offcurve Stroke Color (Quadratic Beziers, TrueType)", tuple),
+    ("glyphViewOffCurveTrailingPointsFill",    "Trailing Offcurve Fill Color",                        tuple),
+    ("glyphViewOffCurveTrailingPointsStroke",  "Trailing Offcurve Stroke Color",                      tuple),
+
+    ("glyphViewSmoothPointStroke", "Smooth Point Color", tuple),
+    ("glyphViewComponentFillColor", "Component Fill Color", tuple),
+    ("glyphViewComponentStrokeColor", "Component Stroke Color", tuple),
+    ("glyphViewComponentInfoColor", "Component Info Text Color", tuple),
+    ("glyphViewImageInfoColor", "Image Info Text Color", tuple),
+    ("glyphViewCubicHandlesStrokeColor", "Handle Stroke Color (Cubic Beziers, PostScript)", tuple),
+    ("glyphViewQuadraticHandlesStrokeColor", "Handle Stroke Color (Quadratic Beziers, TrueType)", tuple),
+    ("glyphViewStartPointsArrowColor", "Start Point Arrow Color for closed contour", tuple),
+    ("glyphViewOpenStartPointsArrowColor", "Start Point Arrow Color for an open contour", tuple),
+    ("glyphViewSelectionColor", "Selection Color", tuple),
+    ("glyphViewSelectionMarqueColor", "Selection Marquee Color", tuple),
+    ("glyphViewPointCoordinateColor", "Point Coordinate Color", tuple),
+    ("glyphViewPointCoordinateBackgroundColor", "Point Coordinate Background Color", tuple),
+    ("glyphViewLocalGuidesColor", "Local Guides Color", tuple),
+    ("glyphViewGlobalGuidesColor", "Global Guides Color", tuple),
+    ("glyphViewFamilyBluesColor", "Family Blues Color", tuple),
+    ("glyphViewBluesColor", "Blues Color", tuple),
+    ("glyphViewAnchorColor", "Anchor Color", tuple),
+    ("glyphViewAnchorTextColor", "Anchor Text Color", tuple),
+    ("glyphViewMarginColor", "Margins Background Color", tuple),
+    ("glyphViewFontMetricsStrokeColor", "Vertical Metrics Color", tuple),
+    ("glyphViewMetricsTitlesColor", "Vertical Metrics Titles Color", tuple),
+    ("glyphViewGridColor", "Grid Color", tuple),
+    ("glyphViewBitmapColor", "Bitmap Color", tuple),
+    ("glyphViewOutlineErrorsColor", "Line Straightness Indicator Color", tuple),
+    ("glyphViewMeasurementsTextColor", "Measurements Text Color", tuple),
+    ("glyphViewMeasurementsForegroundColor", "Measurements Line Color", tuple),
+    ("glyphViewMeasurementsBackgroundColor", "Measurements Secondary Line Color", tuple),
+    ("glyphViewContourIndexColor", "Contour Index Text Color", tuple),
+    ("glyphViewSegmentIndexColor", "Segment Index Text Color", tuple),
+    ("glyphViewPointIndexColor", "Point Index Text Color", tuple),
+    ("glyphViewEchoStrokeColor", "Echo Path Stroke Color", tuple)
+]
+
+# every key with a dark variant, what current RoboFont versions have;
+# the scripting API asks the running RoboFont instead (getDarkThemeKeys)
+ALLDARKTHEMEKEYS = [(f"{key}.dark", name, valueType) for (key, name, valueType) in THEMEKEYS]
+
+FALLBACKCOLOR = [.5, .5, .5, .5]
+FALLBACKSIZE = 2
+# theme keys that are not preferences
+THEMEMETAKEYS = {"themeName", "themeType", "basedOn"}
+
+
+def dataConverter(data, dataType):
+    # Thanks Frank:)
+    if data is not None:
+        convertedData = dataType(data)
+    else:
+        if dataType == float:
+            convertedData = float(FALLBACKSIZE)
+        elif dataType == int:
+            convertedData = FALLBACKSIZE
+        else:
+            convertedData = FALLBACKCOLOR
+    return convertedData
+
+def addDarkMode(themeDict, darkKeys):
+    # darkKeys are the DARKTHEMEKEYS of the running RoboFont
+    newTheme = {}
+    newTheme["themeName"] = themeDict["themeName"]
+    newTheme["themeType"] = "User"
+    for keyName, _, dataType in THEMEKEYS + list(darkKeys):              
+        if keyName in themeDict:
+            newTheme[keyName] = dataType(themeDict[keyName])
+        else:
+            light = keyName.replace(".dark","")
+            if light in themeDict:
+                newTheme[keyName] = dataType(themeDict[light])            
+    return newTheme
+    
+def addMissing(themeDict, darkKeys):
+    newTheme = {}
+    newTheme["themeName"] = themeDict["themeName"]
+    newTheme["themeType"] = "User"
+    for keyName, _, dataType in THEMEKEYS + list(darkKeys):              
+        if keyName in themeDict:
+            newTheme[keyName] = dataType(themeDict[keyName])
+        else:
+            data = themeDict.get(keyName)
+            val = dataConverter(data,dataType)
+            newTheme[keyName] = val
+    return newTheme
@@ -7,102 +7,77 @@ Get glyph view working
 '''
 
 import os
-import plistlib
-from mojo.UI import getDefault, setDefault
-from mojo.extensions import getExtensionDefault, setExtensionDefault, ExtensionBundle
-from lib.tools.notifications import PostNotification
 import WCAGContrastRatio as contrast
+import ThemeManagerSchema as schema
+import ThemeManagerDelta as themeDelta
+import ThemeManagerDedupe as themeDedupe
+import ThemeManagerSimilarity as themeSimilarity
+import ThemeManagerProfile as themeProfile
+import ThemeManagerFileFormat as themeFileFormat
+import ThemeManagerPresetCache as presetCache
+import ThemeManagerVector as themeVector
+import ThemeManagerBlend as blender
+import ThemeManagerStore as themeStore
+import ThemeManagerPack as themePack
+import ThemeManagerValidator as themeValidator
+import ThemeManagerLoader as themeLoader
 import importlib
 importlib.reload(contrast)
+importlib.reload(schema)
+importlib.reload(themeDelta)
+importlib.reload(themeDedupe)
+importlib.reload(themeSimilarity)
+importlib.reload(themeProfile)
+importlib.reload(themeFileFormat)
+importlib.reload(presetCache)
+importlib.reload(themeVector)
+importlib.reload(blender)
+importlib.reload(themeStore)
+importlib.reload(themePack)
+importlib.reload(themeValidator)
+importlib.reload(themeLoader)
+from ThemeManagerSchema import RENAMEMAP, THEMEKEYS, THEMEMETAKEYS, FALLBACKCOLOR, FALLBACKSIZE
+# RoboFont when running inside it, a pure Python stand-in otherwise.
+# Not reloaded with the rest, it holds the backend chosen with setBackend.
+from ThemeManagerBackend import getDefault, setDefault, getExtensionDefault, setExtensionDefault, removeExtensionDefault, postNotification, resourcesPath
 
 DEFAULTSKEY = "com.andyclymer.themeManager"
-EXTENSIONBUNDLE = ExtensionBundle("ThemeManager")
+# bumped on every write of the user themes so cached readers know to reload
+CHANGECOUNTKEY = f"{DEFAULTSKEY}.changeCount"
+# "defaults" or "sqlite", see useThemeStore
+STOREKEY = f"{DEFAULTSKEY}.store"
+SQLITEPATH = os.path.expanduser("~/Library/Application Support/RoboFont/ThemeManager/themes.sqlite")
+# how many of MIGRATIONS have been applied to the stored user themes
+SCHEMAVERSIONKEY = f"{DEFAULTSKEY}.schemaVersion"
+# the dark keys and change count the dark mode backfill last ran for
+DARKMODESTAMPKEY = f"{DEFAULTSKEY}.darkModeStamp"
 
-RENAMEMAP = {"glyphViewOncurvePointsSize":"glyphViewOnCurvePointsSize",
-             "glyphViewOffCurvePointsFill":"glyphViewOffCurveCubicPointsFill",
-             "glyphViewOffCurveQuadPointsStroke":"glyphViewOffCurveQuadraticPointsStroke",
-            }
-
-# Preference keys and names for the theme settings
-THEMEKEYS = [
-    ("glyphViewOnCurvePointsSize", "Oncurve Size", float),
-    ("glyphViewOffCurvePointsSize", "Offcurve Size", float),
-    ("glyphViewStrokeWidth", "Glyph Stroke Width", int),
-    ("glyphViewSelectionStrokeWidth", "Selection Stroke Width", int),
-    ("glyphViewHandlesStrokeWidth", "Handle stroke width", int),
-    ("glyphViewBackgroundColor", "Background Color", tuple),
-    ("glyphViewFillColor", "Fill Color", tuple),
-    ("glyphViewPreviewFillColor", "Preview Fill Color", tuple),
-    ("glyphViewPreviewBackgroundColor", "Preview Background Color", tuple),
-    ("glyphViewAlternateFillColor", "Alternate Fill Color", tuple),
-    ("glyphViewStrokeColor", "Stroke Color", tuple),
-    ("glyphViewCornerPointsFill", "Corner Point Fill Color", tuple),
-    ("glyphViewCornerPointsStroke", "Corner Point Stroke Color", tuple),
-    ("glyphViewCurvePointsFill", "Curve Point Fill Color", tuple),
-    ("glyphViewCurvePointsStroke", "Curve Point Stroke Color", tuple),
-    ("glyphViewTangentPointsFill", "Tangent Fill Color", tuple),
-    ("glyphViewTangentPointsStroke", "Tangent Stroke Color", tuple),
-    # ("glyphViewOffCurvePointsFill", "Offcurve Fill Color", tuple),
-    # ("glyphViewOffCurveQuadPointsStroke", "Offcurve Stroke Color (Quadratic Beziers, TrueType)", tuple),
-
-    # updated keys
-    ("glyphViewOffCurveCubicPointsFill",       "Offcurve Fill Color (Cubic Beziers, PostScript)",     tuple),
-    ("glyphViewOffCurveCubicPointsStroke",     "Offcurve Stroke Color (Cubic Beziers, PostScript)",   tuple),
-    ("glyphViewOffCurveQuadraticPointsFill",   "Offcurve Fill Color (Quadratic Beziers, TrueType)",   tuple),
-    ("glyphViewOffCurveQuadraticPointsStroke", "Offcurve Stroke Color (Quadratic Beziers, TrueType)", tuple),
-    ("glyphViewOffCurveTrailingPointsFill",    "Trailing Offcurve Fill Color",                        tuple),
-    ("glyphViewOffCurveTrailingPointsStroke",  "Trailing Offcurve Stroke Color",                      tuple),
-
-    ("glyphViewSmoothPointStroke", "Smooth Point Color", tuple),
-    ("glyphViewComponentFillColor", "Component Fill Color", tuple),
-    ("glyphViewComponentStrokeColor", "Component Stroke Color", tuple),
-    ("glyphViewComponentInfoColor", "Component Info Text Color", tuple),
-    ("glyphViewImageInfoColor", "Image Info Text Color", tuple),
-    ("glyphViewCubicHandlesStrokeColor", "Handle Stroke Color (Cubic Beziers, PostScript)", tuple),
-    ("glyphViewQuadraticHandlesStrokeColor", "Handle Stroke Color (Quadratic Beziers, TrueType)", tuple),
-    ("glyphViewStartPointsArrowColor", "Start Point Arrow Color for closed contour", tuple),
-    ("glyphViewOpenStartPointsArrowColor", "Start Point Arrow Color for an open contour", tuple),
-    ("glyphViewSelectionColor", "Selection Color", tuple),
-    ("glyphViewSelectionMarqueColor", "Selection Marquee Color", tuple),
-    ("glyphViewPointCoordinateColor", "Point Coordinate Color", tuple),
-    ("glyphViewPointCoordinateBackgroundColor", "Point Coordinate Background Color", tuple),
-    ("glyphViewLocalGuidesColor", "Local Guides Color", tuple),
-    ("glyphViewGlobalGuidesColor", "Global Guides Color", tuple),
-    ("glyphViewFamilyBluesColor", "Family Blues Color", tuple),
-    ("glyphViewBluesColor", "Blues Color", tuple),
-    ("glyphViewAnchorColor", "Anchor Color", tuple),
-    ("glyphViewAnchorTextColor", "Anchor Text Color", tuple),
-    ("glyphViewMarginColor", "Margins Background Color", tuple),
-    ("glyphViewFontMetricsStrokeColor", "Vertical Metrics Color", tuple),
-    ("glyphViewMetricsTitlesColor", "Vertical Metrics Titles Color", tuple),
-    ("glyphViewGridColor", "Grid Color", tuple),
-    ("glyphViewBitmapColor", "Bitmap Color", tuple),
-    ("glyphViewOutlineErrorsColor", "Line Straightness Indicator Color", tuple),
-    ("glyphViewMeasurementsTextColor", "Measurements Text Color", tuple),
-    ("glyphViewMeasurementsForegroundColor", "Measurements Line Color", tuple),
-    ("glyphViewMeasurementsBackgroundColor", "Measurements Secondary Line Color", tuple),
-    ("glyphViewContourIndexColor", "Contour Index Text Color", tuple),
-    ("glyphViewSegmentIndexColor", "Segment Index Text Color", tuple),
-    ("glyphViewPointIndexColor", "Point Index Text Color", tuple),
-    ("glyphViewEchoStrokeColor", "Echo Path Stroke Color", tuple)
-]
-DARKTHEMEKEYS = [(f"{key}.dark",name,val) for (key,name,val) in THEMEKEYS if getDefault(f"{key}.dark")]
-FALLBACKCOLOR = [.5, .5, .5, .5]
-FALLBACKSIZE = 2
+# DARKTHEMEKEYS is resolved on first use, see getDarkThemeKeys
+_darkThemeKeys = None
+# .roboFontTheme flavors exportTheme can write, reading detects them
+THEMEFILEFORMATS = themeFileFormat.FORMATS
+# the format the export dialog writes, see setExportFormat
+EXPORTFORMATKEY = f"{DEFAULTSKEY}.exportFormat"
+CONTRASTBACKGROUNDKEYS = themeProfile.CONTRASTBACKGROUNDKEYS
+# prefix of the per theme profile keys, see getThemeProfile
+PROFILESKEY = f"{DEFAULTSKEY}.profiles"
+# where a partial theme's missing colors come from when profiling it
+PROFILEDEFAULTTHEME = "RF Default"
+# what sortThemeNames can sort by
+PROFILESORTKEYS = ("themeName",) + themeProfile.PROFILEKEYS
+# colors round trip through NSColor, don't rewrite a default over float noise
+VALUETOLERANCE = 1e-5
 
 # -------------
 # Scripting API
 # -------------
 
 def loadUserDefinedThemes():
-    userDefinedThemes = getExtensionDefault(DEFAULTSKEY)
+    userDefinedThemes = getThemeStore().load()
     loaded = []
     if userDefinedThemes:
         for theme in userDefinedThemes:
-            for nameKey, name, valueType in THEMEKEYS:
-                if nameKey not in theme:
-                    continue
-                theme[nameKey] = valueType(theme[nameKey])
+            _coerceUserTheme(theme)
                 
             # for nameKey, name, valueType in DARKTHEMEKEYS:
             #     if nameKey not in theme  and nameKey.replace(".dark", "") in theme:
@@ -111,155 +86,975 @@ def loadUserDefinedThemes():
             loaded.append(theme)
     return loaded
 
-def loadBuiltInThemes():
-    presetFolder = os.path.join(
-        EXTENSIONBUNDLE.resourcesPath(),
-        "presetThemes"
-    )
-    loaded = []
-    for fileName in os.listdir(presetFolder):
-        name, ext = os.path.splitext(fileName)
-        if ext == ".roboFontTheme":
-            plistPath = os.path.join(presetFolder, fileName)
-            with open(plistPath, "rb") as themeFile:
-                theme = plistlib.load(themeFile)
+def loadBuiltInThemes(packs=True):
+    # packs=False leaves out the themes in packs, see loadPackThemeNames
+    presetFolder = _presetFolder()
+    presets = presetCache.loadPresetThemes(presetFolder)
+    themes = [theme for path, signature, theme in presets]
+    if not packs:
+        return themes
+    for path in _presetPackPaths(presetFolder):
+        with themePack.ThemePack(path) as pack:
+            for _, theme in pack:
                 theme["themeType"] = "Default"
-                loaded.append(theme)
-    return loaded
+                themes.append(theme)
+    return themes
+
+def loadPackThemeNames():
+    # the names of the themes in the preset packs, read from their index,
+    # nothing is decoded. getThemeData gets one of them.
+    names = []
+    for path in _presetPackPaths(_presetFolder()):
+        with themePack.ThemePack(path) as pack:
+            names.extend(pack.names())
+    return names
 
 def loadThemes(names=False):
     # get all themes, if names == True return only the names
-    themes = loadUserDefinedThemes()
-    themes += loadBuiltInThemes()
+    registry = getThemeRegistry()
     if names:
-        return [t["themeName"] for t in themes]
+        return registry.names()
     else:
-        return themes
+        return registry.themes()
 
 def getThemeData(themeName):
-    if themeName in loadThemes(True):
-        for theme in loadThemes():
-            if theme["themeName"] == themeName:
-                return theme
-    else:
+    theme = getThemeRegistry().get(themeName)
+    if theme is None:
         print(f"{themeName} does not exist...")
+    return theme
 
 def themeBlender(theme1, theme2, factor, save=False):
     # contributed by Erik van Blokland
     
-    allThemes = loadThemes(True)
+    registry = getThemeRegistry()
     newTheme = {}    
-    if theme1 in allThemes and theme2 in allThemes:
-        theme1 = getThemeData(theme1)
-        theme2 = getThemeData(theme2)
-        blendedName = f"A {factor*100:3.1f}% blend between \"{theme1['themeName']}\" and \"{theme2['themeName']}\""
-        for name, value1 in theme1.items():
-            if name == "themeName":
-                newTheme[name] = blendedName
-                continue
-            elif name == 'themeType':
-                newTheme[name] = "User"
-                continue
-                
-            if name not in theme2.keys():
-                newTheme[name] = value1
-            else:
-                value2 = theme2[name]
-                if isinstance(value1, (int, float)) and isinstance(value2, (int, float)):
-                    newTheme[name] = _interpolate(value1, value2, factor)
-                    continue
-                if len(value1) == len(value2):
-                    r = []
-                    for i, v1 in enumerate(value1):
-                        v2 = value2[i]
-                        r.append(_interpolate(v1, v2, factor))
-                    newTheme[name] = r
-    if save:
-        pastThemes = loadUserDefinedThemes()
-        pastThemes.append(newTheme)
-        saveThemes(pastThemes)
+    if theme1 in registry and theme2 in registry:
+        blendedName = f"A {factor*100:3.1f}% blend between \"{theme1}\" and \"{theme2}\""
+        newTheme = blendThemes([theme1, theme2], [1 - factor, factor], name=blendedName)
+    if save and newTheme:
+        _addUserTheme(newTheme)
         
     return newTheme
+
+def blendThemes(themeNames, weights, name=None, save=False):
+    # blend any number of themes, one weight per theme
+    vectors = _getVectors(themeNames)
+    if vectors is None:
+        return {}
+    newTheme = blender.blendVectors(vectors, weights).toDict()
+    if name is None:
+        parts = ", ".join(f"{weight*100:3.1f}% \"{themeName}\"" for themeName, weight in zip(themeNames, weights))
+        name = f"A blend of {parts}"
+    newTheme["themeName"] = name
+    newTheme["themeType"] = "User"
+    if save:
+        _addUserTheme(newTheme)
+    return newTheme
+
+def themeRamp(theme1, theme2, steps):
+    # steps evenly spaced blends from theme1 to theme2, computed in one go
+    vectors = _getVectors([theme1, theme2])
+    if vectors is None:
+        return []
+    ramp = []
+    for step, vector in enumerate(blender.rampVectors(vectors[0], vectors[1], steps)):
+        newTheme = vector.toDict()
+        newTheme["themeName"] = f"{theme1} → {theme2} {step + 1}/{steps}"
+        newTheme["themeType"] = "User"
+        ramp.append(newTheme)
+    return ramp
     
+def validateTheme(themeData, fill=True):
+    # returns (validated, errors), see ThemeManagerValidator
+    schema = themeValidator.compileSchema(getDarkThemeKeys())
+    return themeValidator.validateTheme(themeData, schema, fill=fill)
+
+def loadThemeFiles(paths, workers=None, processes=False, progress=None):
+    # the .roboFontTheme files at paths, parsed and validated in parallel.
+    # Iterate the result for (path, theme, errors) as files finish,
+    # it keeps count and has a throughput in files per second.
+    return themeLoader.ThemeFileLoader(
+        paths,
+        workers=workers,
+        processes=processes,
+        darkKeys=getDarkThemeKeys(),
+        progress=progress
+    )
+
+def loadThemeDirectory(path, workers=None, processes=False, progress=None):
+    # every .roboFontTheme under path, see loadThemeFiles
+    return loadThemeFiles(themeLoader.findThemeFiles(path), workers=workers, processes=processes, progress=progress)
+
+def readThemeFile(path):
+    # the themes in a .roboFontTheme (any of THEMEFILEFORMATS) or a pack, as a list
+    if os.path.splitext(path)[1] == themePack.PACKEXTENSION:
+        with themePack.ThemePack(path) as pack:
+            return [theme for _, theme in pack]
+    theme, errors = themeLoader.loadThemeFile(path, getDarkThemeKeys())
+    if theme is None:
+        raise ValueError(str(errors[0]))
+    return [flattenTheme(theme)]
+
+def flattenTheme(theme):
+    # a delta theme overlaid on its (flattened) base from the registry,
+    # other themes as they are
+    return getThemeRegistry().flattenWith(theme)
+
+def exportTheme(theme, path, fileFormat="xml", delta=False):
+    # write one theme as a .roboFontTheme, fileFormat is one of THEMEFILEFORMATS.
+    # With delta a theme that has a base is written as the keys that differ
+    # from it, otherwise every key is written and basedOn left out.
+    if delta and themeDelta.isDelta(theme):
+        themeStorage = _deltaForStorage(theme)
+        if themeStorage is not theme:
+            themeStorage["themeType"] = "User"
+            for key, name, valueType in THEMEKEYS + getDarkThemeKeys():
+                if key in themeStorage:
+                    themeStorage[key] = _dataConverter(themeStorage[key], valueType)
+            themeFileFormat.dump(themeStorage, path, fileFormat)
+            return
+    themeStorage = dict(
+        themeName=theme["themeName"],
+        themeType="User"
+    )
+    for key, name, valueType in THEMEKEYS + getDarkThemeKeys():
+        themeStorage[key] = _dataConverter(theme.get(key), valueType)
+    themeFileFormat.dump(themeStorage, path, fileFormat)
+
+def rebaseTheme(themeOrThemeName, baseName):
+    # a copy of the theme that is stored as the difference to baseName,
+    # None for baseName makes it a plain theme again
+    if isinstance(themeOrThemeName, str):
+        theme = getThemeRegistry().get(themeOrThemeName)
+        if theme is None:
+            print(f"{themeOrThemeName} does not exist...")
+            return None
+    else:
+        theme = _copyTheme(themeOrThemeName)
+    if baseName is None:
+        return themeDelta.stripDelta(theme)
+    registry = getThemeRegistry()
+    if baseName not in registry:
+        print(f"{baseName} does not exist...")
+        return None
+    if baseName == theme["themeName"] or theme["themeName"] in registry.ancestors(baseName):
+        raise themeDelta.InheritanceCycleError(f"{baseName} already inherits from {theme['themeName']}.")
+    theme = themeDelta.stripDelta(theme)
+    theme[themeDelta.BASEKEY] = baseName
+    return theme
+
+def setThemeParent(themeOrThemeName, parentName):
+    # rebaseTheme by another name, for inheritance chains: house theme → team → person
+    return rebaseTheme(themeOrThemeName, parentName)
+
+def themeContentHash(themeOrThemeName):
+    # equal hashes mean the themes look the same, names aside
+    if isinstance(themeOrThemeName, str):
+        return getThemeRegistry().contentHash(themeOrThemeName)
+    return themeDedupe.canonicalHash(flattenTheme(themeOrThemeName))
+
+def themesEqual(themeOrThemeName1, themeOrThemeName2):
+    return themeContentHash(themeOrThemeName1) == themeContentHash(themeOrThemeName2)
+
+def findThemeWithContent(theme):
+    # the name of a user or built-in theme that looks the same as theme, or None
+    return getThemeRegistry().findContent(themeContentHash(theme))
+
+def findDuplicateThemes():
+    # lists of theme names that look the same, the one to keep first:
+    # a built-in theme when there is one, otherwise the first user theme
+    return getThemeRegistry().duplicates()
+
+def duplicateThemeReport():
+    return themeDedupe.duplicateReport(findDuplicateThemes())
+
+def removeDuplicateUserThemes():
+    # keep the first theme of every group, drop the user themes that
+    # repeat it. Returns the removed names.
+    userThemes = loadUserDefinedThemes()
+    userNames = {theme["themeName"] for theme in userThemes}
+    removed = set()
+    for names in findDuplicateThemes():
+        removed.update(themeName for themeName in names[1:] if themeName in userNames)
+    if removed:
+        _writeUserThemes([theme for theme in userThemes if theme["themeName"] not in removed])
+    return sorted(removed)
+
+def findSimilarThemes(themeOrThemeName, k=5, maxDeltaE=None):
+    """
+    Up to k (theme name, ΔE) pairs for the user, built-in and pack themes
+    that look closest to the given theme, closest first. ΔE is the mean
+    OKLab distance over the light colors, below 2 is hard to tell apart.
+    A theme name leaves that theme itself out.
+    """
+    registry = getThemeRegistry()
+    if isinstance(themeOrThemeName, str):
+        theme = registry.getVector(themeOrThemeName)
+        if theme is None:
+            return []
+        exclude = {themeOrThemeName}
+    else:
+        theme = flattenTheme(themeOrThemeName)
+        exclude = ()
+    return registry.similarityIndex().query(theme, k, maxDeltaE, exclude)
+
+def themeDeltaE(themeOrThemeName1, themeOrThemeName2):
+    themes = [
+        getThemeRegistry().getVector(theme) if isinstance(theme, str) else flattenTheme(theme)
+        for theme in (themeOrThemeName1, themeOrThemeName2)
+    ]
+    return themeSimilarity.deltaE(*themes)
+
+def getThemeAncestors(themeName):
+    # base names, nearest first
+    return getThemeRegistry().ancestors(themeName)
+
+def getThemeDescendants(themeName):
+    # every theme that inherits from themeName, directly or further down
+    return getThemeRegistry().descendants(themeName)
+
+def getExportFormat():
+    return getExtensionDefault(EXPORTFORMATKEY, "xml")
+
+def setExportFormat(fileFormat):
+    # "xml" stays readable by older Theme Manager versions,
+    # "binary" and "zlib" are smaller and faster to read
+    if fileFormat not in THEMEFILEFORMATS:
+        raise ValueError(f"Unknown theme file format: {fileFormat}")
+    setExtensionDefault(EXPORTFORMATKEY, fileFormat)
+
+def diffThemes(theme1, theme2):
+    # key → (value1, value2) for every preference key that differs, None when missing
+    differences = {}
+    for key in list(theme1) + [key for key in theme2 if key not in theme1]:
+        if key in THEMEMETAKEYS:
+            continue
+        value1 = theme1.get(key)
+        value2 = theme2.get(key)
+        if not _valuesEqual(value1, value2):
+            differences[key] = (value1, value2)
+    return differences
+
+def contrastAudit(theme, dark=False):
+    # (key, contrast ratio) for every color against the background, lowest first.
+    # The background is the margin color seen over the glyph view background.
+    return themeProfile.contrastRatios(theme, dark)
+
+def getThemeProfile(themeOrThemeName, cachedOnly=False):
+    """
+    The ThemeProfile of a theme: background luminance, dark or light,
+    dominant hue and minimum contrast. Profiles are stored by content
+    hash, the color math only runs for a theme that looks new. None when
+    the theme doesn't exist or can't be profiled.
+
+    With cachedOnly a theme name only gets a profile whose content hash
+    is already known, nothing is decoded or computed. For pack themes
+    that haven't been loaded yet.
+    """
+    cache = _getProfileCache()
+    if isinstance(themeOrThemeName, str):
+        registry = getThemeRegistry()
+        if cachedOnly:
+            digest = registry.knownContentHash(themeOrThemeName)
+            if digest is None:
+                return None
+            return cache.get(digest, themeOrThemeName)
+        digest = registry.contentHash(themeOrThemeName)
+        if digest is None:
+            return None
+        profile = cache.get(digest, themeOrThemeName)
+        if profile is None:
+            profile = _profileTheme(registry.get(themeOrThemeName), digest)
+        return profile
+    theme = flattenTheme(themeOrThemeName)
+    digest = themeDedupe.canonicalHash(theme)
+    return cache.get(digest) or _profileTheme(theme, digest)
+
+def sortThemeNames(key="themeName", themeNames=None, reverse=False):
+    # themeNames (all of them by default) sorted by a PROFILESORTKEYS key,
+    # themes without a value (a gray theme has no hue) go last
+    if key not in PROFILESORTKEYS:
+        raise ValueError(f"Can't sort themes by {key}, use one of {', '.join(PROFILESORTKEYS)}.")
+    if themeNames is None:
+        themeNames = getThemeRegistry().names()
+    if key == "themeName":
+        return sorted(themeNames, key=str.casefold, reverse=reverse)
+    values = {themeName: getattr(getThemeProfile(themeName), key, None) for themeName in themeNames}
+    found = sorted((name for name in themeNames if values[name] is not None), key=values.get, reverse=reverse)
+    return found + [name for name in themeNames if values[name] is None]
+
+def filterThemeNames(themeNames=None, dark=None, minimumContrast=None, hue=None, hueTolerance=30):
+    """
+    The themeNames (all of them by default) whose profile matches: dark
+    True or False, a minimum contrast ratio, a hue in degrees give or
+    take hueTolerance. None leaves that criterion out.
+    """
+    if themeNames is None:
+        themeNames = getThemeRegistry().names()
+    found = []
+    for themeName in themeNames:
+        profile = getThemeProfile(themeName)
+        if profile is None:
+            continue
+        if not themeProfile.profileMatches(profile, dark, minimumContrast, hue, hueTolerance):
+            continue
+        found.append(themeName)
+    return found
+
+def addThemePack(path):
+    # make the themes in a .roboFontThemePack available by name
+    getThemeRegistry().addPack(path)
+
+def removeThemePack(path):
+    getThemeRegistry().removePack(path)
+
+def packThemeFolder(folder, path):
+    # write every .roboFontTheme under folder into one pack
+    return themePack.packThemeFolder(folder, path)
+
+def newThemeDesignspace(designspaceName, axes):
+    # axes is a dict of axis name → (minimum, default, maximum)
+    _themeDesignspaces[designspaceName] = _designspaceModule().ThemeDesignspace(axes)
+    return _themeDesignspaces[designspaceName]
+
+def addThemeMaster(designspaceName, themeOrThemeName, location):
+    if isinstance(themeOrThemeName, str):
+        vector = getThemeRegistry().getVector(themeOrThemeName)
+        if vector is None:
+            print(f"{themeOrThemeName} does not exist...")
+            return
+    else:
+        vector = themeVector.ThemeVector.fromDict(themeOrThemeName)
+    _themeDesignspaces[designspaceName].addMaster(vector, location)
+
+def getThemeInstance(designspaceName, location, name=None):
+    # the masters are compiled on the first call and reused until a master changes
+    newTheme = _themeDesignspaces[designspaceName].instance(location).toDict()
+    if name is None:
+        parts = ", ".join(f"{axis}={value}" for axis, value in location.items())
+        name = f"{designspaceName} ({parts})"
+    newTheme["themeName"] = name
+    newTheme["themeType"] = "User"
+    return newTheme
+
+def applyThemeInstance(designspaceName, location):
+    return applyTheme(getThemeInstance(designspaceName, location))
+
 def saveThemes(themes):
     themes = [
         theme for theme in themes
         if theme["themeType"] == "User"
     ]
-    setExtensionDefault(DEFAULTSKEY, themes)
+    _writeUserThemes(themes)
 
 def applyTheme(themeOrThemeName):
     theme = None
     if isinstance(themeOrThemeName, str):
-        themes = loadThemes()
-        for t in themes:
-            if t["themeName"] == themeOrThemeName:
-                theme = t
-                break
+        theme = getThemeRegistry().get(themeOrThemeName)
     else:
-        theme = themeOrThemeName
+        # a delta has to be applied with what it inherits
+        theme = flattenTheme(themeOrThemeName)
     if theme:
-        for key, val in theme.items():
-            setDefault(key, val)
-        PostNotification("doodle.preferencesChanged")
+        # only write the preferences that actually differ,
+        # nothing changed means no notification and no redraw
+        changed = diffThemeWithDefaults(theme)
+        for key in changed:
+            setDefault(key, theme[key])
+        if changed:
+            postNotification("doodle.preferencesChanged")
+        return changed
     else:
         print(f"{themeOrThemeName} does not exist...")
+    return set()
+
+def diffThemeWithDefaults(theme):
+    # the set of preference keys in theme whose value differs from the current defaults
+    changed = set()
+    for key, val in theme.items():
+        if key in THEMEMETAKEYS:
+            continue
+        if not _valuesEqual(val, getDefault(key)):
+            changed.add(key)
+    return changed
         
 
+def getDarkThemeKeys():
+    # the THEMEKEYS the running RoboFont has a .dark preference for,
+    # asked once and cached until resetDarkThemeKeys
+    global _darkThemeKeys
+    if _darkThemeKeys is None:
+        _darkThemeKeys = [(f"{key}.dark",name,val) for (key,name,val) in THEMEKEYS if getDefault(f"{key}.dark")]
+    return _darkThemeKeys
+
+def resetDarkThemeKeys():
+    # call when the preferences schema changed
+    global _darkThemeKeys
+    _darkThemeKeys = None
+
+def __getattr__(name):
+    # keep `ThemeManagerScripting.DARKTHEMEKEYS` working without
+    # asking the preferences at import time
+    if name == "DARKTHEMEKEYS":
+        return getDarkThemeKeys()
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+# --------------
+# Theme Registry
+# --------------
+
+class ThemeRegistry(object):
+
+    """
+    A name → theme index over the user defined and built-in themes.
+
+    Preset files are parsed once and only re-read when their mtime/size
+    changes, user themes are only re-read when the defaults change counter
+    moves. Lookups are a dict hit. User themes shadow built-in themes with
+    the same name, the same way the linear search in `getThemeData` did.
+
+    Theme packs (ThemeManagerPack) are consulted after that, by binary
+    search in the mapped file, without loading the pack into dicts. Packs
+    in the preset folder are picked up automatically, others are added
+    with `addPack`.
+
+    Delta themes (ThemeManagerDelta) are flattened along their chain of
+    bases on first access and kept. When themes change only those and the
+    themes inheriting from them are flattened again. Writes made through
+    this module update the registry in place instead of re-reading the
+    store.
+    """
+
+    def __init__(self, presetFolder=None):
+        if presetFolder is None:
+            presetFolder = _presetFolder()
+        self.presetFolder = presetFolder
+        self._presetFolderSignature = None
+        # path → ((mtime, size), theme)
+        self._presets = {}
+        self._userChangeCount = None
+        self._userThemes = []
+        self._index = None
+        # theme name → preset path
+        self._presetPaths = {}
+        # theme name → ThemeVector, dropped whenever the index is rebuilt
+        self._vectors = {}
+        # theme name → canonical content hash, dropped like the vectors
+        self._contentHashes = {}
+        # OKLab rows for findSimilarThemes, filled up on the first query
+        self._similarity = themeSimilarity.SimilarityIndex()
+        self._similarityComplete = False
+        # flattened delta themes and who depends on whom
+        self._inheritance = themeDelta.ThemeInheritance(self._getStoredTheme)
+        # path → ThemePack, in lookup order
+        self._packs = {}
+        self._presetPackPaths = set()
+
+    def __contains__(self, themeName):
+        if themeName in self._getIndex():
+            return True
+        return any(themeName in pack for pack in self._packs.values())
+
+    def addPack(self, path):
+        if path not in self._packs:
+            self._packs[path] = themePack.ThemePack(path)
+            # a pack can provide a missing base
+            self._inheritance.clear()
+            self._similarityComplete = False
+
+    def removePack(self, path):
+        pack = self._packs.pop(path, None)
+        if pack is not None:
+            pack.close()
+            self._contentHashes = {}
+            self._inheritance.clear()
+            self._similarity.clear()
+            self._similarityComplete = False
+
+    def get(self, themeName):
+        theme = self._getIndex().get(themeName)
+        if theme is None:
+            return self._getFromPacks(themeName)
+        if theme.get("themeType") == "Default" and self._presetChanged(themeName):
+            # edited in place, the folder mtime doesn't catch that
+            self._presetFolderSignature = None
+            theme = self._getIndex().get(themeName)
+            if theme is None:
+                return None
+        return _copyTheme(self._flatten(theme))
+
+    def getVector(self, themeName):
+        """
+        The theme as a ThemeVector, converted once per index build.
+        Treat it as read only, copy it before changing it.
+        """
+        if themeName not in self._getIndex():
+            for pack in self._packs.values():
+                vector = pack.getVector(themeName)
+                if vector is not None:
+                    vector.themeType = "Default"
+                    return vector
+            return None
+        theme = self.get(themeName)
+        if theme is None:
+            return None
+        vector = self._vectors.get(themeName)
+        if vector is None:
+            vector = self._vectors[themeName] = themeVector.ThemeVector.fromDict(theme)
+        return vector
+
+    def contentHash(self, themeName):
+        digest = self._contentHashes.get(themeName)
+        if digest is None:
+            theme = self.get(themeName)
+            if theme is None:
+                return None
+            # pack themes are read only while their pack is loaded
+            digest = self._contentHashes[themeName] = themeDedupe.canonicalHash(theme)
+        return digest
+
+    def knownContentHash(self, themeName):
+        # the hash contentHash already worked out, None before that
+        return self._contentHashes.get(themeName)
+
+    def duplicates(self):
+        # over the user themes and presets (packs are left alone), with
+        # the hashes cached this is one dict pass
+        groups = {}
+        index = self._getIndex()
+        for themeName in index:
+            groups.setdefault(self.contentHash(themeName), []).append(themeName)
+        # built-in themes go first, they are the ones kept
+        return [
+            sorted(names, key=lambda themeName: index[themeName].get("themeType") != "Default")
+            for names in groups.values() if len(names) > 1
+        ]
+
+    def findContent(self, digest):
+        # the theme duplicates() would keep: a built-in one before a user one
+        found = None
+        for themeName, theme in self._getIndex().items():
+            if self.contentHash(themeName) == digest:
+                if theme.get("themeType") == "Default":
+                    return themeName
+                if found is None:
+                    found = themeName
+        return found
+
+    def similarityIndex(self):
+        # only themes that aren't in it yet are converted
+        self._getIndex()
+        if not self._similarityComplete:
+            for themeName in self.names():
+                if themeName not in self._similarity:
+                    vector = self.getVector(themeName)
+                    if vector is not None:
+                        self._similarity.add(themeName, vector)
+            self._similarityComplete = True
+        return self._similarity
+
+    def names(self):
+        names = [theme["themeName"] for theme in self._ordered()]
+        seen = set(names)
+        for pack in self._packs.values():
+            for themeName in pack.names():
+                if themeName not in seen:
+                    seen.add(themeName)
+                    names.append(themeName)
+        return names
+
+    def userThemes(self):
+        # the user themes as stored, deltas stay deltas, treat them as read only
+        self._getIndex()
+        return list(self._userThemes)
+
+    def themes(self):
+        # this does decode every pack theme, use iterPackThemes to stream
+        themes = [_copyTheme(self._flatten(theme)) for theme in self._ordered()]
+        seen = {theme["themeName"] for theme in themes}
+        for _, theme in self.iterPackThemes():
+            if theme["themeName"] not in seen:
+                seen.add(theme["themeName"])
+                themes.append(theme)
+        return themes
+
+    def iterPackThemes(self):
+        # (pack path, theme) one decoded theme at a time
+        self._getIndex()
+        for path, pack in self._packs.items():
+            for _, theme in pack:
+                theme["themeType"] = "Default"
+                yield path, theme
+
+    def invalidate(self):
+        self._presetFolderSignature = None
+        self._presets.clear()
+        self._userChangeCount = None
+        self._index = None
+        self._presetPaths = {}
+        self._vectors = {}
+        self._contentHashes = {}
+        self._similarity.clear()
+        self._similarityComplete = False
+        self._inheritance.clear()
+
+    def flattenWith(self, theme):
+        # flatten a theme that may not be in the registry against the registry
+        self._getIndex()
+        try:
+            return self._inheritance.flattenWith(theme)
+        except themeDelta.InheritanceCycleError as error:
+            print(f"{theme['themeName']} inherits from itself: {error}")
+            return theme
+
+    def ancestors(self, themeName):
+        self._getIndex()
+        return self._inheritance.ancestors(themeName)
+
+    def descendants(self, themeName):
+        # one pass over the stored themes for the child lists, then a walk down
+        children = {}
+        for theme in self._getIndex().values():
+            parentName = themeDelta.baseName(theme)
+            if parentName is not None:
+                children.setdefault(parentName, []).append(theme["themeName"])
+        found = []
+        stack = list(children.get(themeName, ()))
+        while stack:
+            name = stack.pop(0)
+            if name in found or name == themeName:
+                continue
+            found.append(name)
+            stack.extend(children.get(name, ()))
+        return found
+
+    def userThemesWritten(self, themes, written, changeCount):
+        """
+        The user themes (as stored) were just written through this module.
+        Take them as they are and only re-flatten what depends on written,
+        unless somebody else wrote in between.
+        """
+        if self._index is None or self._userChangeCount is None or changeCount != self._userChangeCount + 1:
+            return
+        self._userThemes = [_coerceUserTheme(dict(theme)) for theme in themes]
+        self._userChangeCount = changeCount
+        self._rebuildIndex(set(written))
+
+    # internal
+
+    def _getStoredTheme(self, themeName):
+        theme = self._index.get(themeName)
+        if theme is None:
+            theme = self._getFromPacks(themeName)
+        return theme
+
+    def _flatten(self, theme):
+        if not themeDelta.isDelta(theme):
+            return theme
+        try:
+            if self._index.get(theme["themeName"]) is not theme:
+                # a preset shadowed by a user theme with the same name
+                return self._inheritance.flattenWith(theme)
+            return self._inheritance.flatten(theme["themeName"])
+        except themeDelta.InheritanceCycleError as error:
+            print(f"{theme['themeName']} inherits from itself: {error}")
+            return theme
+
+    def _ordered(self):
+        # listing everything is O(n) anyway, so verify every preset file
+        for path, (signature, _) in self._presets.items():
+            if _statSignature(path) != signature:
+                self._presetFolderSignature = None
+                break
+        self._getIndex()
+        return self._userThemes + [theme for _, theme in self._presets.values()]
+
+    def _getIndex(self):
+        userChanged = self._refreshUserThemes()
+        presetsChanged = self._refreshPresets()
+        if self._index is None or userChanged or presetsChanged:
+            self._rebuildIndex()
+        return self._index
+
+    def _rebuildIndex(self, changed=None):
+        # changed is the set of names known to be different, None to compare
+        index = {}
+        for theme in self._userThemes:
+            index.setdefault(theme["themeName"], theme)
+        presetPaths = {}
+        for path, (_, theme) in self._presets.items():
+            index.setdefault(theme["themeName"], theme)
+            presetPaths.setdefault(theme["themeName"], path)
+        oldIndex = self._index or {}
+        if changed is None:
+            changed = {
+                themeName for themeName in set(index) | set(oldIndex)
+                if index.get(themeName) != oldIndex.get(themeName)
+            }
+        self._index = index
+        self._presetPaths = presetPaths
+        # only the changed themes and what inherits from them
+        for themeName in changed:
+            for name in self._inheritance.invalidate(themeName):
+                self._vectors.pop(name, None)
+                self._contentHashes.pop(name, None)
+                self._similarity.remove(name)
+                self._similarityComplete = False
+
+    def _getFromPacks(self, themeName):
+        for pack in self._packs.values():
+            theme = pack.get(themeName)
+            if theme is not None:
+                theme["themeType"] = "Default"
+                return theme
+        return None
+
+    def _presetChanged(self, themeName):
+        path = self._presetPaths.get(themeName)
+        if path is None:
+            return False
+        signature, _ = self._presets[path]
+        return _statSignature(path) != signature
+
+    def _refreshUserThemes(self):
+        changeCount = getExtensionDefault(CHANGECOUNTKEY, 0)
+        if changeCount == self._userChangeCount:
+            return False
+        self._userThemes = loadUserDefinedThemes()
+        self._userChangeCount = changeCount
+        return True
+
+    def _refreshPresets(self):
+        # a single stat of the folder catches added or removed files
+        folderSignature = _statSignature(self.presetFolder)
+        if folderSignature == self._presetFolderSignature:
+            return False
+        presets = {}
+        for path, signature, theme in presetCache.loadPresetThemes(self.presetFolder):
+            presets[path] = (signature, _valueInterner.internTheme(theme))
+        self._presets = presets
+        # packs shipped next to the presets
+        packPaths = set(_presetPackPaths(self.presetFolder))
+        for path in list(self._presetPackPaths - packPaths):
+            self.removePack(path)
+        for path in packPaths:
+            self.addPack(path)
+        self._presetPackPaths = packPaths
+        self._presetFolderSignature = folderSignature
+        return True
+
+
+_themeRegistry = None
+_themeStore = None
+_valueInterner = themeDedupe.ValueInterner()
+# read from PROFILESKEY on first use
+_profileCache = None
+# designspace name → ThemeDesignspace
+_themeDesignspaces = {}
+
+def getThemeRegistry():
+    global _themeRegistry
+    if _themeRegistry is None:
+        _themeRegistry = ThemeRegistry()
+    return _themeRegistry
+
+def getThemeStore():
+    # user themes are stored one defaults key per theme, the old
+    # single list under DEFAULTSKEY is moved over on first load.
+    # Large libraries can switch to a SQLite database with useThemeStore.
+    global _themeStore
+    if _themeStore is None:
+        defaultsStore = themeStore.DefaultsThemeStore(
+            DEFAULTSKEY,
+            getExtensionDefault,
+            setExtensionDefault,
+            removeExtensionDefault,
+            legacyKey=DEFAULTSKEY
+        )
+        if getExtensionDefault(STOREKEY, "defaults") == "sqlite":
+            path = getExtensionDefault(f"{STOREKEY}.path", SQLITEPATH)
+            _themeStore = themeStore.SQLiteThemeStore(path, legacyLoader=defaultsStore.load)
+        else:
+            _themeStore = defaultsStore
+    return _themeStore
+
+def useThemeStore(kind, path=None):
+    # "defaults" or "sqlite", a new database is filled from the defaults once
+    global _themeStore
+    if kind not in ("defaults", "sqlite"):
+        raise ValueError(f"Unknown theme store: {kind}")
+    setExtensionDefault(STOREKEY, kind)
+    if path is not None:
+        setExtensionDefault(f"{STOREKEY}.path", path)
+    if isinstance(_themeStore, themeStore.SQLiteThemeStore):
+        _themeStore.close()
+    _themeStore = None
+    _bumpChangeCount()
+    return getThemeStore()
+
 # -----------------
 # Helpers
 # -----------------
 
+def _presetFolder():
+    return os.path.join(
+        resourcesPath(),
+        "presetThemes"
+    )
+
+def _presetPackPaths(presetFolder):
+    return [
+        os.path.join(presetFolder, fileName)
+        for fileName in sorted(os.listdir(presetFolder))
+        if os.path.splitext(fileName)[1] == themePack.PACKEXTENSION
+    ]
+
+def _statSignature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def _copyTheme(theme):
+    return {
+        key: list(value) if isinstance(value, list) else value
+        for key, value in theme.items()
+    }
+
+def _bumpChangeCount():
+    changeCount = getExtensionDefault(CHANGECOUNTKEY, 0) + 1
+    setExtensionDefault(CHANGECOUNTKEY, changeCount)
+    return changeCount
+
+def _addUserTheme(theme):
+    # saved either way, returns the duplicate groups it makes, [[existing, new]]
+    # or [], for duplicateReport
+    existing = findThemeWithContent(theme)
+    duplicates = []
+    if existing is not None and existing != theme["themeName"]:
+        duplicates.append([existing, theme["themeName"]])
+    theme = _deltaForStorage(theme)
+    registry = getThemeRegistry()
+    # read before the write bumps the change count
+    themes = [t for t in registry.userThemes() if t["themeName"] != theme["themeName"]] + [theme]
+    if not getThemeStore().put(theme):
+        return duplicates
+    registry.userThemesWritten(themes, [theme["themeName"]], _bumpChangeCount())
+    _storeThemeProfiles([theme["themeName"]])
+    return duplicates
+
+def _writeUserThemes(themes):
+    # only the dirty themes are written, nothing dirty means no write at all
+    themesByName = {theme["themeName"]: theme for theme in themes}
+    themes = [_deltaForStorage(theme, themesByName) for theme in themes]
+    written = getThemeStore().save(themes)
+    if not written:
+        return
+    getThemeRegistry().userThemesWritten(themes, written, _bumpChangeCount())
+    _storeThemeProfiles(written)
+
+def _getProfileCache():
+    global _profileCache
+    if _profileCache is None:
+        _profileCache = themeProfile.ProfileCache(
+            PROFILESKEY,
+            getExtensionDefault,
+            setExtensionDefault,
+            removeExtensionDefault
+        )
+    return _profileCache
+
+def _profileTheme(theme, digest):
+    # a theme that can't be profiled gets None, it must never fail a save
+    registry = getThemeRegistry()
+    defaults = None
+    if theme.get("themeName") != PROFILEDEFAULTTHEME and PROFILEDEFAULTTHEME in registry:
+        defaults = registry.get(PROFILEDEFAULTTHEME)
+    try:
+        return _getProfileCache().add(theme, digest, defaults)
+    except (KeyError, TypeError, ValueError) as error:
+        print(f"{theme.get('themeName')} can't be profiled: {error}")
+        return None
+
+def _storeThemeProfiles(themeNames):
+    # store the profiles of the user themes just written under their own
+    # keys, drop the keys of the ones that were removed
+    registry = getThemeRegistry()
+    cache = _getProfileCache()
+    userNames = {theme["themeName"] for theme in registry.userThemes()}
+    for themeName in themeNames:
+        if themeName not in userNames:
+            cache.forget(themeName)
+            continue
+        if getThemeProfile(themeName) is not None:
+            cache.store(themeName, registry.contentHash(themeName))
+
+def _coerceUserTheme(theme):
+    for nameKey, name, valueType in THEMEKEYS:
+        if nameKey not in theme:
+            continue
+        theme[nameKey] = valueType(theme[nameKey])
+    # one shared tuple per distinct color across the library
+    return _valueInterner.internTheme(theme)
+
 def _dataConverter(data, dataType):
-    # Thanks Frank:)
-    if data is not None:
-        convertedData = dataType(data)
-    else:
-        if dataType == float:
-            convertedData = float(FALLBACKSIZE)
-        elif dataType == int:
-            convertedData = FALLBACKSIZE
-        else:
-            convertedData = FALLBACKCOLOR
-    return convertedData
+    return schema.dataConverter(data, dataType)
+
+def _valuesEqual(value1, value2):
+    return themeDelta.valuesEqual(value1, value2, VALUETOLERANCE)
+
+def _deltaForStorage(theme, themesByName=None):
+    # themes with a base are stored as the keys that differ from it,
+    # the base taken from the same batch of themes when it is in there
+    if not themeDelta.isDelta(theme):
+        return theme
+    baseName = themeDelta.baseName(theme)
+    # what the theme was flattened against, before this write
+    storedBase = getThemeRegistry().get(baseName)
+    base = None
+    if themesByName is not None:
+        base = themesByName.get(baseName)
+    if base is None:
+        base = storedBase
+    if base is None:
+        # the base is gone, keep what we have
+        return theme
+    return themeDelta.makeDelta(theme, base, VALUETOLERANCE, previousBase=storedBase)
+
+def _designspaceModule():
+    # designspaces need fontTools, nothing else here does
+    import ThemeManagerDesignspace as designspace
+    return designspace
+
+def _getVectors(themeNames):
+    registry = getThemeRegistry()
+    vectors = []
+    for themeName in themeNames:
+        vector = registry.getVector(themeName)
+        if vector is None:
+            print(f"{themeName} does not exist...")
+            return None
+        vectors.append(vector)
+    return vectors
 
-def _interpolate(a, b, f ):
-    return a+f*(b-a)
-    
 def addDarkMode(themeDict):
-    newTheme = {}
-    newTheme["themeName"] = themeDict["themeName"]
-    newTheme["themeType"] = "User"
-    for keyName, _, dataType in THEMEKEYS + DARKTHEMEKEYS:              
-        if keyName in themeDict:
-            newTheme[keyName] = dataType(themeDict[keyName])
-        else:
-            light = keyName.replace(".dark","")
-            if light in themeDict:
-                newTheme[keyName] = dataType(themeDict[light])            
-    return newTheme
+    return schema.addDarkMode(themeDict, getDarkThemeKeys())
     
 def addMissing(themeDict):
-    newTheme = {}
-    newTheme["themeName"] = themeDict["themeName"]
-    newTheme["themeType"] = "User"
-    for keyName, _, dataType in THEMEKEYS + DARKTHEMEKEYS:              
-        if keyName in themeDict:
-            newTheme[keyName] = dataType(themeDict[keyName])
-        else:
-            data = themeDict.get(keyName)
-            val = _dataConverter(data,dataType)
-            newTheme[keyName] = val
-    return newTheme
+    return schema.addMissing(themeDict, getDarkThemeKeys())
 
 def addDarkMode2Themes():
     themes = loadUserDefinedThemes()
     fixedThemes = []
     for theme in themes:
+        if themeDelta.isDelta(theme):
+            # missing keys come from the base, filling them would override it
+            fixedThemes.append(theme)
+            continue
         t = addDarkMode(theme)
         t = addMissing(t)
         fixedThemes.append(t) 
-    setExtensionDefault(DEFAULTSKEY, fixedThemes)
+    _writeUserThemes(fixedThemes)
     
     
 def renameThemeTypos():
@@ -267,6 +1062,61 @@ def renameThemeTypos():
     renamedThemes = []
     for theme in themes:
         renamedThemes.append({RENAMEMAP.get(k, k): v for k, v in theme.items()})
-    setExtensionDefault(DEFAULTSKEY, renamedThemes)
-    
-    
+    _writeUserThemes(renamedThemes)
+
+# ----------
+# Migrations
+# ----------
+
+def _migrateRenamedKeys(theme):
+    if not any(key in RENAMEMAP for key in theme):
+        return None
+    return {RENAMEMAP.get(k, k): v for k, v in theme.items()}
+
+def _migrateDarkMode(theme):
+    if themeDelta.isDelta(theme):
+        return None
+    if theme.get("themeType") == "User" and all(key in theme for key, _, _ in THEMEKEYS + getDarkThemeKeys()):
+        return None
+    return addMissing(addDarkMode(theme))
+
+# In order, a migration returns the fixed theme or None when the theme
+# doesn't need it. Append new ones, never reorder: the stored schema
+# version is the number of migrations that already ran.
+MIGRATIONS = [
+    _migrateRenamedKeys,
+    _migrateDarkMode,
+]
+SCHEMAVERSION = len(MIGRATIONS)
+
+def migrateUserThemes():
+    """
+    Bring the stored user themes up to SCHEMAVERSION, returns True if
+    anything was rewritten. The dark mode backfill also runs again when
+    RoboFont has other .dark preferences or the themes were written
+    since it last ran, it only rewrites themes that miss a key.
+    """
+    version = getExtensionDefault(SCHEMAVERSIONKEY, 0)
+    migrations = MIGRATIONS[version:]
+    if getExtensionDefault(DARKMODESTAMPKEY) != _darkModeStamp() and _migrateDarkMode not in migrations:
+        migrations.append(_migrateDarkMode)
+    if not migrations:
+        return False
+    changed = False
+    migrated = []
+    for theme in loadUserDefinedThemes():
+        for migration in migrations:
+            newTheme = migration(theme)
+            if newTheme is not None:
+                theme = newTheme
+                changed = True
+        migrated.append(theme)
+    if changed:
+        _writeUserThemes(migrated)
+    setExtensionDefault(SCHEMAVERSIONKEY, SCHEMAVERSION)
+    setExtensionDefault(DARKMODESTAMPKEY, _darkModeStamp())
+    return changed
+
+def _darkModeStamp():
+    darkKeys = ",".join(sorted(key for key, _, _ in getDarkThemeKeys()))
+    return f"{getExtensionDefault(CHANGECOUNTKEY, 0)}:{darkKeys}"
@@ -0,0 +1,181 @@
+"""
+Finding the themes that look closest to a given theme.
+
+Every light color of a theme is composited over the theme's glyph view
+background, converted to OKLab and scaled by 100, so a distance of 1 is
+about one just noticeable difference (ΔE). The distance between two
+themes is the mean ΔE over the colors both of them have.
+
+SimilarityIndex keeps these OKLab rows by theme name. With NumPy a query
+is one vectorized pass over a (themes × colors × 3) array that is only
+rebuilt after the index changed. Without it the same math runs over the
+rows in plain Python.
+
+    index = SimilarityIndex()
+    index.add("RF Default", theme)
+    index.query(otherTheme, k=5, maxDeltaE=10)   # → [(name, ΔE), ...]
+"""
+
+import math
+from array import array
+from ThemeManagerVector import ThemeVector, COLORKEYS, COLOROFFSETS, SLOTS
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+BACKGROUNDKEY = "glyphViewBackgroundColor"
+# OKLab L runs from 0 to 1, ΔE is quoted on a 0 to 100 scale
+DELTAESCALE = 100
+# what a background with alpha is seen over
+PAPER = (1.0, 1.0, 1.0)
+COMPONENTS = 3
+
+
+def srgbToOKLab(r, g, b):
+    # https://bottosson.github.io/posts/oklab/
+    r, g, b = (_linearize(c) for c in (r, g, b))
+    l = _cubeRoot(0.4122214708 * r + 0.5363325363 * g + 0.0514459929 * b)
+    m = _cubeRoot(0.2119034982 * r + 0.6806995451 * g + 0.1073969566 * b)
+    s = _cubeRoot(0.0883024619 * r + 0.2817188376 * g + 0.6299787005 * b)
+    return (
+        0.2104542553 * l + 0.7936177850 * m - 0.0040720468 * s,
+        1.9779984951 * l - 2.4285922050 * m + 0.4505937099 * s,
+        0.0259040371 * l + 0.7827717662 * m - 0.8086757660 * s
+    )
+
+def themeToOKLab(theme):
+    """
+    (array('d') of L, a, b per light color key, bytearray with 1 for
+    the keys the theme has). theme is a dict or a ThemeVector.
+    """
+    if isinstance(theme, dict):
+        theme = ThemeVector.fromDict(theme)
+    background = _over(theme.getColor(BACKGROUNDKEY) or PAPER + (1.0,), PAPER)
+    values = array("d", [0.0]) * (len(COLORKEYS) * COMPONENTS)
+    present = bytearray(len(COLORKEYS))
+    for index, key in enumerate(COLORKEYS):
+        if not theme.present[SLOTS[key]]:
+            continue
+        offset = COLOROFFSETS[key]
+        color = _over(theme.colors[offset:offset + 4], background)
+        start = index * COMPONENTS
+        values[start:start + COMPONENTS] = array("d", (c * DELTAESCALE for c in srgbToOKLab(*color)))
+        present[index] = 1
+    return values, present
+
+def deltaE(theme1, theme2):
+    # mean ΔE over the colors both themes have, None when they share none
+    return _distance(themeToOKLab(theme1), themeToOKLab(theme2))
+
+
+class SimilarityIndex(object):
+
+    def __init__(self):
+        # theme name → (OKLab values, present)
+        self._rows = {}
+        # (names, values, present) as NumPy arrays, None when stale
+        self._matrix = None
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, themeName):
+        return themeName in self._rows
+
+    def add(self, themeName, theme):
+        self._rows[themeName] = themeToOKLab(theme)
+        self._matrix = None
+
+    def remove(self, themeName):
+        if self._rows.pop(themeName, None) is not None:
+            self._matrix = None
+
+    def clear(self):
+        self._rows.clear()
+        self._matrix = None
+
+    def query(self, theme, k=5, maxDeltaE=None, exclude=()):
+        """
+        Up to k (theme name, ΔE) pairs, closest first, leaving out names
+        in exclude and anything further away than maxDeltaE.
+        """
+        row = themeToOKLab(theme)
+        if numpy is not None:
+            return self._queryNumpy(row, k, maxDeltaE, exclude)
+        found = []
+        for themeName, other in self._rows.items():
+            distance = _distance(row, other)
+            if distance is None or themeName in exclude:
+                continue
+            if maxDeltaE is None or distance <= maxDeltaE:
+                found.append((themeName, distance))
+        found.sort(key=lambda item: item[1])
+        return found[:k]
+
+    # internal
+
+    def _queryNumpy(self, row, k, maxDeltaE, exclude):
+        if self._matrix is None:
+            names = list(self._rows)
+            values = numpy.array([numpy.frombuffer(self._rows[name][0], dtype="d") for name in names])
+            present = numpy.array([numpy.frombuffer(bytes(self._rows[name][1]), dtype="u1") for name in names], dtype=bool)
+            self._matrix = names, values.reshape(len(names), -1, COMPONENTS), present
+        names, values, present = self._matrix
+        if not names:
+            return []
+        rowValues = numpy.frombuffer(row[0], dtype="d").reshape(-1, COMPONENTS)
+        both = present & numpy.frombuffer(bytes(row[1]), dtype="u1").astype(bool)
+        perKey = numpy.sqrt(((values - rowValues) ** 2).sum(axis=2))
+        counts = both.sum(axis=1)
+        means = (perKey * both).sum(axis=1) / numpy.maximum(counts, 1)
+        # themes sharing no color, or too far away, never come up
+        means[counts == 0] = numpy.inf
+        if maxDeltaE is not None:
+            means[means > maxDeltaE] = numpy.inf
+        # enough candidates to still have k after leaving out exclude
+        count = min(k + len(exclude), len(names))
+        candidates = numpy.argpartition(means, count - 1)[:count] if count < len(names) else numpy.arange(len(names))
+        found = [
+            (names[index], float(means[index])) for index in candidates[numpy.argsort(means[candidates], kind="stable")]
+            if numpy.isfinite(means[index]) and names[index] not in exclude
+        ]
+        return found[:k]
+
+# -----------------
+# Helpers
+# -----------------
+
+def _linearize(c):
+    c = min(max(c, 0.0), 1.0)
+    if c <= 0.04045:
+        return c / 12.92
+    return ((c + 0.055) / 1.055) ** 2.4
+
+def _cubeRoot(value):
+    return math.copysign(abs(value) ** (1 / 3), value)
+
+def _over(color, background):
+    # RGBA seen over an opaque RGB background
+    r, g, b, alpha = color
+    return tuple(c * alpha + bc * (1 - alpha) for c, bc in zip((r, g, b), background))
+
+def _distance(row1, row2):
+    values1, present1 = row1
+    values2, present2 = row2
+    total = 0.0
+    count = 0
+    for index in range(len(present1)):
+        if not (present1[index] and present2[index]):
+            continue
+        start = index * COMPONENTS
+        total += math.sqrt(
+            (values1[start] - values2[start]) ** 2
+            + (values1[start + 1] - values2[start + 1]) ** 2
+            + (values1[start + 2] - values2[start + 2]) ** 2
+        )
+        count += 1
+    if not count:
+        return None
+    return total / count
@@ -0,0 +1,298 @@
+"""
+Incremental persistence for the user defined themes.
+
+Two stores share one interface (load, save, get, put, delete):
+
+DefaultsThemeStore keeps every theme under its own extension defaults
+key, next to an index key holding the ordered theme names. It remembers
+a content hash per theme from the last load/save, so saving only writes
+the themes that were added or edited, removes the ones that were
+deleted, rewrites the index when the order changed and does nothing at
+all when nothing is dirty.
+
+SQLiteThemeStore keeps one row per theme in a local database, with
+indexed name and type columns and the ThemeVector binary encoding as a
+blob, for libraries too large for the defaults.
+
+The defaults functions are passed in, nothing in here imports RoboFont.
+"""
+
+import os
+import json
+import sqlite3
+import hashlib
+from ThemeManagerVector import ThemeVector, SLOTKEYS
+
+
+class DefaultsThemeStore(object):
+
+    def __init__(self, prefix, getter, setter, remover, legacyKey=None):
+        self.prefix = prefix
+        self.indexKey = f"{prefix}.themeNames"
+        self.legacyKey = legacyKey
+        self._get = getter
+        self._set = setter
+        self._remove = remover
+        # theme name → content hash as last read or written
+        self._hashes = None
+        self._order = None
+
+    def themeKey(self, themeName):
+        return f"{self.prefix}.themes.{themeName}"
+
+    def load(self):
+        names = self._get(self.indexKey)
+        if names is None:
+            return self._loadLegacy()
+        themes = []
+        hashes = {}
+        for themeName in names:
+            theme = self._get(self.themeKey(themeName))
+            if theme is None:
+                continue
+            theme = dict(theme)
+            themes.append(theme)
+            hashes[themeName] = themeHash(theme)
+        self._hashes = hashes
+        self._order = [theme["themeName"] for theme in themes]
+        return themes
+
+    def save(self, themes):
+        """
+        Write what changed since the last load/save.
+        Returns the names of the themes that were written or removed.
+        """
+        if self._hashes is None:
+            # never loaded, find out what is stored first
+            self.load()
+        hashes = {}
+        written = []
+        for theme in themes:
+            themeName = theme["themeName"]
+            digest = themeHash(theme)
+            hashes[themeName] = digest
+            if self._hashes.get(themeName) != digest:
+                self._set(self.themeKey(themeName), theme)
+                written.append(themeName)
+        for themeName in self._hashes:
+            if themeName not in hashes:
+                self._remove(self.themeKey(themeName))
+                written.append(themeName)
+        order = [theme["themeName"] for theme in themes]
+        if order != self._order:
+            self._set(self.indexKey, order)
+        elif not written:
+            return []
+        self._hashes = hashes
+        self._order = order
+        return written
+
+    def get(self, themeName):
+        theme = self._get(self.themeKey(themeName))
+        if theme is None:
+            return None
+        return dict(theme)
+
+    def put(self, theme):
+        # add or replace a single theme, only its own key and maybe the index are written
+        if self._hashes is None:
+            self.load()
+        themeName = theme["themeName"]
+        digest = themeHash(theme)
+        if self._hashes.get(themeName) == digest:
+            return False
+        self._set(self.themeKey(themeName), theme)
+        if themeName not in self._hashes:
+            self._order.append(themeName)
+            self._set(self.indexKey, self._order)
+        self._hashes[themeName] = digest
+        return True
+
+    def delete(self, themeName):
+        if self._hashes is None:
+            self.load()
+        if themeName not in self._hashes:
+            return False
+        self._remove(self.themeKey(themeName))
+        del self._hashes[themeName]
+        self._order = [name for name in self._order if name != themeName]
+        self._set(self.indexKey, self._order)
+        return True
+
+    def isDirty(self, themes):
+        if self._hashes is None:
+            return True
+        if [theme["themeName"] for theme in themes] != self._order:
+            return True
+        return any(self._hashes.get(theme["themeName"]) != themeHash(theme) for theme in themes)
+
+    # internal
+
+    def _loadLegacy(self):
+        # everything in one list under the old key, move it to per theme keys once
+        themes = []
+        if self.legacyKey is not None:
+            themes = [dict(theme) for theme in self._get(self.legacyKey) or []]
+        self._hashes = {}
+        self._order = []
+        if themes:
+            self.save(themes)
+        return themes
+
+
+class SQLiteThemeStore(object):
+
+    def __init__(self, path, legacyLoader=None):
+        self.path = path
+        # called once to fill a brand new database, e.g. from the defaults store
+        self.legacyLoader = legacyLoader
+        self._connection = None
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def load(self):
+        rows = self._connect().execute(
+            "SELECT data FROM themes ORDER BY position"
+        ).fetchall()
+        return [self._decode(data) for (data,) in rows]
+
+    def save(self, themes):
+        """
+        Write what changed, in one transaction.
+        Returns the names of the themes that were written or removed.
+        """
+        connection = self._connect()
+        stored = dict(connection.execute("SELECT name, hash FROM themes").fetchall())
+        positions = dict(connection.execute("SELECT name, position FROM themes").fetchall())
+        written = []
+        names = set()
+        with connection:
+            for position, theme in enumerate(themes):
+                themeName = theme["themeName"]
+                names.add(themeName)
+                digest = themeHash(theme)
+                if stored.get(themeName) != digest:
+                    self._write(connection, theme, position, digest)
+                    written.append(themeName)
+                elif positions.get(themeName) != position:
+                    connection.execute("UPDATE themes SET position=? WHERE name=?", (position, themeName))
+            for themeName in stored:
+                if themeName not in names:
+                    connection.execute("DELETE FROM themes WHERE name=?", (themeName,))
+                    written.append(themeName)
+        return written
+
+    def get(self, themeName):
+        row = self._connect().execute(
+            "SELECT data FROM themes WHERE name=?", (themeName,)
+        ).fetchone()
+        if row is None:
+            return None
+        return self._decode(row[0])
+
+    def names(self, themeType=None):
+        if themeType is None:
+            rows = self._connect().execute("SELECT name FROM themes ORDER BY position")
+        else:
+            rows = self._connect().execute(
+                "SELECT name FROM themes WHERE type=? ORDER BY position", (themeType,)
+            )
+        return [name for (name,) in rows]
+
+    def put(self, theme):
+        connection = self._connect()
+        themeName = theme["themeName"]
+        digest = themeHash(theme)
+        row = connection.execute("SELECT hash, position FROM themes WHERE name=?", (themeName,)).fetchone()
+        if row is not None and row[0] == digest:
+            return False
+        if row is not None:
+            position = row[1]
+        else:
+            position = connection.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM themes").fetchone()[0]
+        with connection:
+            self._write(connection, theme, position, digest)
+        return True
+
+    def delete(self, themeName):
+        connection = self._connect()
+        with connection:
+            cursor = connection.execute("DELETE FROM themes WHERE name=?", (themeName,))
+        return cursor.rowcount > 0
+
+    # internal
+
+    def _connect(self):
+        if self._connection is not None:
+            return self._connection
+        folder = os.path.dirname(self.path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        connection = sqlite3.connect(self.path)
+        with connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS themes ("
+                "name TEXT PRIMARY KEY, type TEXT, position INTEGER, hash TEXT, data BLOB)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS themesType ON themes (type)")
+            connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._connection = connection
+        meta = dict(connection.execute("SELECT key, value FROM meta").fetchall())
+        # the blobs depend on the slot layout, keep the one they were written with
+        self._slotKeys = json.loads(meta["slotKeys"]) if "slotKeys" in meta else None
+        if self._slotKeys != SLOTKEYS:
+            self._reencode(connection)
+        if "migrated" not in meta:
+            with connection:
+                connection.execute("INSERT OR REPLACE INTO meta VALUES ('migrated', '1')")
+            if self.legacyLoader is not None:
+                self.save(self.legacyLoader())
+        return connection
+
+    def _reencode(self, connection):
+        rows = connection.execute("SELECT name, data FROM themes").fetchall()
+        with connection:
+            for themeName, data in rows:
+                vector = ThemeVector.fromBytes(data, self._slotKeys)
+                connection.execute("UPDATE themes SET data=? WHERE name=?", (vector.toBytes(), themeName))
+            connection.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('slotKeys', ?)", (json.dumps(SLOTKEYS),)
+            )
+        self._slotKeys = list(SLOTKEYS)
+
+    def _write(self, connection, theme, position, digest):
+        data = ThemeVector.fromDict(theme).toBytes()
+        connection.execute(
+            "INSERT OR REPLACE INTO themes VALUES (?, ?, ?, ?, ?)",
+            (theme["themeName"], theme.get("themeType"), position, digest, data)
+        )
+
+    def _decode(self, data):
+        return ThemeVector.fromBytes(data).toDict()
+
+
+def themeHash(theme):
+    digest = hashlib.sha1()
+    for key in sorted(theme):
+        digest.update(f"{key}={_freeze(theme[key])!r};".encode("utf-8"))
+    return digest.hexdigest()
+
+# -----------------
+# Helpers
+# -----------------
+
+def _freeze(value):
+    # defaults hand back bridged arrays and numbers, normalize before hashing
+    if isinstance(value, str):
+        return str(value)
+    if isinstance(value, bool):
+        return bool(value)
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return tuple(_freeze(v) for v in value)
+    except TypeError:
+        return repr(value)
@@ -0,0 +1,219 @@
+"""
+Theme validation against a compiled schema.
+
+The schema (THEMEKEYS plus the dark keys of the running RoboFont) is
+compiled once into a key → rule table. Validating a theme is one pass over
+its items and one pass over the fill list; nothing scans the key list or
+relies on catching exceptions per key.
+
+Errors come back as ValidationError objects so the import dialog, the
+scripting API and the command line can each present them their own way.
+
+    python ThemeManagerValidator.py file.roboFontTheme [...]
+"""
+
+import sys
+import ThemeManagerFileFormat as themeFileFormat
+from ThemeManagerSchema import RENAMEMAP, THEMEKEYS, ALLDARKTHEMEKEYS, THEMEMETAKEYS, FALLBACKCOLOR, FALLBACKSIZE
+from ThemeManagerDelta import BASEKEY
+
+DARKSUFFIX = ".dark"
+COLORARITY = 4
+
+# error codes
+UNKNOWNKEY = "unknownKey"
+INVALIDTYPE = "invalidType"
+INVALIDARITY = "invalidArity"
+OUTOFRANGE = "outOfRange"
+MISSINGNAME = "missingName"
+UNREADABLE = "unreadable"
+
+
+class ValidationError(object):
+
+    __slots__ = ("code", "key", "message")
+
+    def __init__(self, code, key, message):
+        self.code = code
+        self.key = key
+        self.message = message
+
+    def __repr__(self):
+        return f"<ValidationError {self.code} {self.key}>"
+
+    def __str__(self):
+        return self.message
+
+
+class KeyRule(object):
+
+    __slots__ = ("key", "valueType", "arity", "minimum", "maximum", "lightKey", "fallback")
+
+    def __init__(self, key, valueType, lightKey=None):
+        self.key = key
+        self.valueType = valueType
+        self.lightKey = lightKey
+        if valueType == tuple:
+            self.arity = COLORARITY
+            self.minimum = 0.0
+            self.maximum = 1.0
+            self.fallback = tuple(FALLBACKCOLOR)
+        else:
+            self.arity = None
+            self.minimum = 0
+            self.maximum = None
+            self.fallback = valueType(FALLBACKSIZE)
+
+
+class CompiledSchema(object):
+
+    def __init__(self, darkKeys=()):
+        self.darkKeys = tuple(darkKeys)
+        # key → KeyRule, light keys first then dark keys, in THEMEKEYS order
+        self.rules = {}
+        for key, _, valueType in THEMEKEYS:
+            self.rules[key] = KeyRule(key, valueType)
+        for key, _, valueType in self.darkKeys:
+            self.rules[key] = KeyRule(key, valueType, lightKey=key[:-len(DARKSUFFIX)])
+        self.fillOrder = list(self.rules.values())
+
+
+# the renamed keys, with their dark variants
+_RENAMEMAP = dict(RENAMEMAP)
+_RENAMEMAP.update({f"{old}{DARKSUFFIX}": f"{new}{DARKSUFFIX}" for old, new in RENAMEMAP.items()})
+
+_compiledSchemas = {}
+
+def compileSchema(darkKeys=()):
+    """
+    The compiled schema for these dark keys, compiled once and reused.
+    """
+    cacheKey = tuple(key for key, _, _ in darkKeys)
+    schema = _compiledSchemas.get(cacheKey)
+    if schema is None:
+        schema = _compiledSchemas[cacheKey] = CompiledSchema(darkKeys)
+    return schema
+
+def validateTheme(themeData, schema, fill=True):
+    """
+    Returns (validated, errors). Everything valid is kept, values are
+    coerced to the schema types, colors outside 0-1 are clamped. With fill
+    the dark keys fall back to their light value and anything still
+    missing gets the fallback value, like importing always did. Delta
+    themes (basedOn) are never filled, their base provides the rest.
+    """
+    rules = schema.rules
+    errors = []
+    validated = {}
+    themeName = None
+    # (basedOn, base name)
+    base = None
+    for key, value in themeData.items():
+        key = _RENAMEMAP.get(key, key)
+        if key in THEMEMETAKEYS:
+            if key == "themeName":
+                themeName = value
+            elif key == BASEKEY and value:
+                base = (key, value)
+            continue
+        rule = rules.get(key)
+        if rule is None:
+            errors.append(ValidationError(UNKNOWNKEY, key, f"Unknown key: {key}"))
+            continue
+        if rule.arity is not None:
+            value = _checkColor(rule, value, errors)
+        else:
+            value = _checkSize(rule, value, errors)
+        if value is not None:
+            validated[key] = value
+    if not isinstance(themeName, str) or not themeName:
+        errors.append(ValidationError(MISSINGNAME, "themeName", "The theme has no name."))
+        themeName = "Untitled Theme"
+    if fill and base is None:
+        for rule in schema.fillOrder:
+            if rule.key in validated:
+                continue
+            if rule.lightKey is not None and rule.lightKey in validated:
+                validated[rule.key] = validated[rule.lightKey]
+            else:
+                validated[rule.key] = rule.fallback
+    result = dict(themeName=themeName, themeType="User")
+    if base is not None:
+        result[base[0]] = base[1]
+    result.update(validated)
+    return result, errors
+
+def validateThemes(themes, schema, fill=True):
+    """
+    Batch form, yields (validated, errors) per theme.
+    """
+    for themeData in themes:
+        yield validateTheme(themeData, schema, fill=fill)
+
+def formatErrors(errors):
+    """
+    Group errors into the short lines the import dialog shows.
+    """
+    grouped = {}
+    for error in errors:
+        grouped.setdefault(error.code, []).append(error)
+    lines = []
+    titles = [
+        (UNREADABLE, None),
+        (MISSINGNAME, None),
+        (UNKNOWNKEY, "Unknown keys defined"),
+        (INVALIDTYPE, "Invalid value types for keys"),
+        (INVALIDARITY, "Colors without 4 components for keys"),
+        (OUTOFRANGE, "Values out of range (clamped) for keys"),
+    ]
+    for code, title in titles:
+        if code not in grouped:
+            continue
+        if title is None:
+            lines.extend(error.message for error in grouped[code])
+        else:
+            lines.append(f"{title}: {', '.join(error.key for error in grouped[code])}")
+    return lines
+
+# -----------------
+# Helpers
+# -----------------
+
+def _isNumber(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _checkColor(rule, value, errors):
+    if not isinstance(value, (list, tuple)) or not all(_isNumber(v) for v in value):
+        errors.append(ValidationError(INVALIDTYPE, rule.key, f"{rule.key} is not a color."))
+        return None
+    if len(value) != rule.arity:
+        errors.append(ValidationError(INVALIDARITY, rule.key, f"{rule.key} has {len(value)} components, not {rule.arity}."))
+        return None
+    minimum = rule.minimum
+    maximum = rule.maximum
+    for v in value:
+        if v < minimum or v > maximum:
+            errors.append(ValidationError(OUTOFRANGE, rule.key, f"{rule.key} is outside {minimum}-{maximum}."))
+            return tuple(min(max(float(v), minimum), maximum) for v in value)
+    return tuple(float(v) for v in value)
+
+def _checkSize(rule, value, errors):
+    if not _isNumber(value):
+        errors.append(ValidationError(INVALIDTYPE, rule.key, f"{rule.key} is not a number."))
+        return None
+    if value < rule.minimum:
+        errors.append(ValidationError(OUTOFRANGE, rule.key, f"{rule.key} is below {rule.minimum}."))
+        value = rule.minimum
+    return rule.valueType(value)
+
+
+if __name__ == "__main__":
+    schema = compileSchema(ALLDARKTHEMEKEYS)
+    failed = 0
+    for path in sys.argv[1:]:
+        theme, errors = validateTheme(themeFileFormat.load(path), schema, fill=False)
+        for line in formatErrors(errors):
+            print(f"{path}: {line}")
+        if errors:
+            failed += 1
+    sys.exit(1 if failed else 0)
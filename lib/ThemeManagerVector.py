@@ -0,0 +1,289 @@
+"""
+A flat, array backed form of a theme.
+
+All colors of a theme live in one contiguous array('d'), RGBA per key,
+first every light key then every dark key, followed by a small array of
+sizes. The offsets are compiled once from THEMEKEYS so blending, diffing,
+contrast checks and hashing can run over plain buffers instead of dicts
+of lists.
+
+Conversion to and from the dict/plist form is lossless: missing keys are
+tracked in a presence mask and anything that doesn't fit the schema is
+kept aside in `extras`. `toBytes`/`fromBytes` give a compact binary
+encoding used by the SQLite store and theme packs.
+"""
+
+import struct
+import hashlib
+import plistlib
+from array import array
+from ThemeManagerSchema import THEMEKEYS
+
+CHANNELS = 4
+DARKSUFFIX = ".dark"
+
+COLORKEYS = [key for key, _, valueType in THEMEKEYS if valueType == tuple]
+SIZEKEYS = [key for key, _, valueType in THEMEKEYS if valueType != tuple]
+SIZETYPES = {key: valueType for key, _, valueType in THEMEKEYS if valueType != tuple}
+COLORCOUNT = len(COLORKEYS)
+SIZECOUNT = len(SIZEKEYS)
+COLORLENGTH = COLORCOUNT * CHANNELS * 2
+SIZELENGTH = SIZECOUNT * 2
+
+# key (with or without .dark) → index into ThemeVector.colors
+COLOROFFSETS = {}
+# key (with or without .dark) → index into ThemeVector.sizes
+SIZEOFFSETS = {}
+# key → slot in the presence mask, colors first then sizes
+SLOTS = {}
+
+for _index, _key in enumerate(COLORKEYS):
+    COLOROFFSETS[_key] = _index * CHANNELS
+    COLOROFFSETS[_key + DARKSUFFIX] = (COLORCOUNT + _index) * CHANNELS
+    SLOTS[_key] = _index
+    SLOTS[_key + DARKSUFFIX] = COLORCOUNT + _index
+for _index, _key in enumerate(SIZEKEYS):
+    SIZEOFFSETS[_key] = _index
+    SIZEOFFSETS[_key + DARKSUFFIX] = SIZECOUNT + _index
+    SLOTS[_key] = COLORCOUNT * 2 + _index
+    SLOTS[_key + DARKSUFFIX] = COLORCOUNT * 2 + SIZECOUNT + _index
+SLOTCOUNT = (COLORCOUNT + SIZECOUNT) * 2
+# sizes offsets holding int values, anything computing new sizes rounds these
+INTSIZEOFFSETS = sorted(
+    offset for key, offset in SIZEOFFSETS.items()
+    if SIZETYPES[key.replace(DARKSUFFIX, "")] == int
+)
+
+# every schema key in slot order, used when going back to a dict
+SLOTKEYS = [None] * SLOTCOUNT
+for _key, _slot in SLOTS.items():
+    SLOTKEYS[_slot] = _key
+del _index, _key, _slot
+
+# binary encoding, see ThemeVector.toBytes
+ENCODINGMAGIC = b"TMV1"
+_ENCODINGHEADER = struct.Struct("<4sHHI")
+
+
+class ThemeVector(object):
+
+    __slots__ = ("themeName", "themeType", "colors", "sizes", "present", "extras")
+
+    def __init__(self, themeName=None, themeType=None):
+        self.themeName = themeName
+        self.themeType = themeType
+        self.colors = array("d", [0.0]) * COLORLENGTH
+        self.sizes = array("d", [0.0]) * SIZELENGTH
+        self.present = bytearray(SLOTCOUNT)
+        self.extras = {}
+
+    @classmethod
+    def fromDict(cls, theme):
+        vector = cls(theme.get("themeName"), theme.get("themeType"))
+        colors = vector.colors
+        sizes = vector.sizes
+        present = vector.present
+        extras = vector.extras
+        for key, value in theme.items():
+            if key == "themeName" or key == "themeType":
+                continue
+            offset = COLOROFFSETS.get(key)
+            if offset is not None:
+                if not _isColor(value):
+                    extras[key] = value
+                    continue
+                colors[offset:offset + CHANNELS] = array("d", value)
+                present[SLOTS[key]] = 1
+                continue
+            offset = SIZEOFFSETS.get(key)
+            if offset is not None:
+                if not _isSize(value, SIZETYPES[key.replace(DARKSUFFIX, "")]):
+                    extras[key] = value
+                    continue
+                sizes[offset] = value
+                present[SLOTS[key]] = 1
+                continue
+            extras[key] = value
+        return vector
+
+    def toDict(self):
+        theme = {}
+        if self.themeName is not None:
+            theme["themeName"] = self.themeName
+        if self.themeType is not None:
+            theme["themeType"] = self.themeType
+        present = self.present
+        for slot, key in enumerate(SLOTKEYS):
+            if not present[slot]:
+                continue
+            if slot < COLORCOUNT * 2:
+                offset = slot * CHANNELS
+                theme[key] = tuple(self.colors[offset:offset + CHANNELS])
+            else:
+                valueType = SIZETYPES[key.replace(DARKSUFFIX, "")]
+                theme[key] = valueType(self.sizes[SIZEOFFSETS[key]])
+        theme.update(self.extras)
+        return theme
+
+    def toBytes(self):
+        """
+        A compact binary form: a small header, a presence bitmap, the
+        present values as float64 and a binary plist with the name, type
+        and extras. Only the values a theme defines take up space.
+        """
+        present = self.present
+        values = array("d")
+        for slot in range(COLORCOUNT * 2):
+            if present[slot]:
+                offset = slot * CHANNELS
+                values.extend(self.colors[offset:offset + CHANNELS])
+        for slot in range(SIZECOUNT * 2):
+            if present[COLORCOUNT * 2 + slot]:
+                values.append(self.sizes[slot])
+        bitmap = bytearray((SLOTCOUNT + 7) // 8)
+        for slot, flag in enumerate(present):
+            if flag:
+                bitmap[slot >> 3] |= 1 << (slot & 7)
+        meta = {}
+        if self.themeName is not None:
+            meta["n"] = self.themeName
+        if self.themeType is not None:
+            meta["t"] = self.themeType
+        if self.extras:
+            meta["x"] = self.extras
+        valueBytes = values.tobytes()
+        return b"".join((
+            _ENCODINGHEADER.pack(ENCODINGMAGIC, COLORCOUNT * 2, SIZECOUNT * 2, len(valueBytes)),
+            bytes(bitmap),
+            valueBytes,
+            plistlib.dumps(meta, fmt=plistlib.FMT_BINARY)
+        ))
+
+    @classmethod
+    def fromBytes(cls, data, slotKeys=None):
+        """
+        Decode toBytes output. `slotKeys` is the SLOTKEYS list the data was
+        written with, only needed when the schema changed since.
+        """
+        magic, colorSlots, sizeSlots, valueLength = _ENCODINGHEADER.unpack_from(data, 0)
+        if magic != ENCODINGMAGIC:
+            raise ValueError("Not an encoded theme.")
+        if slotKeys is None:
+            if (colorSlots, sizeSlots) != (COLORCOUNT * 2, SIZECOUNT * 2):
+                raise ValueError("The theme was encoded with a different schema.")
+            slotKeys = SLOTKEYS
+        slotCount = colorSlots + sizeSlots
+        position = _ENCODINGHEADER.size
+        bitmap = data[position:position + (slotCount + 7) // 8]
+        position += len(bitmap)
+        values = array("d")
+        values.frombytes(data[position:position + valueLength])
+        position += valueLength
+        meta = plistlib.loads(data[position:])
+        vector = cls(meta.get("n"), meta.get("t"))
+        vector.extras = dict(meta.get("x", {}))
+        index = 0
+        for slot in range(slotCount):
+            if not bitmap[slot >> 3] & (1 << (slot & 7)):
+                continue
+            key = slotKeys[slot]
+            if slot < colorSlots:
+                value = tuple(values[index:index + CHANNELS])
+                index += CHANNELS
+                if key in COLOROFFSETS:
+                    vector.setColor(key, value)
+                else:
+                    vector.extras[key] = value
+            else:
+                value = values[index]
+                index += 1
+                if key in SIZEOFFSETS:
+                    vector.setSize(key, value)
+                else:
+                    vector.extras[key] = value
+        return vector
+
+    def copy(self):
+        vector = ThemeVector(self.themeName, self.themeType)
+        vector.colors = array("d", self.colors)
+        vector.sizes = array("d", self.sizes)
+        vector.present = bytearray(self.present)
+        vector.extras = dict(self.extras)
+        return vector
+
+    # access
+
+    def __contains__(self, key):
+        slot = SLOTS.get(key)
+        if slot is None:
+            return key in self.extras
+        return bool(self.present[slot])
+
+    def getColor(self, key):
+        if key not in self:
+            return None
+        offset = COLOROFFSETS[key]
+        return tuple(self.colors[offset:offset + CHANNELS])
+
+    def setColor(self, key, rgba):
+        offset = COLOROFFSETS[key]
+        self.colors[offset:offset + CHANNELS] = array("d", rgba)
+        self.present[SLOTS[key]] = 1
+
+    def getSize(self, key):
+        if key not in self:
+            return None
+        return self.sizes[SIZEOFFSETS[key]]
+
+    def setSize(self, key, value):
+        self.sizes[SIZEOFFSETS[key]] = value
+        self.present[SLOTS[key]] = 1
+
+    # comparison
+
+    def contentHash(self):
+        """
+        A digest of the values only, the name and type are ignored.
+        """
+        digest = hashlib.sha1()
+        digest.update(self.colors.tobytes())
+        digest.update(self.sizes.tobytes())
+        digest.update(bytes(self.present))
+        for key in sorted(self.extras):
+            digest.update(f"{key}={self.extras[key]!r}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def __eq__(self, other):
+        if not isinstance(other, ThemeVector):
+            return NotImplemented
+        return (
+            self.themeName == other.themeName
+            and self.themeType == other.themeType
+            and self.present == other.present
+            and self.colors == other.colors
+            and self.sizes == other.sizes
+            and self.extras == other.extras
+        )
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"<ThemeVector '{self.themeName}'>"
+
+
+# -----------------
+# Helpers
+# -----------------
+
+def _isColor(value):
+    if not isinstance(value, (list, tuple)) or len(value) != CHANNELS:
+        return False
+    return all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in value)
+
+def _isSize(value, valueType):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return False
+    if valueType == int:
+        # a fractional value for an int key wouldn't survive the round trip
+        return value == int(value)
+    return True
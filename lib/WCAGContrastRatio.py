@@ -21,7 +21,6 @@ DEALINGS IN THE SOFTWARE.
 '''
 
 from __future__ import division
-from AppKit import NSColor
 
 
 __all__ = ["rgb", "passes_AA", "passes_AAA"]
@@ -29,6 +28,14 @@ __all__ = ["rgb", "passes_AA", "passes_AAA"]
 
 def getPercievedColor(rgba1, rgba2):
     # thank's Tal
+    # AppKit is only needed here, importing it lazily keeps the module usable headless
+    try:
+        from AppKit import NSColor
+    except ImportError:
+        # same blend in plain calibrated RGB
+        fraction = rgba2[-1]
+        color2 = tuple(rgba2[:-1]) + (1,)
+        return tuple(c1 + fraction * (c2 - c1) for c1, c2 in zip(rgba1, color2))
     color1 = NSColor.colorWithCalibratedRed_green_blue_alpha_(*rgba1)
     color2 = NSColor.colorWithCalibratedRed_green_blue_alpha_(*rgba2[:-1], 1)
     color3 = color1.blendedColorWithFraction_ofColor_(rgba2[-1], color2)